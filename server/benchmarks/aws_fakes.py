@@ -0,0 +1,378 @@
+"""
+In-memory stand-ins for S3Client, DynamoDbClient, SqsClient and the NOAA HttpClient, so the services can be
+benchmarked without LocalStack or the live API. Every call waits on a Latency, which is zero unless asked for.
+
+FakeS3Client is the real S3Client over an in-memory boto3 client, so compression and geometry decoding are
+measured too. The DynamoDB and SQS fakes mirror the public methods of their clients, with the same batch sizes.
+"""
+import asyncio
+import copy
+import hashlib
+import io
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "library"))
+
+import botocore.exceptions
+import simplejson as json
+from http_client import NOT_MODIFIED
+from s3_client import S3Client
+
+
+class Latency:
+    """
+    Simulated round trip of every call, latency_ms with up to jitter_ms added at random. Counts the calls by name.
+    """
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0):
+        self.configure(latency_ms, jitter_ms)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+
+    def configure(self, latency_ms=0.0, jitter_ms=0.0):
+        self._latency = latency_ms / 1000
+        self._jitter = jitter_ms / 1000
+
+    def _delay(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        return self._latency + (random.uniform(0, self._jitter) if self._jitter else 0.0)
+
+    def wait(self, name):
+        delay = self._delay(name)
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self, name):
+        delay = self._delay(name)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def _client_error(code, operation):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class FakeBoto3S3:
+    """
+    The subset of the boto3 S3 client that S3Client calls, holding objects in a dict.
+    """
+    def __init__(self, latency: Latency):
+        self._latency = latency
+        self._lock = threading.Lock()
+        # (bucket, key) -> (body, content encoding, etag, last modified)
+        self.objects = {}
+        self._uploads = {}
+
+    def _store(self, bucket, key, body, encoding):
+        with self._lock:
+            self.objects[(bucket, key)] = (body, encoding, f'"{hashlib.md5(body).hexdigest()}"', datetime.now(timezone.utc))
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self._latency.wait("s3.get_object")
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise _client_error("NoSuchKey", "GetObject")
+        body, encoding, etag, last_modified = stored
+        if IfNoneMatch and IfNoneMatch == etag:
+            raise _client_error("304", "GetObject")
+        response = {"Body": io.BytesIO(body), "ETag": etag, "LastModified": last_modified, "ContentLength": len(body)}
+        if encoding:
+            response["ContentEncoding"] = encoding
+        return response
+
+    def head_object(self, Bucket, Key):
+        self._latency.wait("s3.head_object")
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise _client_error("404", "HeadObject")
+        return {"ETag": stored[2], "LastModified": stored[3], "ContentLength": len(stored[0])}
+
+    def put_object(self, Bucket, Key, Body, ContentEncoding=None):
+        self._latency.wait("s3.put_object")
+        self._store(Bucket, Key, bytes(Body), ContentEncoding)
+        return {"ETag": self.objects[(Bucket, Key)][2]}
+
+    def create_multipart_upload(self, Bucket, Key, ContentEncoding=None):
+        self._latency.wait("s3.create_multipart_upload")
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = (ContentEncoding, {})
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._latency.wait("s3.upload_part")
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        with self._lock:
+            self._uploads[UploadId][1][PartNumber] = (bytes(Body), etag)
+        return {"ETag": etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._latency.wait("s3.complete_multipart_upload")
+        with self._lock:
+            encoding, parts = self._uploads.pop(UploadId)
+        body = b"".join(parts[part["PartNumber"]][0] for part in MultipartUpload["Parts"])
+        self._store(Bucket, Key, body, encoding)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._latency.wait("s3.abort_multipart_upload")
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def delete_objects(self, Bucket, Delete):
+        self._latency.wait("s3.delete_objects")
+        with self._lock:
+            for entry in Delete["Objects"]:
+                self.objects.pop((Bucket, entry["Key"]), None)
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self._latency.wait("s3.delete_object")
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+
+
+class FakeS3Client(S3Client):
+    def __init__(self, latency: Latency, logger: logging.Logger):
+        super().__init__(FakeBoto3S3(latency), logger)
+
+    def snapshot(self):
+        return dict(self._client.objects)
+
+    def restore(self, state):
+        self._client.objects = dict(state)
+
+
+class FakeDynamoDbClient:
+    """
+    DynamoDbClient over dicts. Items are copied in and out like a real table, and batch calls wait once per batch.
+    """
+    def __init__(self, latency: Latency, logger: logging.Logger):
+        self._latency = latency
+        self._logger = logger
+        self._lock = threading.Lock()
+        # table name -> key value -> item
+        self.tables = defaultdict(dict)
+
+    # Hash keys of the tables not keyed on "id", as in terraform/shared/datastore.tf
+    _hash_keys = {"ZoneAlerts": "zone_id", "AlertTiles": "tile"}
+
+    def upsert_item(self, table_name: str, item: dict):
+        self._latency.wait("dynamodb.put_item")
+        with self._lock:
+            self.tables[table_name][item[self._hash_keys.get(table_name, "id")]] = copy.deepcopy(item)
+
+    def upsert_items(self, table_name: str, items, id_key="id", max_retries=5):
+        id_key = self._hash_keys.get(table_name, id_key)
+        unique_items = {item.get(id_key): item for item in items}
+        items = list(unique_items.values())
+        for i in range(0, len(items), 25):
+            self._latency.wait("dynamodb.batch_write_item")
+            with self._lock:
+                for item in items[i:i + 25]:
+                    self.tables[table_name][item[id_key]] = copy.deepcopy(item)
+        return len(items)
+
+    def delete_items(self, table_name: str, id_list, id_key="id", max_retries=5):
+        keys = list(dict.fromkeys(id_list))
+        for i in range(0, len(keys), 25):
+            self._latency.wait("dynamodb.batch_write_item")
+            with self._lock:
+                for key in keys[i:i + 25]:
+                    self.tables[table_name].pop(key, None)
+        return 0
+
+    def query_index(self, table_name: str, index_name: str, hash_key: str, hash_value, range_key: str = None, max_range_value=None):
+        self._latency.wait("dynamodb.query")
+        with self._lock:
+            items = [copy.deepcopy(item) for item in self.tables[table_name].values()
+                     if item.get(hash_key) == hash_value and (range_key is None or (range_key in item and item[range_key] <= max_range_value))]
+        return items
+
+    def get_all_items(self, table_name: str):
+        with self._lock:
+            items = [copy.deepcopy(item) for item in self.tables[table_name].values()]
+        # One scan page per 1 MB, taken as about 100 items here
+        for _ in range(max(1, (len(items) + 99) // 100)):
+            self._latency.wait("dynamodb.scan")
+        return items
+
+    def get_item_by_id(self, table_name: str, id_value, id_key="id", consistent_read=False):
+        self._latency.wait("dynamodb.get_item")
+        with self._lock:
+            item = self.tables[table_name].get(id_value)
+            return copy.deepcopy(item) if item is not None else None
+
+    def put_item_if_version(self, table_name: str, item: dict, expected_version=None, version_key="version"):
+        self._latency.wait("dynamodb.put_item")
+        with self._lock:
+            current = self.tables[table_name].get(item["id"])
+            current_version = (current or {}).get(version_key)
+            if current_version != expected_version:
+                return False
+            self.tables[table_name][item["id"]] = copy.deepcopy(item)
+        return True
+
+    def add_to_set(self, table_name: str, id_value, attribute: str, values, id_key="id"):
+        self._latency.wait("dynamodb.update_item")
+        with self._lock:
+            item = self.tables[table_name].setdefault(id_value, {id_key: id_value})
+            item.setdefault(attribute, set()).update(values)
+
+    def remove_from_set(self, table_name: str, id_value, attribute: str, values, id_key="id"):
+        self._latency.wait("dynamodb.update_item")
+        with self._lock:
+            item = self.tables[table_name].get(id_value)
+            if item and attribute in item:
+                item[attribute].difference_update(values)
+                if not item[attribute]:
+                    del item[attribute]
+
+    def set_attributes(self, table_name: str, id_value, attributes, id_key="id"):
+        self._latency.wait("dynamodb.update_item")
+        with self._lock:
+            item = self.tables[table_name].get(id_value)
+            if item is None:
+                return False
+            item.update(copy.deepcopy(attributes))
+        return True
+
+    def remove_attributes(self, table_name: str, id_value, attributes, id_key="id"):
+        self._latency.wait("dynamodb.update_item")
+        with self._lock:
+            item = self.tables[table_name].get(id_value)
+            for attribute in attributes if item else ():
+                item.pop(attribute, None)
+
+    def get_items_by_id_list(self, table_name: str, id_list, id_key="id", attributes=None, max_retries=5):
+        keys = list(dict.fromkeys(id_list))
+        items = []
+        for i in range(0, len(keys), 100):
+            self._latency.wait("dynamodb.batch_get_item")
+            with self._lock:
+                for key in keys[i:i + 100]:
+                    item = self.tables[table_name].get(key)
+                    if item is None:
+                        continue
+                    if attributes:
+                        item = {name: item[name] for name in [id_key, *attributes] if name in item}
+                    items.append(copy.deepcopy(item))
+        return items
+
+    def delete_item(self, table_name: str, id_value, id_key="id"):
+        self._latency.wait("dynamodb.delete_item")
+        with self._lock:
+            self.tables[table_name].pop(id_value, None)
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(dict(self.tables))
+
+    def restore(self, state):
+        with self._lock:
+            self.tables = defaultdict(dict, copy.deepcopy(state))
+
+
+class FakeSqsClient:
+    """
+    SqsClient that appends message bodies to a list per queue, for the benchmark to hand to the listeners.
+    """
+    def __init__(self, latency: Latency, logger: logging.Logger):
+        self._latency = latency
+        self._logger = logger
+        self._lock = threading.Lock()
+        self.queues = defaultdict(list)
+
+    def get_queue_url(self, queue_name):
+        return f"https://sqs.us-east-1.amazonaws.com/000000000000/{queue_name}"
+
+    def send_message(self, queue_name, message_body):
+        self._latency.wait("sqs.send_message")
+        if isinstance(message_body, dict):
+            message_body = json.dumps(message_body)
+        with self._lock:
+            self.queues[queue_name].append(message_body)
+        return {"MessageId": uuid.uuid4().hex}
+
+    def send_message_batch(self, queue_name, message_bodies, max_concurrency=1, max_retries=3):
+        bodies = [json.dumps(body) if isinstance(body, dict) else body for body in message_bodies]
+        for i in range(0, len(bodies), 10):
+            self._latency.wait("sqs.send_message_batch")
+            with self._lock:
+                self.queues[queue_name].extend(bodies[i:i + 10])
+        return []
+
+    def receive(self, queue_name):
+        """
+        Remove and return every message body in the queue.
+        """
+        with self._lock:
+            bodies, self.queues[queue_name] = self.queues[queue_name], []
+        return [json.loads(body) for body in bodies]
+
+
+class FixtureHttpClient:
+    """
+    HttpClient serving recorded or synthetic NOAA responses by URL. Conditional requests get NOT_MODIFIED
+    when the response body has not changed since it was last served, like an ETag round trip.
+    """
+    def __init__(self, responses, latency: Latency, chunk_size: int = 64 * 1024):
+        # url -> response body bytes
+        self.responses = responses
+        self._latency = latency
+        self._chunk_size = chunk_size
+        self._etags = {}
+        self._pending_etags = {}
+
+    def _not_modified(self, endpoint, body, conditional):
+        etag = hashlib.md5(body).hexdigest()
+        unchanged = conditional and self._etags.get(endpoint) == etag
+        if conditional and not unchanged:
+            self._pending_etags[endpoint] = etag
+        return unchanged
+
+    def commit_validators(self, endpoint):
+        if endpoint in self._pending_etags:
+            self._etags[endpoint] = self._pending_etags.pop(endpoint)
+
+    def _body(self, endpoint):
+        body = self.responses.get(endpoint)
+        if body is None:
+            raise KeyError(f"No fixture for {endpoint}")
+        return body
+
+    async def get_json(self, endpoint, headers=None, conditional=False, parse_float=Decimal):
+        await self._latency.wait_async("noaa.get")
+        body = self._body(endpoint)
+        if self._not_modified(endpoint, body, conditional):
+            return NOT_MODIFIED
+        return json.loads(body, parse_float=parse_float)
+
+    async def stream_json_items(self, endpoint, stream, headers=None, conditional=False, chunk_size=None):
+        await self._latency.wait_async("noaa.get")
+        body = self._body(endpoint)
+        if self._not_modified(endpoint, body, conditional):
+            yield NOT_MODIFIED
+            return
+        chunk_size = chunk_size or self._chunk_size
+        for start in range(0, len(body), chunk_size):
+            for item in stream.feed(body[start:start + chunk_size]):
+                yield item
+        stream.finish()
+
+    def get_conditional_stats(self):
+        return {}
+
+    async def close(self):
+        return None
@@ -0,0 +1,105 @@
+"""
+Size and decode time of zone files stored as 5 decimal JSON against the geometry_codec binary format.
+
+    python benchmarks/geometry_codec_benchmark.py zones/*.json
+    python benchmarks/geometry_codec_benchmark.py --synthetic 20
+
+Zone files can be copied from the zone bucket (aws s3 cp s3://zone-bucket-202505/ zones/ --recursive --exclude "*.*m.json")
+or fetched from https://api.weather.gov/zones/forecast/<id>.
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "library"))
+
+import simplejson as json
+import geometry_codec
+from packed_geometry import PackedCoordinates
+
+
+def synthetic_zone(index, vertices):
+    random.seed(index)
+    center_lon = random.uniform(-120, -70)
+    center_lat = random.uniform(25, 48)
+    ring = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        radius = 0.3 * (1 + 0.05 * math.sin(angle * 37) + 0.01 * random.random())
+        ring.append([round(center_lon + radius * math.cos(angle), 6), round(center_lat + radius * math.sin(angle), 6)])
+    ring.append(ring[0])
+    return {"id": f"https://api.weather.gov/zones/forecast/SYN{index:03d}", "type": "Feature",
+            "properties": {"name": f"Synthetic {index}"}, "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of synthetic zones when no files are given")
+    parser.add_argument("--vertices", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.paths:
+        zones = []
+        for path in args.paths:
+            with open(path, "rb") as f:
+                body = f.read()
+            zones.append((os.path.basename(path), geometry_codec.loads(body) if geometry_codec.is_encoded(body) else json.loads(body, use_decimal=True)))
+    else:
+        zones = [(f"synthetic-{i}", synthetic_zone(i, args.vertices)) for i in range(args.synthetic or 10)]
+
+    totals = {"json_bytes": 0, "binary_bytes": 0, "json_loads": 0.0, "json_loads_decimal": 0.0, "binary_loads": 0.0, "binary_to_json": 0.0}
+    print(f"{'zone':<36}{'vertices':>10}{'json KB':>10}{'binary KB':>11}{'ratio':>7}{'json ms':>9}{'decimal ms':>12}{'binary ms':>11}{'to_json ms':>12}")
+    for name, zone in zones:
+        geometry = zone.get("geometry") or {}
+        coordinates = geometry.get("coordinates")
+        packed = coordinates if isinstance(coordinates, PackedCoordinates) else PackedCoordinates.from_geojson(geometry.get("type"), coordinates)
+        if packed is None:
+            print(f"{name:<36} skipped, geometry can't be packed")
+            continue
+
+        # The same zone in both storage formats, as zone_service writes it
+        json_body = json.dumps({**zone, "geometry": {**geometry, "coordinates": json.RawJSON(packed.to_json())}},
+                               use_decimal=True, separators=(",", ":")).encode("utf-8")
+        binary_body = geometry_codec.dumps({**zone, "geometry": {**geometry, "coordinates": packed}})
+
+        json_seconds, _ = timed(lambda: json.loads(json_body.decode("utf-8")), args.repeat)
+        decimal_seconds, _ = timed(lambda: json.loads(json_body.decode("utf-8"), use_decimal=True), args.repeat)
+        binary_seconds, decoded = timed(lambda: geometry_codec.loads(binary_body), args.repeat)
+        decoded_packed = decoded["geometry"]["coordinates"]
+        to_json_seconds, text = timed(lambda: decoded_packed._format(), args.repeat)
+        if json.loads(text) != json.loads(packed.to_json()):
+            raise AssertionError(f"{name}: binary round trip does not match")
+
+        totals["json_bytes"] += len(json_body)
+        totals["binary_bytes"] += len(binary_body)
+        totals["json_loads"] += json_seconds
+        totals["json_loads_decimal"] += decimal_seconds
+        totals["binary_loads"] += binary_seconds
+        totals["binary_to_json"] += to_json_seconds
+        print(f"{name[:35]:<36}{packed.vertex_count:>10}{len(json_body) / 1024:>10.1f}{len(binary_body) / 1024:>11.1f}"
+              f"{len(json_body) / len(binary_body):>7.1f}{json_seconds * 1000:>9.2f}{decimal_seconds * 1000:>12.2f}"
+              f"{binary_seconds * 1000:>11.2f}{to_json_seconds * 1000:>12.2f}")
+
+    if totals["binary_bytes"]:
+        print(f"{'total':<46}{totals['json_bytes'] / 1024:>10.1f}{totals['binary_bytes'] / 1024:>11.1f}"
+              f"{totals['json_bytes'] / totals['binary_bytes']:>7.1f}{totals['json_loads'] * 1000:>9.2f}"
+              f"{totals['json_loads_decimal'] * 1000:>12.2f}{totals['binary_loads'] * 1000:>11.2f}{totals['binary_to_json'] * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Peak RSS and time of parsing a large NOAA payload with the buffered path
+(response.text + json.loads(parse_float=Decimal)) against JsonArrayStream.
+
+    python benchmarks/json_stream_benchmark.py alerts.json
+    python benchmarks/json_stream_benchmark.py --synthetic 5000
+
+Record a payload with: curl -H "User-Agent: weatherdriver" https://api.weather.gov/alerts/active -o alerts.json
+Each mode runs in its own interpreter so ru_maxrss is not shared between them.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "library"))
+
+_chunk_size = 64 * 1024
+
+
+def write_synthetic_payload(path, feature_count, vertices=400):
+    random.seed(42)
+    with open(path, "w") as f:
+        f.write('{"type":"FeatureCollection","features":[')
+        for i in range(feature_count):
+            lon = random.uniform(-120, -70)
+            lat = random.uniform(25, 48)
+            ring = [[round(lon + random.uniform(0, 1), 6), round(lat + random.uniform(0, 1), 6)] for _ in range(vertices)]
+            ring.append(ring[0])
+            feature = {
+                "id": f"https://api.weather.gov/alerts/urn:oid:{i}",
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {"id": f"urn:oid:{i}", "headline": "Synthetic alert " * 5, "description": "x" * 1500}
+            }
+            if i:
+                f.write(",")
+            f.write(json.dumps(feature))
+        f.write('],"title":"synthetic"}')
+
+
+def run_mode(mode, path, parse_float):
+    parse_float = float if parse_float == "float" else Decimal
+    start = time.perf_counter()
+    count = 0
+    if mode == "buffered":
+        with open(path, "rb") as f:
+            body = f.read()
+        text = body.decode("utf-8")
+        features = json.loads(text, parse_float=parse_float).get("features", [])
+        for _ in features:
+            count += 1
+    else:
+        from json_stream import JsonArrayStream
+        stream = JsonArrayStream("features", parse_float=parse_float)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(_chunk_size)
+                if not chunk:
+                    break
+                for _ in stream.feed(chunk):
+                    count += 1
+        stream.finish()
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "features": count, "seconds": round(elapsed, 3), "peak_rss_mb": round(peak_kb / 1024, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("payload", nargs="?")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate a payload with this many features")
+    parser.add_argument("--parse-float", choices=["decimal", "float"], default="decimal")
+    parser.add_argument("--mode", choices=["buffered", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.payload, args.parse_float)
+        return
+
+    path = args.payload
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), f"synthetic_alerts_{args.synthetic or 2000}.json")
+        if not os.path.isfile(path):
+            write_synthetic_payload(path, args.synthetic or 2000)
+    print(f"Payload {path}: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    baseline = subprocess.run([sys.executable, "-c", "import resource, decimal, json;"
+                               "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"],
+                              capture_output=True, text=True, check=True)
+    print(f"Interpreter baseline: {int(baseline.stdout) / 1024:.1f} MB")
+    for mode in ("buffered", "stream"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), path, "--mode", mode, "--parse-float", args.parse_float], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+NOAA responses for the service benchmark, recorded or synthetic, stored as
+
+    <dir>/alerts.json                    body of https://api.weather.gov/alerts/active
+    <dir>/zones/forecast-TXZ001.json     body of https://api.weather.gov/zones/forecast/TXZ001
+
+Record a fixture set with:
+
+    mkdir -p fixtures/zones
+    curl -H "User-Agent: weatherdriver" https://api.weather.gov/alerts/active -o fixtures/alerts.json
+    jq -r '.features[].properties.affectedZones[]' fixtures/alerts.json | sort -u | while read url; do
+        curl -H "User-Agent: weatherdriver" "$url" -o "fixtures/zones/$(echo ${url#https://api.weather.gov/zones/} | tr / -).json"
+    done
+"""
+import heapq
+import math
+import os
+import random
+import sys
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "library"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import simplejson as json
+from noaa_client import NOAA_ALERTS_URL, NOAA_ZONES_URL
+from geometry_codec_benchmark import synthetic_zone
+
+# (zones, vertices per zone, alerts)
+SIZES = {
+    "small": (100, 500, 50),
+    "medium": (1000, 1000, 300),
+    "large": (2000, 2000, 800)
+}
+# Share of synthetic alerts that ended an hour ago, for cleanup to remove
+_expired_share = 0.2
+# Share of synthetic alerts with a polygon of their own besides their zones
+_own_geometry_share = 0.3
+
+
+def zone_url(file_name):
+    return f"{NOAA_ZONES_URL}/{file_name[:-len('.json')].replace('-', '/', 1)}"
+
+
+def zone_file_name(url):
+    return url[len(NOAA_ZONES_URL) + 1:].replace("/", "-") + ".json"
+
+
+def load_fixtures(path):
+    """
+    NOAA response bodies by URL. The zone list is made up of the zone files present.
+    """
+    with open(os.path.join(path, "alerts.json"), "rb") as f:
+        responses = {NOAA_ALERTS_URL: f.read()}
+    zones_path = os.path.join(path, "zones")
+    zone_list = []
+    for file_name in sorted(os.listdir(zones_path)):
+        if not file_name.endswith(".json"):
+            continue
+        url = zone_url(file_name)
+        with open(os.path.join(zones_path, file_name), "rb") as f:
+            responses[url] = f.read()
+        zone_list.append({"id": url, "type": "Feature", "geometry": None, "properties": {"@id": url, "id": url.rsplit("/", 1)[-1]}})
+    responses[NOAA_ZONES_URL] = json.dumps({"type": "FeatureCollection", "features": zone_list}).encode("utf-8")
+    return responses
+
+
+def write_synthetic_fixtures(path, zone_count, vertices, alert_count, seed=42):
+    """
+    Zones are synthetic_zone rings scattered over the lower 48, each alert covers a zone and up to 7 of its nearest neighbours.
+    """
+    os.makedirs(os.path.join(path, "zones"), exist_ok=True)
+    centers = []
+    for i in range(zone_count):
+        zone = synthetic_zone(i, vertices)
+        ring = zone["geometry"]["coordinates"][0]
+        centers.append((zone["id"], sum(lon for lon, _ in ring) / len(ring), sum(lat for _, lat in ring) / len(ring)))
+        with open(os.path.join(path, "zones", zone_file_name(zone["id"])), "w") as f:
+            json.dump(zone, f, separators=(",", ":"))
+
+    random.seed(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    features = []
+    for i in range(alert_count):
+        _, lon, lat = random.choice(centers)
+        nearest = heapq.nsmallest(random.randint(1, 8), centers, key=lambda center: (center[1] - lon) ** 2 + (center[2] - lat) ** 2)
+        geometry = None
+        if random.random() < _own_geometry_share:
+            ring = [[round(lon + 0.2 * math.cos(2 * math.pi * k / 40), 4), round(lat + 0.2 * math.sin(2 * math.pi * k / 40), 4)] for k in range(40)]
+            geometry = {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+        ends = now - timedelta(hours=1) if random.random() < _expired_share else now + timedelta(days=1)
+        alert_id = f"urn:oid:2.49.0.1.840.0.synthetic.{i:05d}"
+        features.append({
+            "id": f"{NOAA_ALERTS_URL[:-len('/active')]}/{alert_id}",
+            "type": "Feature",
+            "geometry": geometry,
+            "properties": {
+                "@id": f"{NOAA_ALERTS_URL[:-len('/active')]}/{alert_id}",
+                "id": alert_id,
+                "affectedZones": [zone_id for zone_id, _, _ in nearest],
+                "sent": (now - timedelta(hours=2)).isoformat(),
+                "effective": (now - timedelta(hours=2)).isoformat(),
+                "ends": ends.isoformat(),
+                "severity": random.choice(["Minor", "Moderate", "Severe"]),
+                "urgency": random.choice(["Expected", "Immediate"]),
+                "headline": f"Synthetic alert {i}",
+                "description": "Synthetic alert description. " * 40
+            }
+        })
+    with open(os.path.join(path, "alerts.json"), "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features, "title": "synthetic"}, f, separators=(",", ":"))
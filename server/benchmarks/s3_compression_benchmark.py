@@ -0,0 +1,77 @@
+"""
+Stored size, compress time and streaming decode time of S3 objects under each S3_COMPRESSION encoding and level.
+
+    python benchmarks/s3_compression_benchmark.py zones/*.json exports/*.json
+    python benchmarks/s3_compression_benchmark.py --synthetic 10
+
+zstd rows are skipped when the zstandard package is not installed.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "library"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import simplejson as json
+import compression
+from geometry_codec_benchmark import synthetic_zone
+
+_codecs = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("zstd", 1), ("zstd", 3), ("zstd", 9), ("zstd", 19)]
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of synthetic zones when no files are given")
+    parser.add_argument("--vertices", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.paths:
+        bodies = []
+        for path in args.paths:
+            with open(path, "rb") as f:
+                bodies.append(f.read())
+    else:
+        bodies = [json.dumps(synthetic_zone(i, args.vertices), separators=(",", ":")).encode("utf-8") for i in range(args.synthetic or 10)]
+
+    raw_bytes = sum(len(body) for body in bodies)
+    print(f"{len(bodies)} objects, {raw_bytes / 1024:.1f} KB uncompressed")
+    print(f"{'encoding':<10}{'level':>6}{'stored KB':>11}{'ratio':>7}{'compress ms':>13}{'decode ms':>11}")
+    for encoding, level in _codecs:
+        try:
+            compression.compress(b"", encoding, level)
+        except ImportError:
+            print(f"{encoding:<10}{level:>6}  skipped, zstandard is not installed")
+            continue
+
+        stored_bytes = 0
+        compress_seconds = 0.0
+        decode_seconds = 0.0
+        for body in bodies:
+            seconds, stored = timed(lambda: compression.compress(body, encoding, level), args.repeat)
+            compress_seconds += seconds
+            stored_bytes += len(stored)
+            seconds, decoded = timed(lambda: compression.decompress_stream(io.BytesIO(stored), encoding), args.repeat)
+            decode_seconds += seconds
+            if decoded != body:
+                raise AssertionError(f"{encoding}:{level} round trip does not match")
+        print(f"{encoding:<10}{level:>6}{stored_bytes / 1024:>11.1f}{raw_bytes / stored_bytes:>7.1f}"
+              f"{compress_seconds * 1000:>13.2f}{decode_seconds * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
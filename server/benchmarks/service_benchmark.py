@@ -0,0 +1,353 @@
+"""
+Throughput, latency percentiles, allocations and peak RSS of AlertService and ZoneService operations,
+run offline against the in-memory AWS fakes and recorded or synthetic NOAA payloads.
+
+    python benchmarks/service_benchmark.py --size small
+    python benchmarks/service_benchmark.py --size medium --latency-ms 5 --save main.json
+    python benchmarks/service_benchmark.py --size medium --latency-ms 5 --compare main.json
+    python benchmarks/service_benchmark.py --fixtures fixtures/ --scenarios search,export
+
+Scenarios:
+    poll      get_and_store_active_alerts into empty tables, one op per poll
+    backfill  backfill_zone_coordinates of every zone, one op per backfill
+    build     build_and_store_weather_alerts, one op per SQS batch of 10 alerts
+    search    get_weather_alerts_by_coords over random routes from alert areas, one op per search
+    export    rebuild_alert_snapshot, one op per rebuild
+    cleanup   remove_expired_alerts, one op per cleanup
+
+Each scenario runs in its own interpreter so peak RSS is not shared between them. Allocations are the tracemalloc
+peak of one extra round run after the timed ones. Environment settings such as SEARCH_STRATEGY or S3_COMPRESSION
+apply as usual. See noaa_fixtures.py for recording fixtures from the live API.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "library"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import simplejson as json
+import noaa_fixtures
+from aws_fakes import Latency, FakeS3Client, FakeDynamoDbClient, FakeSqsClient, FixtureHttpClient
+
+_scenarios = ["poll", "backfill", "build", "search", "export", "cleanup"]
+_alert_batch_size = 10
+_route_points = 100
+# Metrics compared against a baseline, and whether a higher value is better
+_metrics = [("ops_per_second", True), ("p50_ms", False), ("p99_ms", False), ("alloc_peak_mb", False), ("peak_rss_mb", False)]
+
+
+class World:
+    """
+    The services wired to fresh fakes, as container.py wires them to AWS.
+    """
+    def __init__(self, responses, logger):
+        from noaa_client import NoaaClient
+        from zone_service import ZoneService
+        from alert_service import AlertService
+        from alert_snapshot import AlertSnapshotStore
+
+        self.latency = Latency()
+        self.noaa_latency = Latency()
+        self.s3 = FakeS3Client(self.latency, logger)
+        self.dynamo = FakeDynamoDbClient(self.latency, logger)
+        self.sqs = FakeSqsClient(self.latency, logger)
+        self.http = FixtureHttpClient(responses, self.noaa_latency)
+        noaa_client = NoaaClient(self.http)
+        self.zone_service = ZoneService(noaa_client, self.dynamo, self.sqs, self.s3, logger)
+        self.alert_service = AlertService(noaa_client, self.dynamo, self.s3, self.sqs, self.zone_service,
+                                          AlertSnapshotStore(self.dynamo, self.s3, logger), logger)
+
+    def snapshot(self):
+        return self.s3.snapshot(), self.dynamo.snapshot()
+
+    def restore(self, state):
+        s3_state, dynamo_state = state
+        self.s3.restore(s3_state)
+        self.dynamo.restore(dynamo_state)
+
+    def store_zones(self):
+        zone_ids = asyncio.run(self.zone_service.get_and_store_all_zones(force=True, enqueue=False))
+        asyncio.run(self.zone_service.backfill_zone_coordinates(zone_ids, requests_per_second=1e9))
+        return zone_ids
+
+    def poll(self):
+        self.http._etags.clear()
+        return asyncio.run(self.alert_service.get_and_store_active_alerts())["total"]
+
+    def build(self, alert_ids):
+        return len(asyncio.run(self.alert_service.build_and_store_weather_alerts(alert_ids))["built"])
+
+    def queued_alert_ids(self):
+        return [message["id"] for message in self.sqs.receive("alerts-queue")]
+
+
+class Scenario:
+    """
+    prepare() builds the state the scenario starts from, reset() returns to it before each round, and
+    operations() lists the timed calls of one round, each returning the number of items it processed.
+    """
+    def __init__(self, world: World, args):
+        self.world = world
+        self.args = args
+        self.prepared = None
+
+    def prepare(self):
+        self.prepared = self.world.snapshot()
+
+    def reset(self, round_number):
+        self.world.restore(self.prepared)
+
+    def operations(self, round_number):
+        raise NotImplementedError
+
+    def build_all(self):
+        self.world.store_zones()
+        self.world.poll()
+        alert_ids = self.world.queued_alert_ids()
+        for i in range(0, len(alert_ids), _alert_batch_size):
+            self.world.build(alert_ids[i:i + _alert_batch_size])
+
+
+class PollScenario(Scenario):
+    def operations(self, round_number):
+        return [self.world.poll]
+
+
+class BackfillScenario(Scenario):
+    def prepare(self):
+        self.zone_ids = asyncio.run(self.world.zone_service.get_and_store_all_zones(force=True, enqueue=False))
+        super().prepare()
+
+    def operations(self, round_number):
+        backfill = self.world.zone_service.backfill_zone_coordinates
+        return [lambda: len(asyncio.run(backfill(self.zone_ids, requests_per_second=1e9))["completed"])]
+
+
+class BuildScenario(Scenario):
+    def prepare(self):
+        self.world.store_zones()
+        self.world.poll()
+        self.alert_ids = self.world.queued_alert_ids()
+        super().prepare()
+
+    def operations(self, round_number):
+        batches = [self.alert_ids[i:i + _alert_batch_size] for i in range(0, len(self.alert_ids), _alert_batch_size)]
+        return [lambda batch=batch: self.world.build(batch) for batch in batches]
+
+
+class SearchScenario(Scenario):
+    def prepare(self):
+        self.build_all()
+        # Routes start inside an alert's bounding box, uniformly placed routes would mostly miss every alert
+        self.starts = sorted((float(item["min_lat"]), float(item["max_lat"]), float(item["min_lon"]), float(item["max_lon"]))
+                             for item in self.world.dynamo.tables["WeatherAlert"].values() if item.get("min_lat") is not None)
+        super().prepare()
+
+    def reset(self, round_number):
+        pass
+
+    def operations(self, round_number):
+        # Different routes every round, so no search is answered from the route export cache
+        rng = random.Random(round_number)
+        return [lambda route=self.random_route(rng): self.search(route) for _ in range(self.args.searches)]
+
+    def random_route(self, rng):
+        min_lat, max_lat, min_lon, max_lon = rng.choice(self.starts)
+        lat, lon = rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+        heading = rng.uniform(0, 2 * math.pi)
+        route = []
+        for _ in range(_route_points):
+            heading += rng.uniform(-0.3, 0.3)
+            lat, lon = lat + 0.02 * math.sin(heading), lon + 0.02 * math.cos(heading)
+            route.append([round(lat, 5), round(lon, 5)])
+        return route
+
+    def search(self, route):
+        self.world.alert_service.get_weather_alerts_by_coords(route, True, None)
+        return 1
+
+
+class ExportScenario(Scenario):
+    def prepare(self):
+        self.build_all()
+        super().prepare()
+
+    def operations(self, round_number):
+        def export():
+            self.world.alert_service.rebuild_alert_snapshot()
+            return len(self.world.dynamo.tables["WeatherAlert"])
+        return [export]
+
+
+class CleanupScenario(Scenario):
+    def prepare(self):
+        self.build_all()
+        super().prepare()
+
+    def operations(self, round_number):
+        return [self.world.alert_service.remove_expired_alerts]
+
+
+_scenario_classes = {
+    "poll": PollScenario,
+    "backfill": BackfillScenario,
+    "build": BuildScenario,
+    "search": SearchScenario,
+    "export": ExportScenario,
+    "cleanup": CleanupScenario
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(name, args):
+    """
+    Runs in a child interpreter and prints the scenario's results as one JSON line.
+    """
+    logger = logging.getLogger("service_benchmark")
+    logger.setLevel(logging.WARNING)
+    world = World(noaa_fixtures.load_fixtures(args.fixtures), logger)
+    scenario = _scenario_classes[name](world, args)
+    scenario.prepare()
+    prepared_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    world.latency.configure(args.latency_ms, args.jitter_ms)
+    world.noaa_latency.configure(args.noaa_latency_ms, args.jitter_ms)
+    world.latency.calls.clear()
+
+    samples = []
+    items = 0
+    for round_number in range(args.rounds):
+        scenario.reset(round_number)
+        for operation in scenario.operations(round_number):
+            start = time.perf_counter()
+            items += operation() or 0
+            samples.append(time.perf_counter() - start)
+    aws_calls = dict(world.latency.calls)
+
+    scenario.reset(args.rounds)
+    tracemalloc.start()
+    for operation in scenario.operations(args.rounds):
+        operation()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed = sum(samples)
+    print(json.dumps({
+        "scenario": name,
+        "ops": len(samples),
+        "ops_per_second": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "items_per_second": round(items / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 2) if samples else 0.0,
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2) if samples else 0.0,
+        "alloc_peak_mb": round(alloc_peak / 1024 / 1024, 1),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "prepared_rss_mb": round(prepared_rss_kb / 1024, 1),
+        "aws_calls_per_op": {call: round(count / len(samples), 1) for call, count in sorted(aws_calls.items())} if samples else {}
+    }))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline):
+    print(f"{'scenario':<10}{'ops':>6}{'ops/s':>10}{'items/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'alloc MB':>10}{'RSS MB':>9}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['ops']:>6}{result['ops_per_second']:>10.2f}{result['items_per_second']:>10.1f}"
+              f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['alloc_peak_mb']:>10.1f}{result['peak_rss_mb']:>9.1f}")
+        previous = (baseline or {}).get("results", {}).get(name)
+        if previous:
+            changes = []
+            for metric, higher_is_better in _metrics:
+                if previous.get(metric):
+                    change = (result[metric] - previous[metric]) / previous[metric] * 100
+                    better = change >= 0 if higher_is_better else change <= 0
+                    changes.append(f"{metric} {change:+.1f}%{'' if better or abs(change) < 5 else ' !'}")
+            print(f"{'':<10}vs {baseline.get('commit') or 'baseline'}: {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=list(noaa_fixtures.SIZES), default="small", help="synthetic fixture size when --fixtures is not given")
+    parser.add_argument("--fixtures", help="directory of recorded NOAA responses, see noaa_fixtures.py")
+    parser.add_argument("--scenarios", default=",".join(_scenarios))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--searches", type=int, default=50, help="routes searched per round")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every S3, DynamoDB and SQS call")
+    parser.add_argument("--noaa-latency-ms", type=float, default=0.0, help="added to every NOAA request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="baseline file to compare the results against")
+    parser.add_argument("--scenario", choices=_scenarios, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        run_scenario(args.scenario, args)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in _scenario_classes:
+            parser.error(f"unknown scenario {name}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for setting in ("size", "fixtures", "rounds", "searches", "latency_ms", "noaa_latency_ms", "jitter_ms"):
+            if baseline.get("settings", {}).get(setting) != getattr(args, setting):
+                print(f"Warning: baseline {setting} is {baseline.get('settings', {}).get(setting)}, this run uses {getattr(args, setting)}")
+
+    fixtures = args.fixtures
+    synthetic_path = None
+    if not fixtures:
+        synthetic_path = fixtures = tempfile.mkdtemp(prefix=f"weatherdriver_{args.size}_")
+        noaa_fixtures.write_synthetic_fixtures(fixtures, *noaa_fixtures.SIZES[args.size])
+
+    results = {}
+    try:
+        print(f"Fixtures {fixtures}: {len(os.listdir(os.path.join(fixtures, 'zones')))} zones, "
+              f"{os.path.getsize(os.path.join(fixtures, 'alerts.json')) / 1024 / 1024:.1f} MB of alerts")
+        child_args = ["--fixtures", fixtures, "--rounds", str(args.rounds), "--searches", str(args.searches),
+                      "--latency-ms", str(args.latency_ms), "--noaa-latency-ms", str(args.noaa_latency_ms), "--jitter-ms", str(args.jitter_ms)]
+        for name in scenarios:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--scenario", name, *child_args],
+                                    capture_output=True, text=True, check=True).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+    finally:
+        if synthetic_path:
+            shutil.rmtree(synthetic_path, ignore_errors=True)
+
+    print_results(results, baseline)
+
+    if args.save:
+        settings = {setting: getattr(args, setting) for setting in ("size", "fixtures", "rounds", "searches", "latency_ms", "noaa_latency_ms", "jitter_ms")}
+        with open(args.save, "w") as f:
+            json.dump({"commit": git_commit(), "created": datetime.now(timezone.utc).isoformat(), "settings": settings,
+                       "environment": {key: os.environ[key] for key in ("SEARCH_STRATEGY", "S3_COMPRESSION", "GEOMETRY_FORMAT") if key in os.environ},
+                       "results": results}, f, indent=2)
+        print(f"Saved baseline {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,13 @@ import json
 import os
 import sys
 import asyncio
-from container import create_container
+import time
+from container import get_container, timed_handler
 from alert_service import AlertService
+from zone_service import ZoneService
+from s3_client import S3Client
 
+@timed_handler("alert_listener")
 def lambda_handler(event, context):
     """
     Lambda handler for processing SQS messages with alert IDs.
@@ -12,34 +16,43 @@ def lambda_handler(event, context):
       - Get the alert from DynamoDB
       - Get affected zones and their coordinates
       - Upsert a record into a new table of alerts with alert and zone info
+    Then splice the built alerts into the "all alerts" snapshots.
     """
-    container = create_container()
+    container = get_container()
     alert_service = container.resolve(AlertService)
-    
+
+    # Collect the whole batch so the alerts are built concurrently on one event loop
+    alert_records = {}
     for record in event["Records"]:
-        msg = json.loads(record["body"])
-        alert_id = msg.get("id")
-        if not alert_id:
-            print("No alert_id in message")
-            continue
-
-        asyncio.run(alert_service.build_and_store_weather_alert(alert_id))
-        
-        # try:
-        #     msg = json.loads(record["body"])
-        #     alert_id = msg.get("id")
-        #     if not alert_id:
-        #         print("No alert_id in message")
-        #         continue
-
-        #     asyncio.run(alert_service.build_and_store_weather_alert(alert_id))
-
-        # except Exception as e:
-            # print(f"Failed to process message: {e}")
+        try:
+            msg = json.loads(record["body"])
+            alert_id = msg.get("id")
+            if not alert_id:
+                print("No alert_id in message")
+                continue
+            alert_records.setdefault(alert_id, []).append(record.get("messageId"))
+
+        except Exception as e:
+            print(f"Failed to process message: {e}")
+
+    # Leave time to report the failed alerts, the snapshot lease is never held past the invocation
+    deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 5 if context else None
+    result = asyncio.run(alert_service.build_and_store_weather_alerts(list(alert_records), deadline=deadline))
+
+    print(f"Zone cache stats: {container.resolve(ZoneService).get_zone_cache_stats()}")
+    print(f"S3 compression stats: {container.resolve(S3Client).get_compression_stats()}")
+
+    # Partial batch response, only the failed alerts are retried by SQS
+    failures = [
+        {"itemIdentifier": message_id}
+        for alert_id in result["failed"]
+        for message_id in alert_records[alert_id]
+    ]
 
     return {
         'statusCode': 200,
-        'body': json.dumps('Processed SQS messages')
+        'body': json.dumps('Processed SQS messages'),
+        'batchItemFailures': failures
     }
 
 if __name__ == "__main__":
@@ -1,14 +1,25 @@
-from container import create_container
+import time
+from container import get_container, timed_handler
 from alert_service import AlertService
 
 # poll_alerts lambda to be triggered by a timer and 
 # get active alerts and store each of those in Dynamo
 
+@timed_handler("cleanup")
 def lambda_handler(event, context):
-    container = create_container()
+    container = get_container()
     alert_service = container.resolve(AlertService)
 
-    alert_count = alert_service.remove_expired_alerts()
+    if (event or {}).get("rebuild_snapshot"):
+        alert_service.rebuild_alert_snapshot()
+    if (event or {}).get("rebuild_zone_alert_index"):
+        alert_service.rebuild_zone_alert_index()
+    if (event or {}).get("rebuild_alert_tile_index"):
+        alert_service.rebuild_alert_tile_index()
+
+    # {"full_scan": true} also removes alerts that are missing from the expiry index
+    deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 5 if context else None
+    alert_count = alert_service.remove_expired_alerts((event or {}).get("full_scan", False), deadline)
     return {
         "statusCode": 200,
         "body": f"Removed {alert_count} expired alerts."
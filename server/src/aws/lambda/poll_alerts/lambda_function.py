@@ -1,18 +1,33 @@
 import asyncio
-from container import create_container
+from container import get_container, timed_handler
 from alert_service import AlertService
+from http_client import HttpClient
 
 # poll_alerts lambda to be triggered by a timer and 
 # get active alerts and store each of those in Dynamo
 
+@timed_handler("poll_alerts")
 def lambda_handler(event, context):
-    container = create_container()
+    container = get_container()
     alert_service = container.resolve(AlertService)
 
-    alerts = asyncio.run(alert_service.get_and_store_active_alerts())
+    force = bool(event and event.get("force"))
+    counts = asyncio.run(alert_service.get_and_store_active_alerts(force))
+    print(f"NOAA conditional request stats: {container.resolve(HttpClient).get_conditional_stats()}")
+    if counts["not_modified"]:
+        return {
+            "statusCode": 200,
+            "body": "Active alerts not modified since the last poll."
+        }
+    if counts["failed"]:
+        return {
+            "statusCode": 500,
+            "body": f"{counts['failed']} of {counts['total']} alerts could not be enqueued, they are sent again by the next poll."
+        }
     return {
         "statusCode": 200,
-        "body": f"Alerts processed successfully: {alerts} alerts found."
+        "body": f"Alerts processed successfully: {counts['total']} alerts found, "
+                f"{counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged."
     }
 
 
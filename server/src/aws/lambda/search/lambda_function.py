@@ -1,9 +1,11 @@
 import simplejson as json
-from container import create_container
+from container import get_container, timed_handler
 from alert_service import AlertService
+from s3_client import S3Client
 
+@timed_handler("search")
 def lambda_handler(event, context):
-    container = create_container()
+    container = get_container()
     alert_service = container.resolve(AlertService)
     
     alerts = []
@@ -16,19 +18,25 @@ def lambda_handler(event, context):
         elif not body:
             body = event
 
-        # Expecting: {"coordinates": [[lat, lon], ...]}
+        # Expecting: {"coordinates": [[lat, lon], ...], "match_segments": true, "resolution": "full" | "100m" | "1km"}
         coordinates = body.get("coordinates")
+        resolution = body.get("resolution")
+        # Omitted means the service default, strings such as "false" would otherwise be truthy
+        match_segments = body.get("match_segments")
+        if match_segments is not None and not isinstance(match_segments, bool):
+            raise ValueError(f"match_segments must be true or false, got {match_segments!r}")
         if not coordinates or not isinstance(coordinates, list):
-            alerts = alert_service.get_all_weather_alerts()
+            alerts = alert_service.get_all_weather_alerts(resolution=resolution)
         else:
-            alerts = alert_service.get_weather_alerts_by_coords(coordinates)
+            alerts = alert_service.get_weather_alerts_by_coords(coordinates, match_segments, resolution)
     except Exception as e:
         return {
             'statusCode': 400,
             'body': json.dumps({"error": f"Invalid input: {str(e)}"})
         }
 
-    
+    print(f"Search cache stats: {alert_service.get_search_cache_stats()}")
+    print(f"S3 compression stats: {container.resolve(S3Client).get_compression_stats()}")
 
     return {
         'statusCode': 200,
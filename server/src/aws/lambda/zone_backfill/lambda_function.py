@@ -1,16 +1,35 @@
 import json
 import asyncio
 import time
-from container import create_container
+from container import get_container, timed_handler
 from zone_service import ZoneService
 
+@timed_handler("zone_backfill")
 def lambda_handler(event, context):
     print("Starting Lambda handler for zone backfill...")
     start = time.time()
-    container = create_container()
+    container = get_container()
     zone_service = container.resolve(ZoneService)
 
-    asyncio.run(zone_service.get_and_store_all_zones())
+    if event and event.get("mode") == "direct":
+        # Backfill the coordinates in this invocation, stopping early enough to save the checkpoint.
+        # Invoke again with the same event to resume an unfinished run.
+        deadline = None
+        if context:
+            deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 60
+        result = asyncio.run(zone_service.backfill_all_zone_coordinates(deadline=deadline))
+        duration_ms = int((time.time() - start) * 1000)
+        print(f"Zone backfill completed in {duration_ms} ms")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f'Zone backfill completed Duration: {duration_ms} ms '
+                               f'Completed: {len(result["completed"])} Failed: {len(result["failed"])} '
+                               f'Remaining: {len(result["remaining"])}')
+        }
+
+    # Pass {"force": false} to skip the backfill when the zone list is unchanged since the last run
+    force = not event or event.get("force", True)
+    asyncio.run(zone_service.get_and_store_all_zones(force))
 
     duration_ms = int((time.time() - start) * 1000)
     print(f"Zone backfill completed in {duration_ms} ms")
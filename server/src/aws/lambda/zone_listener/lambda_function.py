@@ -2,13 +2,16 @@ import json
 import os
 import sys
 import asyncio
-from container import create_container
+from container import get_container, timed_handler
 from zone_service import ZoneService
 
+@timed_handler("zone_listener")
 def lambda_handler(event, context):
-    container = create_container()
+    container = get_container()
     zone_service = container.resolve(ZoneService)
-    
+
+    # Collect the whole batch so the zones are fetched concurrently on one event loop
+    zone_records = {}
     for record in event["Records"]:
         try:
             msg = json.loads(record["body"])
@@ -16,15 +19,24 @@ def lambda_handler(event, context):
             if not zone_id:
                 print("No zone_id in message")
                 continue
-
-            asyncio.run(zone_service.get_and_store_zone_coordinates(zone_id))
+            zone_records.setdefault(zone_id, []).append(record.get("messageId"))
 
         except Exception as e:
             print(f"Failed to process message: {e}")
 
+    result = asyncio.run(zone_service.backfill_zone_coordinates(list(zone_records)))
+
+    # Partial batch response, only the failed zones are retried by SQS
+    failures = [
+        {"itemIdentifier": message_id}
+        for zone_id in list(result["failed"]) + result["remaining"]
+        for message_id in zone_records[zone_id]
+    ]
+
     return {
         'statusCode': 200,
-        'body': json.dumps('Processed SQS messages')
+        'body': json.dumps('Processed SQS messages'),
+        'batchItemFailures': failures
     }
 
 if __name__ == "__main__":
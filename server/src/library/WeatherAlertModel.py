@@ -1,13 +1,68 @@
+import os
 from typing import List, Any, Optional
 from datetime import datetime
 from decimal import Decimal
+from simplejson import RawJSON
 
 _precision = 5  
 
+# Levels of detail stored side by side for every zone and weather alert, by simplification tolerance in meters
+RESOLUTIONS = {"full": 0, "100m": 100, "1km": 1000}
+FULL_RESOLUTION = "full"
+
+# Storage format for zone and weather alert objects: "json", or "binary" for geometry_codec documents
+GEOMETRY_FORMAT = os.environ.get("GEOMETRY_FORMAT", "json")
+
+def validate_resolution(resolution):
+    resolution = resolution or FULL_RESOLUTION
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}")
+    return resolution
+
 class Geometry:
     def __init__(self, type: str, coordinates: List[Any]):
         self.type = type
-        self.coordinates = coordinates
+        self._packed = None
+        # Geometries decoded from the binary format arrive packed, their nested lists are only built when asked for
+        if hasattr(coordinates, "vertices"):
+            self._packed = coordinates
+            coordinates = None
+        self._coordinates = coordinates
+
+    @property
+    def coordinates(self):
+        if self._coordinates is None and self._packed:
+            self._coordinates = self._packed.coordinates()
+        return self._coordinates
+
+    @coordinates.setter
+    def coordinates(self, coordinates):
+        self._coordinates = coordinates
+
+    def packed(self):
+        """
+        The coordinates packed into float64 arrays, built on first use. None when they can't be packed.
+        """
+        if self._packed is None:
+            # Deferred so handlers that never serialize geometries don't pay for importing numpy
+            from packed_geometry import PackedCoordinates
+            self._packed = PackedCoordinates.from_geojson(self.type, self.coordinates) or False
+        return self._packed or None
+
+    def simplified(self, tolerance):
+        """
+        The geometry simplified with a tolerance in meters, or this geometry when it can't be packed.
+        """
+        packed = self.packed()
+        if packed is None or not tolerance:
+            return self
+        from simplify import simplify
+        simplified = simplify(packed, tolerance)
+        if simplified is packed:
+            return self
+        geometry = Geometry(type=self.type, coordinates=simplified.coordinates())
+        geometry._packed = simplified
+        return geometry
 
     def round_value(self, value, precision=_precision):
         return round(Decimal(value), precision) if isinstance(value, (float, Decimal, int)) else value
@@ -21,11 +76,24 @@ class Geometry:
             else:
                 return item
         self.coordinates = round_item(self.coordinates)
+        if self._packed:
+            self._packed = None
 
-    def to_dict(self):
+    def to_dict(self, packed=False):
+        """
+        Packed coordinates are serialized already rounded, as raw JSON for simplejson,
+        or as the PackedCoordinates themselves for geometry_codec when packed is set.
+        """
+        packed_coordinates = self.packed()
+        if packed_coordinates is None:
+            coordinates = self.coordinates
+        elif packed:
+            coordinates = packed_coordinates
+        else:
+            coordinates = RawJSON(packed_coordinates.to_json())
         return {
             "type": self.type,
-            "coordinates": self.coordinates
+            "coordinates": coordinates
         }
 
 class WeatherAlert:
@@ -61,11 +129,7 @@ class WeatherAlert:
         self.min_lon = Decimal(str(min_lon)) if min_lon is not None else Decimal(0.0)
         self.max_lon = Decimal(str(max_lon)) if max_lon is not None else Decimal(0.0)
 
-    def to_dict(self, include_geometry=True):
-        # Round all geometry coordinates before serializing
-        for g in self.geometry:
-            if hasattr(g, "round_coordinates"):
-                g.round_coordinates()
+    def to_dict(self, include_geometry=True, packed=False):
         result = {
             "id": self.id,
             "start": self.start.isoformat() if self.start else "",
@@ -82,7 +146,11 @@ class WeatherAlert:
             "max_lon": Geometry.round_value(self, self.max_lon)
         }
         if include_geometry:
-            result["geometry"] = [g.to_dict() for g in self.geometry]
+            # Round the geometries that can't be packed, packed ones are rounded when serialized
+            for g in self.geometry:
+                if hasattr(g, "round_coordinates") and g.packed() is None:
+                    g.round_coordinates()
+            result["geometry"] = [g.to_dict(packed) for g in self.geometry]
         return result
 
     @classmethod
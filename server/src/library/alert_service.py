@@ -1,49 +1,214 @@
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from decimal import Decimal
+import asyncio
+import os
+import time
 import uuid
+import copy
+import hashlib
 import simplejson as json
 import logging
-from WeatherAlertModel import Geometry, WeatherAlert
-from noaa_client import NoaaClient
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from WeatherAlertModel import Geometry, WeatherAlert, RESOLUTIONS, FULL_RESOLUTION, GEOMETRY_FORMAT, validate_resolution
+from noaa_client import NoaaClient, NOT_MODIFIED
 from dynamo_client import DynamoDbClient
 from s3_client import S3Client
 from sqs_client import SqsClient
 from zone_service import ZoneService
+from spatial_index import SpatialIndex
+from alert_snapshot import AlertSnapshotStore
+from lru_cache import LruCache
+from export_writer import ExportWriter, JsonArrayWriter
+import geohash
+
+# Routes are snapped to this grid in degrees before matching, so nearby re-queries share a cached export. 0 disables the cache
+_search_cache_grid_degrees = float(os.environ.get("SEARCH_CACHE_GRID_DEGREES", "0.001"))
+_search_cache_ttl_seconds = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "900"))
+_export_url_expires_in = 3600
+# Cached URLs this close to expiring are signed again
+_export_url_resign_seconds = 300
+# Weather alerts fetched ahead of the one being written to an export
+_export_prefetch = int(os.environ.get("EXPORT_PREFETCH", "8"))
+# "zones" resolves route searches through the zone -> alerts index, "tiles" through the geohash tile -> alerts
+# index, "alerts" scans every alert. "zones" only finds zones with a bounding box in ZoneMetadata, so switch
+# to it once the zone backfill has written metadata for every stored zone
+_search_strategy = os.environ.get("SEARCH_STRATEGY", "alerts")
+# Geohash length of the AlertTiles index, 4 is about 20 x 40 km at the equator
+_tile_precision = int(os.environ.get("TILE_PRECISION", "4"))
+# Index rows written at once while storing a weather alert
+_index_write_concurrency = int(os.environ.get("INDEX_WRITE_CONCURRENCY", "8"))
+# Expired alerts are looked up in the expiry index partitions of this many past days
+_expiry_lookback_days = int(os.environ.get("EXPIRY_LOOKBACK_DAYS", "30"))
+# Weather alerts built at once from an SQS batch, each also fetches its zones concurrently
+_alert_build_concurrency = int(os.environ.get("ALERT_BUILD_CONCURRENCY", "4"))
+
+# Export keys of recent route searches shared by every invocation of a warm Lambda, bounded by their approximate size
+_search_cache = LruCache(int(os.environ.get("SEARCH_CACHE_MAX_BYTES", str(1024 * 1024))))
 
 class AlertService:
-    def __init__(self, noaa_client: NoaaClient, dynamo_client: DynamoDbClient, s3_client: S3Client, sqs_client: SqsClient, zone_service: ZoneService, logger: logging.Logger):
+    def __init__(self, noaa_client: NoaaClient, dynamo_client: DynamoDbClient, s3_client: S3Client, sqs_client: SqsClient, zone_service: ZoneService, alert_snapshot_store: AlertSnapshotStore, logger: logging.Logger):
         self._noaa_client = noaa_client
         self._dynamo_client = dynamo_client
         self._s3_client = s3_client
         self._sqs_client = sqs_client
         self._zone_service = zone_service
+        self._alert_snapshot_store = alert_snapshot_store
         self._logger = logger
 
     _alerts_table_name = "Alert"
     _weather_alerts_table_name = "WeatherAlert"
+    _weather_alerts_expiry_index = "ExpiryIndex"
+    _zone_alerts_table_name = "ZoneAlerts"
+    _alert_tiles_table_name = "AlertTiles"
+    # ZoneAlerts key listing the alerts that have a polygon of their own besides their zones
+    _alert_geometry_key = "alert-geometry"
     _weather_alerts_bucket_name = "weather-alerts-bucket-202505"
     _weather_alerts_export_bucket_name = "weather-alerts-export-bucket-202505"
     _zones_coordinates_table_name = "ZoneCoordinates"
     _alerts_zone_name = "alerts-queue"
+    _sqs_send_concurrency = 4
+    _alert_batch_size = 100
 
-    async def get_and_store_active_alerts(self):
-        alerts = await self._noaa_client.get_active_alerts()
-        self._logger.info(f"Fetched {len(alerts)} alerts from NOAA API.")
+    # Spatial index over the alert bounding boxes, kept for the life of a warm Lambda
+    _spatial_index = None
+    _spatial_index_version = None
 
+    # Polygon rings of recently matched alerts keyed by alert id, used to refine bounding box matches
+    _geometry_cache = OrderedDict()
+    _geometry_cache_size = 500
+    _match_route_segments = True
+
+    async def get_and_store_active_alerts(self, force=False):
+        """
+        Store new or changed NOAA alerts and enqueue them for building. An alert is unchanged when
+        its properties.sent and the hash of its content match the item already stored.
+        Alerts are parsed as the response streams in and processed in batches, so the full payload is never in memory.
+        Returns the counts of new, changed, unchanged and failed alerts, failed ones could not be enqueued and are sent again by the next poll.
+        """
+        counts = {"total": 0, "new": 0, "changed": 0, "unchanged": 0, "failed": 0, "not_modified": False}
+        batch = []
+        async for alert in self._noaa_client.iter_active_alerts(conditional=not force):
+            if alert is NOT_MODIFIED:
+                self._logger.info("NOAA active alerts not modified since the last poll.")
+                counts["not_modified"] = True
+                return counts
+            batch.append(alert)
+            if len(batch) >= self._alert_batch_size:
+                self._store_changed_alerts(batch, force, counts)
+                batch = []
+        if batch:
+            self._store_changed_alerts(batch, force, counts)
+        if counts["failed"]:
+            # A 304 on the next poll would skip the alerts that could not be enqueued
+            self._logger.error(f"{counts['failed']} alerts could not be enqueued, keeping the previous NOAA validators.")
+        else:
+            self._noaa_client.commit_active_alerts()
+
+        self._logger.info(f"Fetched {counts['total']} alerts from NOAA API.")
+        self._logger.info(f"Alert poll: {counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged.")
+        return counts
+
+    def _store_changed_alerts(self, alerts, force, counts):
         for alert in alerts:
             alert["id"]= alert.get("properties", {}).get("id", "")
-            self._dynamo_client.upsert_item(self._alerts_table_name, alert)
-            self._logger.info(f"Stored alert {alert.get('id')} in the database.")
-            self._sqs_client.send_message(
-                queue_name=self._alerts_zone_name,
-                message_body={
-                    "id": alert.get("id")
-                }
-            )
-        self._logger.info(f"Sent {len(alerts)} alerts to SQS queue {self._alerts_zone_name}.")        
-        return len(alerts)
+            alert["sent"] = alert.get("properties", {}).get("sent", "")
+            alert["content_hash"] = self.get_alert_content_hash(alert)
+
+        existing = {}
+        if not force:
+            stored = self._dynamo_client.get_items_by_id_list(
+                self._alerts_table_name, [alert["id"] for alert in alerts], attributes=["sent", "content_hash"])
+            existing = {item.get("id"): item for item in stored}
+
+        new_alerts = []
+        changed_alerts = []
+        for alert in alerts:
+            stored = existing.get(alert["id"])
+            if stored is None:
+                new_alerts.append(alert)
+            elif stored.get("sent") != alert["sent"] or stored.get("content_hash") != alert["content_hash"]:
+                changed_alerts.append(alert)
+
+        to_store = new_alerts + changed_alerts
+        counts["total"] += len(alerts)
+        counts["new"] += len(new_alerts)
+        counts["changed"] += len(changed_alerts)
+        counts["unchanged"] += len(alerts) - len(to_store)
+
+        # Stored without content_hash until enqueued: alert_listener can read the alert as soon as its message
+        # is sent, and an alert that fails to send still looks changed to the next poll
+        self._dynamo_client.upsert_items(self._alerts_table_name, [
+            {key: value for key, value in alert.items() if key != "content_hash"} for alert in to_store
+        ])
+        self._logger.info(f"Stored {len(to_store)} alerts in the database.")
+
+        failed = self._sqs_client.send_message_batch(
+            queue_name=self._alerts_zone_name,
+            message_bodies=[{"id": alert.get("id")} for alert in to_store],
+            max_concurrency=self._sqs_send_concurrency
+        )
+        failed_ids = {json.loads(body)["id"] for body in failed}
+        sent = [alert for alert in to_store if alert["id"] not in failed_ids]
+        self._dynamo_client.upsert_items(self._alerts_table_name, sent)
+        counts["failed"] += len(failed_ids)
+        self._logger.info(f"Sent {len(sent)} alerts to SQS queue {self._alerts_zone_name}.")
+
+    def get_alert_content_hash(self, alert):
+        content = {key: value for key, value in alert.items() if key not in ("id", "sent", "content_hash")}
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str, separators=(',', ':')).encode("utf-8")).hexdigest()
+
+    async def build_and_store_weather_alerts(self, alert_ids, max_concurrency=None, deadline=None):
+        """
+        Build a batch of weather alerts concurrently on one event loop, then splice them into the
+        alert snapshots with a single update, by the time.monotonic() deadline when one is given.
+        Returns {"built": [...], "failed": {alert_id: error}}.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or _alert_build_concurrency)
+        built = {}
+        build_hashes = {}
+        failed = {}
+
+        async def build(alert_id):
+            async with semaphore:
+                try:
+                    result = await self.build_and_store_weather_alert(alert_id)
+                    if result:
+                        built[alert_id], build_hashes[alert_id] = result
+                except Exception as e:
+                    self._logger.error(f"Failed to build weather alert {alert_id}: {e}")
+                    failed[alert_id] = str(e)
+
+        await asyncio.gather(*(build(alert_id) for alert_id in dict.fromkeys(alert_ids)))
+
+        if built:
+            try:
+                await asyncio.to_thread(self.update_alert_snapshot, built, (), deadline)
+            except Exception as e:
+                # The alerts are stored without their build_hash, retrying them builds them again and splices them in
+                self._logger.error(f"Failed to update alert snapshots: {e}")
+                failed.update({alert_id: f"Snapshot update failed: {e}" for alert_id in built})
+                built = {}
+            # Only once the alerts are in the snapshot, or a retry after the Lambda is killed would skip them as unchanged
+            for alert_id in built:
+                if build_hashes[alert_id]:
+                    self._dynamo_client.set_attributes(self._weather_alerts_table_name, alert_id, {"build_hash": build_hashes[alert_id]})
+
+        self._logger.info(f"Built {len(built)} weather alerts, {len(failed)} failed.")
+        return {"built": list(built), "failed": failed}
 
     async def build_and_store_weather_alert(self, alert_id):
+        """
+        Build the weather alert on a worker thread, the S3 and DynamoDB calls block.
+        """
+        return await asyncio.to_thread(self.store_weather_alert, alert_id)
+
+    def store_weather_alert(self, alert_id):
+        """
+        Build the weather alert from the alert and its zones and store it at every resolution.
+        Returns the alert's export JSON by resolution for update_alert_snapshot and its build hash,
+        to be stored once the snapshot is updated, or None if it was not built.
+        """
         logging.info(f"Building weather alert for ID: {alert_id}")
         alert = self._dynamo_client.get_item_by_id(self._alerts_table_name, alert_id)
         if not alert:
@@ -55,42 +220,29 @@ class AlertService:
             print(f"No zones found for alert {alert_id}")
             return
 
-        zones = []
-        for zone_id in affected_zone_ids:
-            zone = self._zone_service.get_zone_coordinates_from_s3(zone_id)
-            if zone:
-                zones.append(zone)
+        # Zone bboxes and content hashes, so an unchanged alert never downloads its zones' geometry
+        zone_metadata = self._zone_service.get_zones_metadata(affected_zone_ids)
+        build_hash = self.get_build_hash(alert, affected_zone_ids, zone_metadata)
+        stored = self._dynamo_client.get_item_by_id(self._weather_alerts_table_name, alert.get("id", alert_id))
+        # Alerts stored before the zone index have no zone_ids and are rebuilt to index them
+        if build_hash is not None and stored and stored.get("build_hash") == build_hash and "zone_ids" in stored:
+            self._logger.info(f"Weather alert {alert_id} and its zones are unchanged, not rebuilding it.")
+            return None
+
+        zones = [zone for zone in self._zone_service.get_zones_coordinates_from_s3(affected_zone_ids) if zone]
 
         properties = alert.get("properties", {})
 
-        alert_geometries = []
-        min_lat = max_lat = min_lon = max_lon = None
+        alert_geometry = None
         if alert.get("geometry"):
-            alert_geometries.append(Geometry(type=alert.get("geometry").get("type", ""),coordinates=alert.get("geometry").get("coordinates", [])))
-            min_lat, max_lat, min_lon, max_lon = self.get_min_max_lat_lon(alert.get("geometry").get("coordinates", []))
+            alert_geometry = Geometry(type=alert.get("geometry").get("type", ""),coordinates=alert.get("geometry").get("coordinates", []))
+        alert_geometries = ([alert_geometry] if alert_geometry else []) + self.get_zone_geometries(zones)
 
-        for zone in zones:
-            if zone and "geometry" in zone:
-                geom = zone["geometry"]
-                alert_geometries.append(
-                    Geometry(
-                        type=geom.get("type", ""),
-                        coordinates=geom.get("coordinates", [])
-                    )
-                )
-                # Calculate min/max lat/lon for this zone
-                coords = geom.get("coordinates", [])
-                if coords:
-                    z_min_lat, z_max_lat, z_min_lon, z_max_lon = self.get_min_max_lat_lon(coords)
-                    # Update overall min/max using Decimal
-                    if z_min_lat is not None:
-                        min_lat = Decimal(str(z_min_lat)) if min_lat is None else min(min_lat, Decimal(str(z_min_lat)))
-                    if z_max_lat is not None:
-                        max_lat = Decimal(str(z_max_lat)) if max_lat is None else max(max_lat, Decimal(str(z_max_lat)))
-                    if z_min_lon is not None:
-                        min_lon = Decimal(str(z_min_lon)) if min_lon is None else min(min_lon, Decimal(str(z_min_lon)))
-                    if z_max_lon is not None:
-                        max_lon = Decimal(str(z_max_lon)) if max_lon is None else max(max_lon, Decimal(str(z_max_lon)))
+        if all(zone_metadata.get(zone_id, {}).get("min_lat") is not None for zone_id in affected_zone_ids):
+            min_lat, max_lat, min_lon, max_lon = self.get_zone_metadata_min_max_lat_lon(
+                [zone_metadata[zone_id] for zone_id in affected_zone_ids], alert_geometry)
+        else:
+            min_lat, max_lat, min_lon, max_lon = self.get_geometries_min_max_lat_lon(alert_geometries)
 
         weather_alert = WeatherAlert(
             id=alert.get("id", alert_id),
@@ -111,20 +263,231 @@ class AlertService:
 
         self._s3_client.put_object(
             bucket_name=self._weather_alerts_bucket_name,
-            key=f"{weather_alert.id}.json",
-            content=json.dumps(weather_alert.to_dict(), default=str, separators=(',', ':')).encode("utf-8")
+            key=self.format_weather_alert_key(weather_alert.id),
+            content=self.serialize_weather_alert(weather_alert)
         )
+        snapshot_entries = {FULL_RESOLUTION: self.format_export_entry(weather_alert)}
+
+        # Simplified copies for clients that can't render full resolution, built from the zones' stored levels of detail
+        for resolution, tolerance in RESOLUTIONS.items():
+            if not tolerance:
+                continue
+            level_zones = [zone for zone in self._zone_service.get_zones_coordinates_from_s3(affected_zone_ids, resolution=resolution) if zone]
+            level_alert = copy.copy(weather_alert)
+            level_alert.geometry = ([alert_geometry.simplified(tolerance)] if alert_geometry else []) + self.get_zone_geometries(level_zones)
+            self._s3_client.put_object(
+                bucket_name=self._weather_alerts_bucket_name,
+                key=self.format_weather_alert_key(weather_alert.id, resolution),
+                content=self.serialize_weather_alert(level_alert)
+            )
+            snapshot_entries[resolution] = self.format_export_entry(level_alert)
 
+        # The indexes are updated first, so zone_ids and tiles only list keys the alert is already indexed under
+        zone_ids = self.get_zone_index_keys(alert)
+        self.update_alert_index(self._zone_alerts_table_name, "zone_id", weather_alert.id, zone_ids, (stored or {}).get("zone_ids", []))
+        tiles = self.get_alert_tiles(affected_zone_ids, zone_metadata, alert_geometry, (min_lat, max_lat, min_lon, max_lon))
+        self.update_alert_index(self._alert_tiles_table_name, "tile", weather_alert.id, tiles, (stored or {}).get("tiles", []))
+
+        item = {
+            **weather_alert.to_dict(False),
+            **self.format_expiry_attributes(weather_alert.end),
+            "zone_ids": zone_ids,
+            "tiles": tiles
+        }
         self._dynamo_client.upsert_item(
             table_name=self._weather_alerts_table_name,
-            item=weather_alert.to_dict(False)
+            item=item
         )
         logging.info(f"Stored weather alert {weather_alert.id} in S3 and DynamoDB.")
+        return snapshot_entries, build_hash
+
+    def get_zone_index_keys(self, alert):
+        """
+        ZoneAlerts keys of an alert: its affected zones, and _alert_geometry_key when it has a polygon of its own.
+        """
+        zone_ids = list(dict.fromkeys(alert.get("properties", {}).get("affectedZones", [])))
+        if alert.get("geometry"):
+            zone_ids.append(self._alert_geometry_key)
+        return zone_ids
+
+    def get_alert_tiles(self, zone_ids, zone_metadata, alert_geometry, bbox):
+        """
+        AlertTiles keys of an alert: the geohash tiles overlapping each zone's bounding box and its own polygon's,
+        or the whole alert bounding box when a zone has no metadata.
+        """
+        if all(zone_metadata.get(zone_id, {}).get("min_lat") is not None for zone_id in zone_ids):
+            boxes = [(zone_metadata[zone_id]["min_lat"], zone_metadata[zone_id]["max_lat"], zone_metadata[zone_id]["min_lon"], zone_metadata[zone_id]["max_lon"])
+                     for zone_id in zone_ids]
+            if alert_geometry:
+                boxes.append(self.get_geometries_min_max_lat_lon([alert_geometry]))
+        else:
+            boxes = [bbox]
+        tiles = set()
+        for min_lat, max_lat, min_lon, max_lon in boxes:
+            if min_lat is not None:
+                tiles.update(geohash.tiles_for_box(min_lat, max_lat, min_lon, max_lon, _tile_precision))
+        return sorted(tiles)
+
+    def update_alert_index(self, table_name, id_key, alert_id, keys, previous_keys=()):
+        """
+        Move the alert id between the alert_ids sets of an index table, writing only the keys that changed.
+        """
+        updates = [(self._dynamo_client.add_to_set, key) for key in set(keys) - set(previous_keys)]
+        updates += [(self._dynamo_client.remove_from_set, key) for key in set(previous_keys) - set(keys)]
+        if not updates:
+            return
+        with ThreadPoolExecutor(max_workers=min(_index_write_concurrency, len(updates))) as executor:
+            for future in [executor.submit(update, table_name, key, "alert_ids", [alert_id], id_key=id_key) for update, key in updates]:
+                future.result()
+
+    def rebuild_zone_alert_index(self):
+        """
+        Index every stored weather alert under the zones of its alert, and drop index entries of alerts that are gone.
+        """
+        weather_alerts = self._dynamo_client.get_all_items(self._weather_alerts_table_name)
+        alerts = {alert["id"]: alert for alert in self._dynamo_client.get_items_by_id_list(
+            self._alerts_table_name, [item["id"] for item in weather_alerts], attributes=["properties", "geometry"])}
+        for item in weather_alerts:
+            item["zone_ids"] = self.get_zone_index_keys(alerts.get(item["id"], {}))
+        self.sync_alert_index(self._zone_alerts_table_name, "zone_id", weather_alerts, "zone_ids")
+        self._dynamo_client.upsert_items(self._weather_alerts_table_name, weather_alerts)
+
+    def rebuild_alert_tile_index(self):
+        """
+        Index every stored weather alert under the tiles of its zones at the current TILE_PRECISION,
+        and drop index entries of alerts that are gone or tiles of an earlier precision.
+        """
+        weather_alerts = self._dynamo_client.get_all_items(self._weather_alerts_table_name)
+        alerts = {alert["id"]: alert for alert in self._dynamo_client.get_items_by_id_list(
+            self._alerts_table_name, [item["id"] for item in weather_alerts], attributes=["properties", "geometry"])}
+        for item in weather_alerts:
+            alert = alerts.get(item["id"], {})
+            zone_ids = alert.get("properties", {}).get("affectedZones", [])
+            alert_geometry = None
+            if alert.get("geometry"):
+                alert_geometry = Geometry(type=alert["geometry"].get("type", ""), coordinates=alert["geometry"].get("coordinates", []))
+            item["tiles"] = self.get_alert_tiles(zone_ids, self._zone_service.get_zones_metadata(zone_ids), alert_geometry,
+                                                 (item.get("min_lat"), item.get("max_lat"), item.get("min_lon"), item.get("max_lon")))
+        self.sync_alert_index(self._alert_tiles_table_name, "tile", weather_alerts, "tiles")
+        self._dynamo_client.upsert_items(self._weather_alerts_table_name, weather_alerts)
+
+    def sync_alert_index(self, table_name, id_key, weather_alerts, keys_attribute):
+        """
+        Make an index table hold exactly the alerts listed under keys_attribute of the weather alert items.
+        """
+        wanted = {}
+        for item in weather_alerts:
+            for key in item[keys_attribute]:
+                wanted.setdefault(key, set()).add(item["id"])
+        indexed = {item[id_key]: set(item.get("alert_ids", ())) for item in self._dynamo_client.get_all_items(table_name)}
+
+        for key in wanted.keys() | indexed.keys():
+            added = wanted.get(key, set()) - indexed.get(key, set())
+            removed = indexed.get(key, set()) - wanted.get(key, set())
+            if added:
+                self._dynamo_client.add_to_set(table_name, key, "alert_ids", added, id_key=id_key)
+            if removed:
+                self._dynamo_client.remove_from_set(table_name, key, "alert_ids", removed, id_key=id_key)
+        self._logger.info(f"Indexed {len(weather_alerts)} weather alerts under {len(wanted)} keys of {table_name}.")
+
+    def format_export_entry(self, weather_alert):
+        return json.dumps(weather_alert.to_dict(), separators=(',', ':'))
+
+    def update_alert_snapshot(self, upserts, removals=(), deadline=None):
+        """
+        Apply built (alert id -> {resolution: JSON}) and removed alerts to the "all alerts" snapshots,
+        rebuilding them from the stored alerts when there is no snapshot yet.
+        """
+        if not self._alert_snapshot_store.update(upserts, removals, deadline):
+            self.rebuild_alert_snapshot()
+
+    def rebuild_alert_snapshot(self):
+        alerts = self.get_all_weather_alerts(False)
+        self._logger.info(f"Rebuilding alert snapshots from {len(alerts)} weather alerts.")
+        alert_ids = sorted(alert.id for alert in alerts)
+        # Each snapshot is streamed to S3 as its alerts are read, one resolution at a time
+        self._alert_snapshot_store.replace({
+            resolution: ((alert_id, self.format_export_entry(weather_alert)) for alert_id, weather_alert in zip(alert_ids, self.iter_weather_alerts(alert_ids, resolution)))
+            for resolution in RESOLUTIONS
+        })
+
+    def get_zone_geometries(self, zones):
+        geometries = []
+        for zone in zones:
+            if zone and "geometry" in zone:
+                geom = zone["geometry"]
+                geometries.append(
+                    Geometry(
+                        type=geom.get("type", ""),
+                        coordinates=geom.get("coordinates", [])
+                    )
+                )
+        return geometries
+
+    def serialize_weather_alert(self, weather_alert):
+        if GEOMETRY_FORMAT == "binary":
+            import geometry_codec
+            return geometry_codec.dumps(weather_alert.to_dict(packed=True))
+        return json.dumps(weather_alert.to_dict(), default=str, separators=(',', ':')).encode("utf-8")
+
+    def format_weather_alert_key(self, alert_id, resolution=FULL_RESOLUTION):
+        if resolution != FULL_RESOLUTION:
+            return f"{alert_id}.{resolution}.json"
+        return f"{alert_id}.json"
+
+    def get_geometries_min_max_lat_lon(self, geometries):
+        """
+        Bounding box over all geometries, from the packed coordinates when they can be packed.
+        """
+        min_lat = max_lat = min_lon = max_lon = None
+        for geometry in geometries:
+            packed = geometry.packed()
+            if packed is not None:
+                g_min_lat, g_max_lat, g_min_lon, g_max_lon = packed.bbox()
+            else:
+                g_min_lat, g_max_lat, g_min_lon, g_max_lon = self.get_min_max_lat_lon(geometry.coordinates)
+                if g_min_lat is None:
+                    continue
+            min_lat = g_min_lat if min_lat is None else min(min_lat, g_min_lat)
+            max_lat = g_max_lat if max_lat is None else max(max_lat, g_max_lat)
+            min_lon = g_min_lon if min_lon is None else min(min_lon, g_min_lon)
+            max_lon = g_max_lon if max_lon is None else max(max_lon, g_max_lon)
+        return min_lat, max_lat, min_lon, max_lon
+
+    def get_zone_metadata_min_max_lat_lon(self, zone_metadata, alert_geometry=None):
+        """
+        Bounding box over the zones' stored bboxes and the alert's own geometry, without reading the zone geometries.
+        """
+        boxes = [(float(m["min_lat"]), float(m["max_lat"]), float(m["min_lon"]), float(m["max_lon"])) for m in zone_metadata]
+        if alert_geometry:
+            boxes.append(self.get_geometries_min_max_lat_lon([alert_geometry]))
+        boxes = [box for box in boxes if box[0] is not None]
+        if not boxes:
+            return None, None, None, None
+        return min(box[0] for box in boxes), max(box[1] for box in boxes), min(box[2] for box in boxes), max(box[3] for box in boxes)
+
+    def get_build_hash(self, alert, zone_ids, zone_metadata):
+        """
+        Hash of everything a built weather alert depends on: the alert content, its zones' stored content
+        and the storage settings. None when a zone has no metadata, its content is unknown.
+        """
+        if any(zone_id not in zone_metadata for zone_id in zone_ids):
+            return None
+        content = [
+            alert.get("sent"),
+            alert.get("content_hash") or self.get_alert_content_hash(alert),
+            [[zone_id, zone_metadata[zone_id].get("content_hash")] for zone_id in zone_ids],
+            GEOMETRY_FORMAT,
+            RESOLUTIONS,
+            _tile_precision
+        ]
+        return hashlib.sha256(json.dumps(content, default=str, separators=(',', ':')).encode("utf-8")).hexdigest()
 
     def get_min_max_lat_lon(self, coordinates):
         def flatten_coords(coords):
             for c in coords:
-                if isinstance(c, list) and len(c) == 2 and all(isinstance(x, (Decimal)) for x in c):
+                # Zone files loaded from S3 hold floats, alerts from DynamoDB hold Decimals
+                if isinstance(c, list) and len(c) == 2 and all(isinstance(x, (Decimal, float, int)) for x in c):
                     yield c
                 elif isinstance(c, list):
                     yield from flatten_coords(c)
@@ -138,79 +501,299 @@ class AlertService:
         lons = [float(coord[0]) for coord in flat]
         return min(lats), max(lats), min(lons), max(lons)
     
-    def get_weather_alert(self, alert_id):
+    def get_weather_alert(self, alert_id, resolution=FULL_RESOLUTION):
         alert = self._s3_client.get_object(
             bucket_name=self._weather_alerts_bucket_name,
-            key=f"{alert_id}.json"
+            key=self.format_weather_alert_key(alert_id, resolution)
         )
+        if alert is None and resolution != FULL_RESOLUTION:
+            # Alerts built before levels of detail were stored only have the full geometry
+            return self.get_weather_alert(alert_id)
         return WeatherAlert.from_dict(alert)
     
-    def get_all_weather_alerts(self, include_coordinates=True):
-        alerts = self._dynamo_client.get_all_items(self._weather_alerts_table_name)
-        alerts = [WeatherAlert.from_dict(alert) for alert in alerts]
+    def get_all_weather_alerts(self, include_coordinates=True, resolution=None):
         if include_coordinates:
-            alert_json = []
-            self._logger.info("Fetching all weather alerts with coordinates.")
-            for alert in alerts:
-                alert_json.append(self.get_weather_alert(alert.id).to_dict())
-            export_id = uuid.uuid4()
-
-            export_url = self._s3_client.store_and_return_presigned_url(
-                bucket_name=self._weather_alerts_export_bucket_name,
-                key=f"{export_id}.json",
-                content=json.dumps(alert_json, separators=(',', ':')).encode("utf-8")
-            )
-
-            return export_url            
+            resolution = validate_resolution(resolution)
+            # Served from the snapshot that alert_listener and cleanup keep current
+            export_url = self._alert_snapshot_store.get_url(resolution)
+            if export_url is None:
+                self.rebuild_alert_snapshot()
+                export_url = self._alert_snapshot_store.get_url(resolution)
+            return export_url
         else:
             self._logger.info("Fetching all weather alerts without coordinates.")
-            return alerts
+            alerts = self._dynamo_client.get_all_items(self._weather_alerts_table_name)
+            return [WeatherAlert.from_dict(alert) for alert in alerts]
     
-    def get_weather_alerts_by_coords(self, coordinates):
+    def get_weather_alerts_by_coords(self, coordinates, match_segments=None, resolution=None):
+        """
+        Export the alerts along the route. Matching always uses the full geometry,
+        the export holds the geometry at the requested resolution.
+        The route is snapped to the search cache grid and the export is stored under a key derived from
+        the snapped route and the alert set version, so repeated searches reuse it until an alert changes.
+        """
+        resolution = validate_resolution(resolution)
         if not coordinates or len(coordinates) < 2:
             return []
-        alerts = self.get_all_weather_alerts(False)
+        if match_segments is None:
+            match_segments = self._match_route_segments
+        if _search_cache_grid_degrees <= 0:
+            return self.export_route_alerts(coordinates, match_segments, resolution, f"{uuid.uuid4()}.json")
 
-        alertids = set()
-        alertjson = []
-
-        for coord in coordinates:
-            lat, lon = coord
-                       
-            for alert in alerts:
-                if alert.min_lat <= Decimal(str(lat)) <= alert.max_lat and alert.min_lon <= Decimal(str(lon)) <= alert.max_lon:
-                    alertids.add(alert.id)
-        
-        for alert_id in alertids:
-            alertjson.append(self.get_weather_alert(alert_id).to_dict())
-
-        export_id = uuid.uuid4()
-
-        export_url = self._s3_client.store_and_return_presigned_url(
-            bucket_name=self._weather_alerts_export_bucket_name,
-            key=f"{export_id}.json",
-            content=json.dumps(alertjson, separators=(',', ':')).encode("utf-8")
-        )
+        coordinates = self.snap_route(coordinates)
+        route_key = self.format_route_key(coordinates, match_segments, resolution)
+        version = self._alert_snapshot_store.get_version()
+        export_key = f"routes/{version}/{route_key}.json"
+        now = time.time()
+
+        cached = _search_cache.get(route_key)
+        if cached is not None:
+            (cached_key, export_url, signed_at, created_at), cached_version, _ = cached
+            if cached_version == version and now - created_at < _search_cache_ttl_seconds:
+                _search_cache.record_hit()
+                if now - signed_at > _export_url_expires_in - _export_url_resign_seconds:
+                    export_url = self._s3_client.get_presigned_url(self._weather_alerts_export_bucket_name, cached_key, _export_url_expires_in)
+                    self.cache_route_export(route_key, version, cached_key, export_url, now, created_at)
+                return export_url
+            _search_cache.remove(route_key)
+        _search_cache.record_miss()
 
+        # Another Lambda may already have exported this route for the current alert set
+        last_modified = self._s3_client.get_last_modified(self._weather_alerts_export_bucket_name, export_key)
+        if last_modified and now - last_modified.timestamp() < _search_cache_ttl_seconds:
+            created_at = last_modified.timestamp()
+            export_url = self._s3_client.get_presigned_url(self._weather_alerts_export_bucket_name, export_key, _export_url_expires_in)
+        else:
+            created_at = now
+            export_url = self.export_route_alerts(coordinates, match_segments, resolution, export_key)
+        self.cache_route_export(route_key, version, export_key, export_url, now, created_at)
         return export_url
 
-    def remove_expired_alerts(self):
-        current_time = datetime.now(timezone.utc)
+    def export_route_alerts(self, coordinates, match_segments, resolution, export_key):
+        if _search_strategy == "zones":
+            alert_ids = self.get_route_alert_ids_by_zones(coordinates, match_segments)
+        elif _search_strategy == "tiles":
+            alert_ids = self.get_route_alert_ids_by_tiles(coordinates, match_segments)
+        else:
+            alert_ids = self.get_route_alert_ids_by_alerts(coordinates, match_segments)
+
+        # Alerts are loaded ahead of the writer, which uploads full parts while the next one fills
+        with ExportWriter(self._s3_client, self._weather_alerts_export_bucket_name, export_key, self._logger) as writer:
+            export = JsonArrayWriter(writer)
+            for weather_alert in self.iter_weather_alerts(alert_ids, resolution):
+                export.write_item(self.format_export_entry(weather_alert))
+            export.close()
+
+        return self._s3_client.get_presigned_url(self._weather_alerts_export_bucket_name, export_key, _export_url_expires_in)
+
+    def get_route_alert_ids_by_alerts(self, coordinates, match_segments):
+        """
+        Scan every weather alert and test the geometry of those whose bounding box contains a route point,
+        or overlaps a route segment's bounding box when match_segments is set.
+        """
         alerts = self.get_all_weather_alerts(False)
+        spatial_index = self.get_alert_spatial_index(alerts)
+
+        alertids = spatial_index.query_route(coordinates, match_segments)
+        candidates = [alert for alert in alerts if alert.id in alertids]
+
+        matched = self.match_alert_geometries(candidates, coordinates, match_segments)
+        self._logger.info(f"{len(matched)} of {len(candidates)} bounding box matches intersect the route.")
+        return [alert.id for alert in matched]
+
+    def get_route_alert_ids_by_zones(self, coordinates, match_segments):
+        """
+        Resolve the route to the zones it crosses through the zone bounding boxes, then to their alerts through
+        the ZoneAlerts index. Only zones with active alerts have their geometry tested, and no alert is scanned.
+        """
+        zone_ids = sorted(self._zone_service.get_zone_spatial_index().query_route(coordinates, match_segments))
+        index = {
+            item["zone_id"]: set(item.get("alert_ids", ()))
+            for item in self._dynamo_client.get_items_by_id_list(self._zone_alerts_table_name, zone_ids + [self._alert_geometry_key], id_key="zone_id")
+        }
+        active_zone_ids = [zone_id for zone_id in zone_ids if index.get(zone_id)]
+
+        matched = set()
+        for zone_id in self._zone_service.match_route_zones(active_zone_ids, coordinates, match_segments):
+            matched.update(index[zone_id])
+
+        # An alert's own polygon is part of its geometry too
+        own_geometry_ids = sorted(index.get(self._alert_geometry_key, set()) - matched)
+        if own_geometry_ids:
+            import geometry_match
+            for alert in self._dynamo_client.get_items_by_id_list(self._alerts_table_name, own_geometry_ids, attributes=["geometry"]):
+                geometry = alert.get("geometry") or {}
+                rings = geometry_match.polygon_rings_from_geometries([Geometry(type=geometry.get("type", ""), coordinates=geometry.get("coordinates", []))])
+                if rings is not None and geometry_match.route_intersects(rings, coordinates, match_segments):
+                    matched.add(alert["id"])
 
-        expired_alerts = []
+        self._logger.info(f"{len(matched)} alerts along the route, from {len(active_zone_ids)} of {len(zone_ids)} zones with active alerts.")
+        return sorted(matched)
+
+    def get_route_alert_ids_by_tiles(self, coordinates, match_segments):
+        """
+        Read the alerts of the route's geohash tiles from the AlertTiles index, then test the geometry of those whose
+        bounding box contains a route point. With match_segments the tiles already follow every segment, so all of
+        their alerts go to the segment test. The cost follows the route and its alerts, not the alerts nationwide.
+        """
+        tiles = sorted(geohash.tiles_for_route(coordinates, _tile_precision, match_segments))
+        candidate_ids = set()
+        for item in self._dynamo_client.get_items_by_id_list(self._alert_tiles_table_name, tiles, id_key="tile"):
+            candidate_ids.update(item.get("alert_ids", ()))
+
+        alerts = [
+            WeatherAlert.from_dict(item)
+            for item in self._dynamo_client.get_items_by_id_list(self._weather_alerts_table_name, sorted(candidate_ids),
+                                                                 attributes=["updated", "min_lat", "max_lat", "min_lon", "max_lon"])
+        ]
+        if match_segments:
+            candidates = alerts
+        else:
+            alertids = SpatialIndex((alert.id, alert.min_lat, alert.max_lat, alert.min_lon, alert.max_lon) for alert in alerts).query_points(coordinates)
+            candidates = [alert for alert in alerts if alert.id in alertids]
+
+        matched = self.match_alert_geometries(candidates, coordinates, match_segments)
+        self._logger.info(f"{len(matched)} of {len(candidates)} bounding box matches from {len(tiles)} tiles intersect the route.")
+        return sorted(alert.id for alert in matched)
+
+    def iter_weather_alerts(self, alert_ids, resolution=FULL_RESOLUTION):
+        """
+        Yield the weather alerts in order, fetching up to _export_prefetch ahead so S3 reads overlap serialization.
+        """
+        if not alert_ids:
+            return
+        with ThreadPoolExecutor(max_workers=min(_export_prefetch, len(alert_ids))) as executor:
+            pending = deque()
+            for alert_id in alert_ids:
+                pending.append(executor.submit(self.get_weather_alert, alert_id, resolution))
+                if len(pending) >= _export_prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def snap_route(self, coordinates):
+        return [[round(float(lat) / _search_cache_grid_degrees) * _search_cache_grid_degrees, round(float(lon) / _search_cache_grid_degrees) * _search_cache_grid_degrees] for lat, lon in coordinates]
+
+    def format_route_key(self, coordinates, match_segments, resolution):
+        cells = [[round(lat / _search_cache_grid_degrees), round(lon / _search_cache_grid_degrees)] for lat, lon in coordinates]
+        route = json.dumps([resolution, bool(match_segments), _search_cache_grid_degrees, cells], separators=(',', ':'))
+        return hashlib.sha256(route.encode("utf-8")).hexdigest()[:32]
+
+    def cache_route_export(self, route_key, version, export_key, export_url, signed_at, created_at):
+        _search_cache.put(route_key, (export_key, export_url, signed_at, created_at), version, len(route_key) + len(export_key) + len(export_url) + 100)
+
+    def get_search_cache_stats(self):
+        return _search_cache.stats()
+
+    def get_alert_spatial_index(self, alerts):
+        # The index is only rebuilt when an alert is added, removed or its bounding box changes
+        version = frozenset((alert.id, alert.updated, alert.min_lat, alert.max_lat, alert.min_lon, alert.max_lon) for alert in alerts)
+        if AlertService._spatial_index is None or AlertService._spatial_index_version != version:
+            AlertService._spatial_index = SpatialIndex(
+                (alert.id, alert.min_lat, alert.max_lat, alert.min_lon, alert.max_lon) for alert in alerts
+            )
+            AlertService._spatial_index_version = version
+            self._logger.info(f"Built spatial index over {len(alerts)} weather alerts.")
+        return AlertService._spatial_index
+
+    def match_alert_geometries(self, alerts, coordinates, match_segments=True):
+        """
+        Keep the alerts whose Polygon/MultiPolygon geometry contains a route point, or is crossed by a route
+        segment when match_segments is set. Returns the matching alerts as given, without their geometry,
+        so the caller can load them one at a time. Alerts whose geometry can not be tested exactly are kept on their bounding box match.
+        """
+        # Deferred so handlers that never search don't pay for importing numpy
+        import geometry_match
+
+        matched = []
         for alert in alerts:
-            if alert.end and alert.end < current_time:
-                expired_alerts.append(alert)
+            cached = AlertService._geometry_cache.get(alert.id)
+            if cached and cached[0] == alert.updated:
+                AlertService._geometry_cache.move_to_end(alert.id)
+                rings = cached[1]
+            else:
+                rings = geometry_match.polygon_rings_from_geometries(self.get_weather_alert(alert.id).geometry)
+                AlertService._geometry_cache[alert.id] = (alert.updated, rings)
+                while len(AlertService._geometry_cache) > self._geometry_cache_size:
+                    AlertService._geometry_cache.popitem(last=False)
 
-        for alert in expired_alerts:
-            self.delete_alert(alert.id)
+            if rings is None or geometry_match.route_intersects(rings, coordinates, match_segments):
+                matched.append(alert)
+        return matched
+
+    def remove_expired_alerts(self, full_scan=False, deadline=None):
+        """
+        Delete the alerts whose end has passed. Expired alerts are read from the expiry index, so the cost follows
+        the number of expired alerts. full_scan scans the whole table instead, which also finds alerts stored
+        before the index existed or that expired more than _expiry_lookback_days ago.
+        """
+        current_time = datetime.now(timezone.utc)
+        if full_scan:
+            alerts = self.get_all_weather_alerts(False)
+            expired_ids = [alert.id for alert in alerts if alert.end and alert.end < current_time]
+        else:
+            expired_ids = self.get_expired_alert_ids(current_time)
+
+        deleted_ids = self.delete_alerts(expired_ids)
+        self.update_alert_snapshot({}, deleted_ids, deadline)
+
+        return len(deleted_ids)
+
+    def get_expired_alert_ids(self, current_time):
+        today = current_time.astimezone(timezone.utc).date()
+        # expires_at is truncated to the second, ending before the current second means ending before now
+        before = int(current_time.timestamp()) - 1
+        expired_ids = []
+        for days in range(_expiry_lookback_days, -1, -1):
+            items = self._dynamo_client.query_index(
+                self._weather_alerts_table_name, self._weather_alerts_expiry_index,
+                "expires_on", (today - timedelta(days=days)).isoformat(), "expires_at", before
+            )
+            expired_ids.extend(item["id"] for item in items)
+        return expired_ids
+
+    def format_expiry_attributes(self, end):
+        """
+        Keys of the sparse expiry index: the UTC day the alert ends on, and its end in epoch seconds.
+        """
+        if not end:
+            return {}
+        return {"expires_on": end.astimezone(timezone.utc).date().isoformat(), "expires_at": int(end.timestamp())}
+
+    def delete_alerts(self, alert_ids):
+        """
+        Delete the alerts' S3 objects, then their rows and index entries. Alerts whose objects could not be
+        deleted keep their rows, so the next cleanup finds them again instead of orphaning the objects.
+        Returns the ids of the deleted alerts.
+        """
+        if not alert_ids:
+            return []
+        failed_keys = set(self._s3_client.delete_objects(
+            self._weather_alerts_bucket_name,
+            [self.format_weather_alert_key(alert_id, resolution) for alert_id in alert_ids for resolution in RESOLUTIONS]
+        ))
+        kept_ids = {
+            alert_id for alert_id in alert_ids
+            if any(self.format_weather_alert_key(alert_id, resolution) in failed_keys for resolution in RESOLUTIONS)
+        }
+        if kept_ids:
+            self._logger.error(f"Keeping {len(kept_ids)} alerts whose S3 objects could not be deleted, the next cleanup retries them.")
+        alert_ids = [alert_id for alert_id in alert_ids if alert_id not in kept_ids]
+        if not alert_ids:
+            return []
+
+        removed = {}
+        for item in self._dynamo_client.get_items_by_id_list(self._weather_alerts_table_name, alert_ids, attributes=["zone_ids", "tiles"]):
+            for zone_id in item.get("zone_ids", []):
+                removed.setdefault((self._zone_alerts_table_name, "zone_id", zone_id), set()).add(item["id"])
+            for tile in item.get("tiles", []):
+                removed.setdefault((self._alert_tiles_table_name, "tile", tile), set()).add(item["id"])
+        for (table_name, id_key, key), index_alert_ids in removed.items():
+            self._dynamo_client.remove_from_set(table_name, key, "alert_ids", index_alert_ids, id_key=id_key)
+        self._dynamo_client.delete_items(self._weather_alerts_table_name, alert_ids)
+        self._dynamo_client.delete_items(self._alerts_table_name, alert_ids)
+        self._logger.info(f"Deleted {len(alert_ids)} alerts from DynamoDB and S3.")
+        return alert_ids
 
-        return len(expired_alerts)
-    
     def delete_alert(self, alert_id):
-        self._dynamo_client.delete_item(self._weather_alerts_table_name, alert_id)
-        self._dynamo_client.delete_item(self._alerts_table_name, alert_id)
-        self._s3_client.delete_object(self._weather_alerts_bucket_name, f"{alert_id}.json")
-        self._logger.info(f"Deleted alert {alert_id} from DynamoDB and S3.")
-        return True
\ No newline at end of file
+        return bool(self.delete_alerts([alert_id]))
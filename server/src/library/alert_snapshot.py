@@ -0,0 +1,264 @@
+import logging
+import math
+import random
+import time
+import uuid
+from dynamo_client import DynamoDbClient
+from s3_client import S3Client
+from export_writer import ExportWriter, JsonArrayWriter
+import simplejson as json
+
+_max_update_attempts = 8
+_url_expires_in = 3600
+# Updates take turns holding a lease on AlertState, taken over once it expires if its holder crashed.
+# Both are also capped by the caller's deadline, the end of its Lambda invocation
+_lease_seconds = 60
+_lease_wait_seconds = 60
+# Retired snapshots kept for downloads in progress, past this many the oldest are deleted early
+_max_retired_snapshots = 32
+_read_chunk_size = 1024 * 1024
+
+class AlertSnapshotStore:
+    """
+    Snapshots of the "all alerts" export, one per resolution, each version stored under a new key.
+    The current keys live in one AlertState item that is swapped with a conditional write, so
+    concurrent alert_listener and cleanup invocations never lose each other's changes, and updates
+    take turns through a lease so they don't all splice and then lose the swap.
+    Next to each snapshot an index holds the byte range of every alert, so an update streams the
+    current snapshot into the next one and splices the changed alerts in without parsing or holding the rest.
+    """
+    def __init__(self, dynamo_client: DynamoDbClient, s3_client: S3Client, logger: logging.Logger):
+        self._dynamo_client = dynamo_client
+        self._s3_client = s3_client
+        self._logger = logger
+
+    _state_table_name = "AlertState"
+    _state_item_id = "alert-set"
+    _lease_item_id = "alert-set-lease"
+    _snapshot_bucket_name = "weather-alerts-export-bucket-202505"
+    _snapshot_prefix = "snapshots/all-alerts"
+
+    def get_version(self) -> int:
+        """
+        Version of the alert set, bumped by every snapshot change and so by every alert written or removed.
+        """
+        state = self._dynamo_client.get_item_by_id(self._state_table_name, self._state_item_id, consistent_read=True)
+        return int(state["version"]) if state else 0
+
+    def get_url(self, resolution):
+        """
+        Presigned URL of the current snapshot, or None when there is no snapshot yet.
+        """
+        state = self._dynamo_client.get_item_by_id(self._state_table_name, self._state_item_id)
+        key = (state or {}).get("snapshots", {}).get(resolution)
+        if not key:
+            return None
+        return self._s3_client.get_presigned_url(self._snapshot_bucket_name, key, _url_expires_in)
+
+    def update(self, upserts, removals=(), deadline=None):
+        """
+        Apply alert changes to every snapshot. upserts maps alert id -> {resolution: alert JSON}.
+        Returns False when there is no snapshot yet and it must be rebuilt from scratch.
+        With a time.monotonic() deadline, the lease is neither waited for nor held past it.
+        """
+        removals = set(removals)
+        if not upserts and not removals:
+            return True
+
+        lease = self._acquire_lease(deadline)
+        try:
+            for attempt in range(_max_update_attempts):
+                if attempt:
+                    time.sleep(min(5.0, 0.1 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise RuntimeError("Ran out of time updating the alert snapshot")
+                state = self._dynamo_client.get_item_by_id(self._state_table_name, self._state_item_id, consistent_read=True)
+                if not state:
+                    return False
+
+                snapshots = {}
+                for resolution, key in state.get("snapshots", {}).items():
+                    snapshots[resolution] = self._splice(resolution, key, upserts, removals)
+                    if snapshots[resolution] is None:
+                        self._delete_snapshots(key for key in snapshots.values() if key and key not in state["snapshots"].values())
+                        return False
+
+                if snapshots == state.get("snapshots"):
+                    return True
+
+                if self._swap(state, snapshots):
+                    self._logger.info(f"Updated alert snapshots with {len(upserts)} changed and {len(removals)} removed alerts.")
+                    return True
+                # Only a rebuild swaps without the lease, the snapshots spliced from the state it replaced are never read
+                self._delete_snapshots(key for key in snapshots.values() if key not in state["snapshots"].values())
+                self._logger.info("Alert snapshot changed concurrently, retrying update.")
+        finally:
+            self._release_lease(lease)
+
+        raise RuntimeError(f"Could not update the alert snapshot after {_max_update_attempts} attempts")
+
+    def replace(self, entries_by_resolution):
+        """
+        Store complete snapshots built from scratch. entries_by_resolution maps resolution -> (alert id, alert JSON)
+        pairs sorted by alert id, which may be a generator so the snapshot is written as the alerts are read.
+        """
+        snapshots = {resolution: self._store_entries(resolution, entries) for resolution, entries in entries_by_resolution.items()}
+        for attempt in range(_max_update_attempts):
+            if attempt:
+                time.sleep(min(5.0, 0.1 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+            state = self._dynamo_client.get_item_by_id(self._state_table_name, self._state_item_id, consistent_read=True)
+            if self._swap(state, snapshots):
+                self._logger.info(f"Rebuilt alert snapshots: {snapshots}")
+                return
+        raise RuntimeError(f"Could not replace the alert snapshot after {_max_update_attempts} attempts")
+
+    def _swap(self, state, snapshots):
+        """
+        Point AlertState at the new snapshots if nobody else changed it since state was read.
+        Snapshots replaced more than a URL lifetime ago are deleted, newer ones may still be downloading.
+        """
+        now = int(time.time())
+        current = (state or {}).get("snapshots", {})
+        retired = [entry for entry in (state or {}).get("retired", []) if entry.get("key") not in snapshots.values()]
+        retired.extend({"key": key, "retired_at": now} for key in current.values() if key not in snapshots.values())
+        expired = [entry for entry in retired if now - int(entry["retired_at"]) > _url_expires_in]
+        retired = [entry for entry in retired if entry not in expired]
+        # A burst of updates would otherwise grow AlertState towards the item size limit, retired is oldest first
+        if len(retired) > _max_retired_snapshots:
+            expired.extend(retired[:-_max_retired_snapshots])
+            retired = retired[-_max_retired_snapshots:]
+
+        version = int(state["version"]) if state else None
+        item = {
+            "id": self._state_item_id,
+            "version": (version or 0) + 1,
+            "snapshots": snapshots,
+            "retired": retired,
+            "updated": now
+        }
+        if not self._dynamo_client.put_item_if_version(self._state_table_name, item, version):
+            return False
+
+        self._delete_snapshots(entry["key"] for entry in expired)
+        return True
+
+    def _acquire_lease(self, deadline=None):
+        """
+        Wait for the update lease and take it, until the monotonic deadline. The lease expires at the deadline
+        at the latest, so a holder killed at the end of its invocation doesn't block the others any longer.
+        Returns the lease version to release it with.
+        """
+        wait_until = time.monotonic() + _lease_wait_seconds
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+        attempt = 0
+        while True:
+            lease = self._dynamo_client.get_item_by_id(self._state_table_name, self._lease_item_id, consistent_read=True)
+            now = time.time()
+            if not lease or float(lease.get("expires", 0)) <= now:
+                held_for = _lease_seconds if deadline is None else min(_lease_seconds, max(0.0, deadline - time.monotonic()))
+                version = int(lease["version"]) if lease else None
+                item = {"id": self._lease_item_id, "version": (version or 0) + 1, "expires": math.ceil(now + held_for)}
+                if self._dynamo_client.put_item_if_version(self._state_table_name, item, version):
+                    return item["version"]
+            if time.monotonic() >= wait_until:
+                raise RuntimeError("Could not take the alert snapshot lease in time")
+            time.sleep(min(2.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+            attempt += 1
+
+    def _release_lease(self, version):
+        # Fails harmlessly when the lease expired and was taken over
+        item = {"id": self._lease_item_id, "version": version + 1, "expires": 0}
+        self._dynamo_client.put_item_if_version(self._state_table_name, item, version)
+
+    def _splice(self, resolution, key, upserts, removals):
+        """
+        Stream the snapshot at key into a new one with the changes applied, holding one alert at a time.
+        Returns the new key, key itself when nothing changed, or None when the snapshot is missing.
+        """
+        index = self._s3_client.get_object(self._snapshot_bucket_name, self._index_key(key))
+        if not isinstance(index, dict):
+            return None
+        changes = {}
+        for alert_id, alert_entries in upserts.items():
+            entry = alert_entries.get(resolution)
+            if entry is not None:
+                changes[alert_id] = entry.encode("utf-8") if isinstance(entry, str) else entry
+        if not changes and not any(alert_id in index for alert_id in removals):
+            return key
+
+        body = self._s3_client.open_object(self._snapshot_bucket_name, key)
+        if body is None:
+            return None
+        changed = False
+        position = 0
+
+        def read(start, end):
+            nonlocal position
+            while position < start:
+                skipped = len(body.read(min(start - position, _read_chunk_size)))
+                if not skipped:
+                    raise EOFError(f"Snapshot {key} is shorter than its index")
+                position += skipped
+            chunks = []
+            while position < end:
+                chunk = body.read(end - position)
+                if not chunk:
+                    raise EOFError(f"Snapshot {key} is shorter than its index")
+                chunks.append(chunk)
+                position += len(chunk)
+            return b"".join(chunks)
+
+        def entries():
+            nonlocal changed
+            # The snapshot holds its alerts sorted by id, merge the changes into that order
+            new_ids = sorted(alert_id for alert_id in changes if alert_id not in index)
+            next_new = 0
+            for alert_id, (start, end) in sorted(index.items(), key=lambda item: item[1][0]):
+                while next_new < len(new_ids) and new_ids[next_new] < alert_id:
+                    changed = True
+                    yield new_ids[next_new], changes[new_ids[next_new]]
+                    next_new += 1
+                if alert_id in changes:
+                    entry = changes[alert_id]
+                    changed = changed or read(int(start), int(end)) != entry
+                    yield alert_id, entry
+                elif alert_id in removals:
+                    changed = True
+                else:
+                    yield alert_id, read(int(start), int(end))
+            for alert_id in new_ids[next_new:]:
+                changed = True
+                yield alert_id, changes[alert_id]
+
+        try:
+            new_key = self._store_entries(resolution, entries())
+        finally:
+            body.close()
+        if not changed:
+            self._delete_snapshots([new_key])
+            return key
+        return new_key
+
+    def _delete_snapshots(self, keys):
+        for key in keys:
+            self._s3_client.delete_object(self._snapshot_bucket_name, key)
+            self._s3_client.delete_object(self._snapshot_bucket_name, self._index_key(key))
+
+    def _store_entries(self, resolution, entries):
+        """
+        Write a snapshot from (alert id, alert JSON) pairs sorted by alert id, and its index. Returns the snapshot key.
+        """
+        key = f"{self._snapshot_prefix}/{resolution}/{uuid.uuid4().hex}.json"
+        index = {}
+        with ExportWriter(self._s3_client, self._snapshot_bucket_name, key, self._logger) as writer:
+            snapshot = JsonArrayWriter(writer)
+            for alert_id, entry in entries:
+                index[alert_id] = snapshot.write_item(entry)
+            snapshot.close()
+        # Only readable once AlertState points at the key, by then the index exists too
+        self._s3_client.put_object(self._snapshot_bucket_name, self._index_key(key), json.dumps(index).encode("utf-8"))
+        return key
+
+    def _index_key(self, key):
+        return key[:-len(".json")] + ".index.json"
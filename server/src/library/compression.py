@@ -0,0 +1,147 @@
+import gzip
+import os
+import threading
+import time
+import zlib
+
+# Opt-in S3 object compression: comma separated "bucket[/prefix]=encoding[:level]" rules,
+# e.g. "zone-bucket-202505=zstd:3,weather-alerts-export-bucket-202505/routes/=gzip:6".
+# The longest matching prefix wins. Encodings are gzip and zstd (needs the zstandard package).
+_default_levels = {"gzip": 6, "zstd": 3}
+# Buckets whose objects clients download through presigned URLs. Browsers and most HTTP stacks
+# decode Content-Encoding gzip but not zstd, so zstd is only allowed where our Lambdas are the readers
+_presigned_buckets = {"weather-alerts-export-bucket-202505"}
+_read_chunk_size = 1024 * 1024
+
+
+def parse_rules(config: str):
+    """
+    Returns [(bucket, prefix, encoding, level)] with the longest prefixes first.
+    """
+    rules = []
+    for rule in (config or "").split(","):
+        rule = rule.strip()
+        if not rule:
+            continue
+        location, _, codec = rule.partition("=")
+        bucket, _, prefix = location.strip().partition("/")
+        encoding, _, level = codec.strip().partition(":")
+        encoding = encoding.lower()
+        if encoding not in _default_levels:
+            raise ValueError(f"Unsupported S3 compression '{encoding}' in rule '{rule}'")
+        if encoding == "zstd" and bucket in _presigned_buckets:
+            raise ValueError(f"zstd can not be used for {bucket}, its objects are downloaded by clients that may not decode it, use gzip")
+        rules.append((bucket, prefix, encoding, int(level) if level else _default_levels[encoding]))
+    return sorted(rules, key=lambda rule: len(rule[1]), reverse=True)
+
+
+_rules = parse_rules(os.environ.get("S3_COMPRESSION", ""))
+
+
+def encoding_for(bucket_name: str, key: str):
+    """
+    (encoding, level) configured for the object, or None when it is stored uncompressed.
+    """
+    for bucket, prefix, encoding, level in _rules:
+        if bucket == bucket_name and key.startswith(prefix):
+            return encoding, level
+    return None
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "gzip":
+        # mtime=0 so the same content always compresses to the same bytes
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def compressor(encoding: str, level: int):
+    """
+    Incremental compressor with compress(data) and flush() producing the same format as compress().
+    """
+    if encoding == "gzip":
+        # wbits 31 writes a gzip header, with mtime 0 like compress()
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+def decompressing_reader(stream, encoding: str):
+    """
+    File-like reader returning the decompressed bytes of stream as it is read.
+    """
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    raise ValueError(f"Unsupported content encoding '{encoding}'")
+
+
+def decompress_stream(stream, encoding: str) -> bytes:
+    """
+    Decompress a response body while it is read, without first buffering the compressed object.
+    """
+    reader = decompressing_reader(stream, encoding)
+    chunks = []
+    with reader:
+        while True:
+            chunk = reader.read(_read_chunk_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class CountingStream:
+    """
+    File-like wrapper that counts the bytes read from a response body.
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readable(self):
+        return True
+
+
+class CompressionStats:
+    """
+    Thread safe totals of object bytes before and after compression, and time spent decoding.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "objects_stored": 0,
+            "bytes_stored_raw": 0,
+            "bytes_stored": 0,
+            "objects_fetched": 0,
+            "bytes_fetched": 0,
+            "bytes_fetched_decoded": 0,
+            "decode_ms": 0.0
+        }
+
+    def record_store(self, raw_size: int, stored_size: int):
+        with self._lock:
+            self._stats["objects_stored"] += 1
+            self._stats["bytes_stored_raw"] += raw_size
+            self._stats["bytes_stored"] += stored_size
+
+    def record_fetch(self, fetched_size: int, decoded_size: int, started: float):
+        with self._lock:
+            self._stats["objects_fetched"] += 1
+            self._stats["bytes_fetched"] += fetched_size
+            self._stats["bytes_fetched_decoded"] += decoded_size
+            self._stats["decode_ms"] += (time.perf_counter() - started) * 1000
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["decode_ms"] = round(stats["decode_ms"], 1)
+        return stats
@@ -1,8 +1,11 @@
+import time
+_import_started = time.perf_counter()
+
 import punq
-import httpx
-import boto3
 import os
 import logging
+import functools
+import threading
 from logger import create_logger
 from http_client import HttpClient
 from noaa_client import NoaaClient
@@ -11,26 +14,61 @@ from dynamo_client import DynamoDbClient
 from sqs_client import SqsClient
 from alert_service import AlertService
 from zone_service import ZoneService
+from alert_snapshot import AlertSnapshotStore
+from validator_store import ValidatorStore
 from interfaces import S3Boto3Client, DynamoBoto3Client, SqsBoto3Client
 
+_import_ms = int((time.perf_counter() - _import_started) * 1000)
+
 _aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID", "anything")
 _aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY", "anything")
 _region_name=os.environ.get("AWS_REGION", "us-east-1")
 _endpoint_url=os.environ.get("AWS_ENDPOINT_URL")
+# Must be at least ZONE_FETCH_CONCURRENCY so parallel zone fetches don't queue for a connection
+_s3_max_pool_connections=int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "50"))
+# "module" builds the container once per execution environment, "invocation" rebuilds it on every call
+_container_mode=os.environ.get("CONTAINER_MODE", "module")
+
+_container = None
+_container_init_ms = 0
+_cold_start = True
+
+
+class LazyClient:
+    """
+    Proxy that defers creating a boto3 client or resource until it is first used,
+    so handlers only pay for the AWS services they actually call.
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return getattr(self._instance, name)
+
 
 def create_s3_client():
+    import boto3
+    from botocore.config import Config
     if _endpoint_url:
         return boto3.client(
             "s3",
             aws_access_key_id=_aws_access_key_id,
             aws_secret_access_key=_aws_secret_access_key,
             region_name=_region_name,
-            endpoint_url=_endpoint_url
+            endpoint_url=_endpoint_url,
+            config=Config(max_pool_connections=_s3_max_pool_connections)
         )
     else:
-        return boto3.client("s3")
+        return boto3.client("s3", config=Config(max_pool_connections=_s3_max_pool_connections))
 
 def create_dynamodb_client():
+    import boto3
     if _endpoint_url:
         return boto3.resource(
             'dynamodb',
@@ -43,6 +81,7 @@ def create_dynamodb_client():
         return boto3.resource('dynamodb')
 
 def create_sqs_client():
+    import boto3
     if _endpoint_url:
         return boto3.client(
             "sqs",
@@ -57,22 +96,54 @@ def create_sqs_client():
 def create_container() -> punq.Container:   
     container = punq.Container()
 
-    shared_http_client = httpx.AsyncClient()
-    container.register(httpx.AsyncClient, instance=shared_http_client)
     logger = create_logger()
     container.register(logging.Logger, instance=logger)
-    container.register(HttpClient, HttpClient)
-    container.register(NoaaClient, NoaaClient)
+    container.register(ValidatorStore, ValidatorStore, scope=punq.Scope.singleton)
+    container.register(HttpClient, HttpClient, scope=punq.Scope.singleton)
+    container.register(NoaaClient, NoaaClient, scope=punq.Scope.singleton)
+
+    container.register(S3Boto3Client, instance=LazyClient(create_s3_client))
+    container.register(DynamoBoto3Client, instance=LazyClient(create_dynamodb_client))
+    container.register(SqsBoto3Client, instance=LazyClient(create_sqs_client))
+
+    container.register(S3Client, S3Client, scope=punq.Scope.singleton)
+    container.register(DynamoDbClient, DynamoDbClient, scope=punq.Scope.singleton)
+    container.register(SqsClient, SqsClient, scope=punq.Scope.singleton)
 
-    container.register(S3Boto3Client, factory=create_s3_client)
-    container.register(DynamoBoto3Client, factory=create_dynamodb_client)
-    container.register(SqsBoto3Client, factory=create_sqs_client)
+    container.register(AlertSnapshotStore, AlertSnapshotStore, scope=punq.Scope.singleton)
+    container.register(AlertService, AlertService, scope=punq.Scope.singleton)
+    container.register(ZoneService, ZoneService, scope=punq.Scope.singleton)
 
-    container.register(S3Client, S3Client)
-    container.register(DynamoDbClient, DynamoDbClient)
-    container.register(SqsClient, SqsClient)
+    return container
 
-    container.register(AlertService, AlertService)
-    container.register(ZoneService, ZoneService)
+def get_container() -> punq.Container:
+    global _container, _container_init_ms
+    if _container is None or _container_mode == "invocation":
+        start = time.perf_counter()
+        _container = create_container()
+        _container_init_ms = int((time.perf_counter() - start) * 1000)
+    return _container
 
-    return container
\ No newline at end of file
+def timed_handler(name):
+    """
+    Decorator for lambda handlers that logs whether the invocation was a cold start,
+    the time spent importing the library and building the container, and the handler duration.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _cold_start, _container_init_ms
+            cold_start = _cold_start
+            _cold_start = False
+            _container_init_ms = 0
+            start = time.perf_counter()
+            try:
+                return handler(event, context)
+            finally:
+                duration_ms = int((time.perf_counter() - start) * 1000)
+                create_logger().info(
+                    f"{name} timing: cold_start={cold_start} mode={_container_mode} "
+                    f"import_ms={_import_ms if cold_start else 0} container_init_ms={_container_init_ms} duration_ms={duration_ms}"
+                )
+        return wrapper
+    return decorator
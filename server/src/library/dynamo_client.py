@@ -2,8 +2,12 @@ from interfaces import DynamoBoto3Client
 import logging
 import json
 import sys
+import time
+import random
 import botocore
 
+_max_batch_write_size = 25
+
 class DynamoDbClient:
     def __init__(self, dynamo_boto3_client: DynamoBoto3Client, logger: logging.Logger):
         self._client = dynamo_boto3_client
@@ -16,13 +20,85 @@ class DynamoDbClient:
         except botocore.exceptions.ClientError as e:
             error_code = e.response.get("Error", {}).get("Code", "")
             if error_code == "ValidationException" and "Item size" in str(e):
-                item_size = len(json.dumps(item).encode("utf-8"))
+                item_size = len(json.dumps(item, default=str).encode("utf-8"))
                 item_id = item.get("id", "<no id>")
                 self._logger.error(f"Item too big for DynamoDB: id={item_id}, size={item_size} bytes")
                 self._logger.error(f"Error details: {e}")
             else:
                 raise
 
+    def upsert_items(self, table_name: str, items, id_key="id", max_retries=5):
+        """
+        Write items with batch_write_item in groups of 25. Unprocessed items are retried with
+        exponential backoff. A batch rejected by validation (e.g. an item over the size limit)
+        is written item by item so only the offending item is logged and skipped.
+        """
+        # batch_write_item rejects a batch that contains the same key twice, the last item wins
+        unique_items = {}
+        for item in items:
+            unique_items[item.get(id_key)] = item
+        items = list(unique_items.values())
+
+        client = self._client.meta.client
+        for i in range(0, len(items), _max_batch_write_size):
+            batch = items[i:i + _max_batch_write_size]
+            requests = [{"PutRequest": {"Item": item}} for item in batch]
+            try:
+                unprocessed = self._batch_write(client, table_name, requests, max_retries)
+            except botocore.exceptions.ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code", "")
+                if error_code != "ValidationException":
+                    raise
+                unprocessed = requests
+            for request in unprocessed:
+                self.upsert_item(table_name, request["PutRequest"]["Item"])
+        return len(items)
+
+    def _batch_write(self, client, table_name: str, requests, max_retries):
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(min(5.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+            response = client.batch_write_item(RequestItems={table_name: requests})
+            requests = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not requests:
+                return []
+        self._logger.warning(f"{len(requests)} items still unprocessed in {table_name} after {max_retries} retries")
+        return requests
+
+    def delete_items(self, table_name: str, id_list, id_key="id", max_retries=5):
+        """
+        Delete items with batch_write_item in groups of 25, retrying unprocessed deletes with exponential backoff.
+        Returns the number of keys that could not be deleted.
+        """
+        keys = list(dict.fromkeys(id_list))
+        client = self._client.meta.client
+        failed = 0
+        for i in range(0, len(keys), _max_batch_write_size):
+            requests = [{"DeleteRequest": {"Key": {id_key: id_val}}} for id_val in keys[i:i + _max_batch_write_size]]
+            failed += len(self._batch_write(client, table_name, requests, max_retries))
+        return failed
+
+    def query_index(self, table_name: str, index_name: str, hash_key: str, hash_value, range_key: str = None, max_range_value=None):
+        """
+        All items of one index partition, optionally only those with range_key <= max_range_value.
+        """
+        table = self._client.Table(table_name)
+        names = {"#h": hash_key}
+        values = {":h": hash_value}
+        condition = "#h = :h"
+        if range_key is not None:
+            names["#r"] = range_key
+            values[":r"] = max_range_value
+            condition += " AND #r <= :r"
+        request = {"IndexName": index_name, "KeyConditionExpression": condition,
+                   "ExpressionAttributeNames": names, "ExpressionAttributeValues": values}
+        response = table.query(**request)
+        items = response.get('Items', [])
+        while 'LastEvaluatedKey' in response:
+            response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **request)
+            items.extend(response.get('Items', []))
+        return items
+
     def get_all_items(self, table_name: str):
         table = self._client.Table(table_name)
         response = table.scan()
@@ -32,21 +108,95 @@ class DynamoDbClient:
             items.extend(response.get('Items', []))
         return items
 
-    def get_item_by_id(self, table_name: str, id_value, id_key="id"):
+    def get_item_by_id(self, table_name: str, id_value, id_key="id", consistent_read=False):
         table = self._client.Table(table_name)
-        response = table.get_item(Key={id_key: id_value})
+        response = table.get_item(Key={id_key: id_value}, ConsistentRead=consistent_read)
         return response.get("Item")
 
-    def get_items_by_id_list(self, table_name: str, id_list, id_key="id"):
+    def put_item_if_version(self, table_name: str, item: dict, expected_version=None, version_key="version"):
+        """
+        Optimistic concurrency: put the item only if the stored item still has expected_version,
+        or does not exist yet when expected_version is None. Returns False if another writer got there first.
+        """
+        table = self._client.Table(table_name)
+        if expected_version is None:
+            condition = {"ConditionExpression": "attribute_not_exists(#v)"}
+        else:
+            condition = {"ConditionExpression": "#v = :expected", "ExpressionAttributeValues": {":expected": expected_version}}
+        try:
+            table.put_item(Item=item, ExpressionAttributeNames={"#v": version_key}, **condition)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def add_to_set(self, table_name: str, id_value, attribute: str, values, id_key="id"):
+        """
+        Atomically add values to a string set attribute, creating the item if needed.
+        """
+        table = self._client.Table(table_name)
+        table.update_item(Key={id_key: id_value}, UpdateExpression="ADD #s :v",
+                          ExpressionAttributeNames={"#s": attribute}, ExpressionAttributeValues={":v": set(values)})
+
+    def remove_from_set(self, table_name: str, id_value, attribute: str, values, id_key="id"):
+        """
+        Atomically remove values from a string set attribute. DynamoDB drops the attribute once the set is empty.
+        """
+        table = self._client.Table(table_name)
+        table.update_item(Key={id_key: id_value}, UpdateExpression="DELETE #s :v",
+                          ExpressionAttributeNames={"#s": attribute}, ExpressionAttributeValues={":v": set(values)})
+
+    def remove_attributes(self, table_name: str, id_value, attributes, id_key="id"):
+        table = self._client.Table(table_name)
+        names = {f"#a{i}": name for i, name in enumerate(attributes)}
+        table.update_item(Key={id_key: id_value}, UpdateExpression="REMOVE " + ", ".join(names), ExpressionAttributeNames=names)
+
+    def set_attributes(self, table_name: str, id_value, attributes: dict, id_key="id"):
+        """
+        Set attributes of an existing item. Returns False, without creating it, when the item does not exist.
+        """
+        table = self._client.Table(table_name)
+        names = {f"#a{i}": name for i, name in enumerate(attributes)}
+        values = {f":v{i}": value for i, value in enumerate(attributes.values())}
+        try:
+            table.update_item(Key={id_key: id_value},
+                              UpdateExpression="SET " + ", ".join(f"{name} = :v{i}" for i, name in enumerate(names)),
+                              ConditionExpression="attribute_exists(#key)",
+                              ExpressionAttributeNames={**names, "#key": id_key}, ExpressionAttributeValues=values)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def get_items_by_id_list(self, table_name: str, id_list, id_key="id", attributes=None, max_retries=5):
+        """
+        Fetch items with batch_get_item in groups of 100, retrying UnprocessedKeys.
+        attributes optionally limits the returned top level attributes.
+        """
         table = self._client.Table(table_name)
-        keys = [{id_key: id_val} for id_val in id_list]
+        keys = [{id_key: id_val} for id_val in dict.fromkeys(id_list)]
+        request = {}
+        if attributes:
+            names = {f"#a{i}": name for i, name in enumerate([id_key, *attributes])}
+            request["ProjectionExpression"] = ", ".join(names)
+            request["ExpressionAttributeNames"] = names
         items = []
         for i in range(0, len(keys), 100):
             batch_keys = keys[i:i+100]
-            response = table.meta.client.batch_get_item(
-                RequestItems={table_name: {"Keys": batch_keys}}
-            )
-            items.extend(response["Responses"].get(table_name, []))
+            for attempt in range(max_retries + 1):
+                if attempt:
+                    time.sleep(min(5.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+                response = table.meta.client.batch_get_item(
+                    RequestItems={table_name: {"Keys": batch_keys, **request}}
+                )
+                items.extend(response["Responses"].get(table_name, []))
+                batch_keys = response.get("UnprocessedKeys", {}).get(table_name, {}).get("Keys", [])
+                if not batch_keys:
+                    break
+            if batch_keys:
+                self._logger.warning(f"{len(batch_keys)} keys still unprocessed in {table_name} after {max_retries} retries")
         return items
     
     def delete_item(self, table_name: str, id_value, id_key="id"):
@@ -0,0 +1,129 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import compression
+from s3_client import S3Client
+
+# S3 requires every part but the last to be at least 5 MiB
+_min_part_size = 5 * 1024 * 1024
+_part_size = max(_min_part_size, int(os.environ.get("EXPORT_PART_SIZE_BYTES", str(8 * 1024 * 1024))))
+# Parts uploading while the next one fills, memory stays below (in flight + 1) parts
+_max_parts_in_flight = int(os.environ.get("EXPORT_PARTS_IN_FLIGHT", "2"))
+
+
+class ExportWriter:
+    """
+    Writes an S3 object as it is produced. Bytes are compressed as they arrive when S3_COMPRESSION
+    has a rule for the key, and every full part is uploaded in the background while the next one fills.
+    Objects that end up smaller than one part are stored with a single put.
+    """
+    def __init__(self, s3_client: S3Client, bucket_name: str, key: str, logger: logging.Logger):
+        self._s3_client = s3_client
+        self._bucket_name = bucket_name
+        self._key = key
+        self._logger = logger
+        codec = compression.encoding_for(bucket_name, key)
+        self._encoding = codec[0] if codec else None
+        self._compressor = compression.compressor(*codec) if codec else None
+        self._buffer = bytearray()
+        self._raw_size = 0
+        self._stored_size = 0
+        self._upload_id = None
+        self._executor = None
+        self._parts = []
+
+    def write(self, data: bytes):
+        self._raw_size += len(data)
+        if self._compressor:
+            data = self._compressor.compress(data)
+        self._buffer += data
+        if len(self._buffer) >= _part_size:
+            self._upload_buffer()
+
+    def close(self):
+        """
+        Finish the object. Returns the number of uncompressed bytes written.
+        """
+        if self._compressor:
+            self._buffer += self._compressor.flush()
+        if self._upload_id is None:
+            self._s3_client.put_encoded_object(self._bucket_name, self._key, bytes(self._buffer), self._encoding, self._raw_size)
+            self._buffer = bytearray()
+            return self._raw_size
+
+        try:
+            if self._buffer:
+                self._upload_buffer()
+            parts = [part.result() for part in self._parts]
+            self._executor.shutdown()
+            self._s3_client.complete_multipart_upload(self._bucket_name, self._key, self._upload_id, parts, self._raw_size, self._stored_size)
+        except Exception:
+            # Parts of an upload that is never completed or aborted are billed until a lifecycle rule removes them
+            try:
+                self.abort()
+            except Exception as e:
+                self._logger.error(f"Failed to abort multipart upload of {self._key}: {e}")
+            raise
+        self._logger.info(f"Uploaded {self._key} in {len(parts)} parts, {self._raw_size} bytes written, {self._stored_size} stored.")
+        return self._raw_size
+
+    def abort(self):
+        if self._upload_id is None:
+            return
+        for part in self._parts:
+            part.cancel()
+        self._executor.shutdown()
+        self._s3_client.abort_multipart_upload(self._bucket_name, self._key, self._upload_id)
+        self._upload_id = None
+
+    def _upload_buffer(self):
+        if self._upload_id is None:
+            self._upload_id = self._s3_client.create_multipart_upload(self._bucket_name, self._key, self._encoding)
+            self._executor = ThreadPoolExecutor(max_workers=_max_parts_in_flight)
+        # Wait for the oldest part before starting another, so at most _max_parts_in_flight are held
+        in_flight = [part for part in self._parts if not part.done()]
+        if len(in_flight) >= _max_parts_in_flight:
+            in_flight[0].result()
+        body = bytes(self._buffer)
+        self._buffer = bytearray()
+        self._stored_size += len(body)
+        self._parts.append(self._executor.submit(self._s3_client.upload_part, self._bucket_name, self._key, self._upload_id, len(self._parts) + 1, body))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class JsonArrayWriter:
+    """
+    Streams a JSON array of already serialized items into an ExportWriter, recording the byte range of each item.
+    """
+    def __init__(self, writer: ExportWriter):
+        self._writer = writer
+        self._position = 0
+        self.count = 0
+
+    def write_item(self, item: bytes):
+        """
+        Returns the (start, end) byte range of the item in the uncompressed array.
+        """
+        if isinstance(item, str):
+            item = item.encode("utf-8")
+        self._write(b"," if self.count else b"[")
+        start = self._position
+        self._write(item)
+        self.count += 1
+        return start, self._position
+
+    def close(self):
+        self._write(b"]" if self.count else b"[]")
+
+    def _write(self, data: bytes):
+        self._writer.write(data)
+        self._position += len(data)
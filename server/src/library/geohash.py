@@ -0,0 +1,115 @@
+from typing import Iterable, Set
+import math
+
+_base32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def _bits(precision: int):
+    """
+    (lat bits, lon bits) of a geohash, longitude takes the first and so the extra bit.
+    """
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+def cell_size(precision: int):
+    """
+    (lat degrees, lon degrees) covered by one tile.
+    """
+    lat_bits, lon_bits = _bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def _row_column(lat, lon, precision: int):
+    lat_bits, lon_bits = _bits(precision)
+    lat_size, lon_size = cell_size(precision)
+    row = min(max(int(math.floor((float(lat) + 90.0) / lat_size)), 0), (1 << lat_bits) - 1)
+    column = min(max(int(math.floor((float(lon) + 180.0) / lon_size)), 0), (1 << lon_bits) - 1)
+    return row, column
+
+def _encode_row_column(row: int, column: int, precision: int) -> str:
+    lat_bits, lon_bits = _bits(precision)
+    value = 0
+    # Interleave from the most significant bit, longitude first
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((column >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((row >> lat_bits) & 1)
+    return "".join(_base32[(value >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+def encode(lat, lon, precision: int) -> str:
+    return _encode_row_column(*_row_column(lat, lon, precision), precision)
+
+def tiles_for_box(min_lat, max_lat, min_lon, max_lon, precision: int) -> Set[str]:
+    """
+    Geohashes of every tile that overlaps the (min_lat, max_lat, min_lon, max_lon) box.
+    """
+    min_row, min_column = _row_column(min_lat, min_lon, precision)
+    max_row, max_column = _row_column(max_lat, max_lon, precision)
+    return {
+        _encode_row_column(row, column, precision)
+        for row in range(min_row, max_row + 1)
+        for column in range(min_column, max_column + 1)
+    }
+
+def _grid_position(lat, lon, precision: int):
+    """
+    (row, column) of the point as fractional tile units, clamped to the grid.
+    """
+    lat_size, lon_size = cell_size(precision)
+    return min(max((lat + 90.0) / lat_size, 0.0), 180.0 / lat_size), min(max((lon + 180.0) / lon_size, 0.0), 360.0 / lon_size)
+
+def tiles_for_segment(lat1, lon1, lat2, lon2, precision: int) -> Set[str]:
+    """
+    Geohashes of every tile the segment passes through, walking the grid along the line (Amanatides-Woo)
+    so a long diagonal segment covers about rows + columns tiles rather than rows * columns.
+    Both tiles beside a corner the segment passes through are included.
+    """
+    row, column = _row_column(lat1, lon1, precision)
+    end_row, end_column = _row_column(lat2, lon2, precision)
+    cells = {(row, column)}
+    y1, x1 = _grid_position(lat1, lon1, precision)
+    y2, x2 = _grid_position(lat2, lon2, precision)
+    dy, dx = y2 - y1, x2 - x1
+    step_row = 1 if dy > 0 else -1
+    step_column = 1 if dx > 0 else -1
+    # Fraction of the segment at which the next row and column boundaries are crossed, and the fraction between two boundaries
+    next_row = ((row + (step_row > 0) - y1) / dy) if dy else math.inf
+    next_column = ((column + (step_column > 0) - x1) / dx) if dx else math.inf
+    row_delta = abs(1.0 / dy) if dy else math.inf
+    column_delta = abs(1.0 / dx) if dx else math.inf
+
+    steps = abs(end_row - row) + abs(end_column - column)
+    while steps > 0 and (row, column) != (end_row, end_column):
+        if abs(next_row - next_column) <= 1e-12:
+            # Through a corner: both neighbours touch the segment
+            cells.add((row + step_row, column))
+            cells.add((row, column + step_column))
+            row += step_row
+            column += step_column
+            next_row += row_delta
+            next_column += column_delta
+            steps -= 2
+        elif next_row < next_column:
+            row += step_row
+            next_row += row_delta
+            steps -= 1
+        else:
+            column += step_column
+            next_column += column_delta
+            steps -= 1
+        cells.add((row, column))
+    cells.add((end_row, end_column))
+    return {_encode_row_column(row, column, precision) for row, column in cells}
+
+def tiles_for_route(coordinates: Iterable, precision: int, match_segments: bool = True) -> Set[str]:
+    """
+    Geohashes of the tiles holding the (lat, lon) route points. With match_segments every tile
+    a segment passes through is added, so no tile a segment crosses is missed.
+    """
+    points = [(float(lat), float(lon)) for lat, lon in coordinates]
+    tiles = {encode(lat, lon, precision) for lat, lon in points}
+    if match_segments:
+        for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+            tiles.update(tiles_for_segment(lat1, lon1, lat2, lon2, precision))
+    return tiles
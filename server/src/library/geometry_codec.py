@@ -0,0 +1,157 @@
+import struct
+import simplejson as json
+
+# Binary document: MAGIC, uint32 JSON length, the JSON with every packed geometry replaced by
+# {"$geometry": index}, uint32 geometry count, then each geometry as uint32 length + blob.
+#
+# Geometry blob, little endian:
+#   uint8 type, uint8 dimensions, uint16 reserved
+#   int32 min_lon, min_lat, max_lon, max_lat (fixed point 1e-5)
+#   uint32 polygon count, ring count, vertex count, payload length
+#   uint32 polygon offsets (polygon count + 1, into the rings)
+#   uint32 ring offsets (ring count + 1, into the vertices)
+#   payload: fixed point values (1e-5) vertex by vertex, each the zigzag varint of its delta
+#   from the same dimension of the previous vertex
+MAGIC = b"WDG1"
+
+_placeholder_key = "$geometry"
+_geometry_header = struct.Struct("<BBH4i4I")
+_uint32 = struct.Struct("<I")
+_type_codes = {
+    "Point": 1,
+    "MultiPoint": 2,
+    "LineString": 3,
+    "MultiLineString": 4,
+    "Polygon": 5,
+    "MultiPolygon": 6
+}
+_types = {code: geometry_type for geometry_type, code in _type_codes.items()}
+# A zigzag int64 needs at most 10 groups of 7 bits
+_max_varint_bytes = 10
+
+
+def is_encoded(body) -> bool:
+    return bytes(body[:len(MAGIC)]) == MAGIC
+
+
+def _encode_varints(values):
+    import numpy as np
+    zigzag = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+    lengths = np.ones(len(zigzag), dtype=np.int64)
+    for group in range(1, _max_varint_bytes):
+        lengths += zigzag >= np.uint64(1 << (7 * group))
+    starts = np.cumsum(lengths) - lengths
+    payload = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for group in range(int(lengths.max()) if len(lengths) else 0):
+        present = lengths > group
+        chunk = (zigzag[present] >> np.uint64(7 * group)) & np.uint64(0x7f)
+        more = (lengths[present] > group + 1).astype(np.uint64) << np.uint64(7)
+        payload[starts[present] + group] = (chunk | more).astype(np.uint8)
+    return payload
+
+
+def _decode_varints(payload):
+    import numpy as np
+    if not len(payload):
+        return np.zeros(0, dtype=np.int64)
+    last = payload < 0x80
+    ends = np.flatnonzero(last)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Position of each byte within its varint
+    value_index = np.cumsum(last) - last
+    shifts = (np.arange(len(payload)) - starts[value_index]) * 7
+    parts = (payload & 0x7f).astype(np.uint64) << shifts.astype(np.uint64)
+    zigzag = np.add.reduceat(parts, starts)
+    return (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+
+
+def encode_geometry(packed) -> bytes:
+    import numpy as np
+    fixed = packed.fixed_point()
+    deltas = np.diff(fixed, axis=0, prepend=np.zeros((1, fixed.shape[1]), dtype=np.int64))
+    payload = _encode_varints(deltas.ravel())
+    header = _geometry_header.pack(
+        _type_codes[packed.type], fixed.shape[1], 0,
+        int(fixed[:, 0].min()), int(fixed[:, 1].min()), int(fixed[:, 0].max()), int(fixed[:, 1].max()),
+        len(packed.polygon_offsets) - 1, packed.ring_count, packed.vertex_count, len(payload)
+    )
+    return b"".join((
+        header,
+        np.asarray(packed.polygon_offsets, dtype="<u4").tobytes(),
+        np.asarray(packed.ring_offsets, dtype="<u4").tobytes(),
+        payload.tobytes()
+    ))
+
+
+def decode_geometry(view: memoryview):
+    """
+    Decode one geometry blob into PackedCoordinates. The offsets and payload are read in place from the buffer.
+    """
+    import numpy as np
+    from packed_geometry import PackedCoordinates
+    type_code, dimensions, _, _, _, _, _, polygon_count, ring_count, vertex_count, payload_length = _geometry_header.unpack_from(view)
+    offset = _geometry_header.size
+    polygon_offsets = np.frombuffer(view, dtype="<u4", count=polygon_count + 1, offset=offset)
+    offset += 4 * (polygon_count + 1)
+    ring_offsets = np.frombuffer(view, dtype="<u4", count=ring_count + 1, offset=offset)
+    offset += 4 * (ring_count + 1)
+    payload = np.frombuffer(view, dtype=np.uint8, count=payload_length, offset=offset)
+
+    deltas = _decode_varints(payload).reshape(vertex_count, dimensions)
+    fixed = np.cumsum(deltas, axis=0)
+    return PackedCoordinates.from_fixed_point(_types[type_code], fixed, ring_offsets.astype(np.int64), polygon_offsets.tolist())
+
+
+def dumps(document) -> bytes:
+    """
+    Encode a zone or weather alert document whose geometry coordinates are PackedCoordinates.
+    Everything else is stored as JSON.
+    """
+    from packed_geometry import PackedCoordinates
+    geometries = []
+
+    def default(value):
+        if isinstance(value, PackedCoordinates):
+            geometries.append(encode_geometry(value))
+            return {_placeholder_key: len(geometries) - 1}
+        return str(value)
+
+    metadata = json.dumps(document, default=default, separators=(",", ":")).encode("utf-8")
+    parts = [MAGIC, _uint32.pack(len(metadata)), metadata, _uint32.pack(len(geometries))]
+    for geometry in geometries:
+        parts.append(_uint32.pack(len(geometry)))
+        parts.append(geometry)
+    return b"".join(parts)
+
+
+def loads(body):
+    """
+    Decode a binary document. Geometry coordinates come back as PackedCoordinates,
+    JSON is produced from them on demand with to_json().
+    """
+    view = memoryview(body)
+    if not is_encoded(view):
+        raise ValueError("Not a binary geometry document")
+    offset = len(MAGIC)
+    (metadata_length,) = _uint32.unpack_from(view, offset)
+    offset += _uint32.size
+    metadata = view[offset:offset + metadata_length]
+    offset += metadata_length
+    (geometry_count,) = _uint32.unpack_from(view, offset)
+    offset += _uint32.size
+
+    geometries = []
+    for _ in range(geometry_count):
+        (length,) = _uint32.unpack_from(view, offset)
+        offset += _uint32.size
+        geometries.append(decode_geometry(view[offset:offset + length]))
+        offset += length
+
+    def object_hook(value):
+        if _placeholder_key in value and len(value) == 1:
+            return geometries[value[_placeholder_key]]
+        return value
+
+    return json.loads(bytes(metadata).decode("utf-8"), object_hook=object_hook)
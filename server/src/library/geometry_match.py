@@ -0,0 +1,139 @@
+from typing import List, Optional
+import numpy as np
+
+# Limit the size of the (points x edges) matrices built by the vectorized tests
+_max_matrix_cells = 1_000_000
+
+class PolygonRings:
+    """
+    Polygon rings of a GeoJSON Polygon/MultiPolygon as float64 (lon, lat) arrays.
+    Each polygon is a list of rings, outer ring first; holes are handled by even-odd counting.
+    """
+    def __init__(self, polygons: List[List[np.ndarray]]):
+        self.polygons = polygons
+        self.bboxes = []
+        for rings in polygons:
+            vertices = np.concatenate(rings)
+            # (min_lon, min_lat, max_lon, max_lat)
+            self.bboxes.append((vertices[:, 0].min(), vertices[:, 1].min(), vertices[:, 0].max(), vertices[:, 1].max()))
+
+    def __len__(self):
+        return len(self.polygons)
+
+
+def _ring_array(ring) -> Optional[np.ndarray]:
+    try:
+        array = np.asarray(ring, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 2 or array.shape[0] < 3 or array.shape[1] < 2:
+        return None
+    return array[:, :2]
+
+
+def polygon_rings_from_geometries(geometries) -> Optional[PolygonRings]:
+    """
+    Collect the Polygon and MultiPolygon rings of a list of Geometry objects.
+    Returns None when a geometry can not be tested exactly, so the caller keeps the bounding box match.
+    """
+    polygons = []
+    for geometry in geometries:
+        if geometry.type not in ("Polygon", "MultiPolygon"):
+            return None
+
+        packed = geometry.packed() if hasattr(geometry, "packed") else None
+        if packed is not None:
+            # Views into the packed vertices, no need to convert the nested lists again
+            polygon_list = [[ring if len(ring) >= 3 else None for ring in rings] for rings in packed.polygons()]
+        else:
+            coordinates = geometry.coordinates or []
+            polygon_list = [coordinates] if geometry.type == "Polygon" else coordinates
+            polygon_list = [[_ring_array(ring) for ring in polygon] for polygon in polygon_list]
+
+        for rings in polygon_list:
+            if not rings or rings[0] is None:
+                return None
+            polygons.append([ring for ring in rings if ring is not None])
+
+    if not polygons:
+        return None
+    return PolygonRings(polygons)
+
+
+def _points_in_rings(lons: np.ndarray, lats: np.ndarray, rings: List[np.ndarray]) -> np.ndarray:
+    # Crossing number test counted over every ring of the polygon (even-odd rule)
+    crossings = np.zeros(len(lons), dtype=np.int64)
+    for ring in rings:
+        x1 = ring[:, 0]
+        y1 = ring[:, 1]
+        x2 = np.roll(x1, -1)
+        y2 = np.roll(y1, -1)
+        step = max(1, _max_matrix_cells // max(1, len(ring)))
+        for start in range(0, len(lons), step):
+            px = lons[start:start + step, None]
+            py = lats[start:start + step, None]
+            straddles = (y1 > py) != (y2 > py)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            crossings[start:start + step] += np.count_nonzero(straddles & (px < x_cross), axis=1)
+    return (crossings % 2) == 1
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _segments_cross_rings(starts: np.ndarray, ends: np.ndarray, rings: List[np.ndarray]) -> np.ndarray:
+    result = np.zeros(len(starts), dtype=bool)
+    for ring in rings:
+        cx = ring[:, 0]
+        cy = ring[:, 1]
+        dx = np.roll(cx, -1)
+        dy = np.roll(cy, -1)
+        step = max(1, _max_matrix_cells // max(1, len(ring)))
+        for start in range(0, len(starts), step):
+            ax = starts[start:start + step, 0, None]
+            ay = starts[start:start + step, 1, None]
+            bx = ends[start:start + step, 0, None]
+            by = ends[start:start + step, 1, None]
+            o1 = _orientation(ax, ay, bx, by, cx, cy)
+            o2 = _orientation(ax, ay, bx, by, dx, dy)
+            o3 = _orientation(cx, cy, dx, dy, ax, ay)
+            o4 = _orientation(cx, cy, dx, dy, bx, by)
+            # The bounding box overlap check resolves the collinear cases
+            overlap = (
+                (np.minimum(ax, bx) <= np.maximum(cx, dx)) & (np.minimum(cx, dx) <= np.maximum(ax, bx)) &
+                (np.minimum(ay, by) <= np.maximum(cy, dy)) & (np.minimum(cy, dy) <= np.maximum(ay, by))
+            )
+            hits = (o1 * o2 <= 0) & (o3 * o4 <= 0) & overlap
+            result[start:start + step] |= hits.any(axis=1)
+    return result
+
+
+def route_intersects(polygon_rings: PolygonRings, route, include_segments=True) -> bool:
+    """
+    True if any (lat, lon) route point falls inside the polygons, or when include_segments is set,
+    if any segment between consecutive route points crosses a polygon ring.
+    """
+    route = np.asarray(route, dtype=np.float64)
+    if route.ndim != 2 or route.shape[0] == 0:
+        return False
+    lats = route[:, 0]
+    lons = route[:, 1]
+
+    for rings, (min_lon, min_lat, max_lon, max_lat) in zip(polygon_rings.polygons, polygon_rings.bboxes):
+        in_box = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        if in_box.any() and _points_in_rings(lons[in_box], lats[in_box], rings).any():
+            return True
+
+        if include_segments and len(route) > 1:
+            starts = np.column_stack((lons[:-1], lats[:-1]))
+            ends = np.column_stack((lons[1:], lats[1:]))
+            seg_box = (
+                (np.maximum(starts[:, 0], ends[:, 0]) >= min_lon) & (np.minimum(starts[:, 0], ends[:, 0]) <= max_lon) &
+                (np.maximum(starts[:, 1], ends[:, 1]) >= min_lat) & (np.minimum(starts[:, 1], ends[:, 1]) <= max_lat)
+            )
+            if seg_box.any() and _segments_cross_rings(starts[seg_box], ends[seg_box], rings).any():
+                return True
+
+    return False
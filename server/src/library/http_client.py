@@ -1,20 +1,119 @@
-import httpx
+import asyncio
 import json
 from typing import Optional, Dict
 from decimal import Decimal
+from validator_store import ValidatorStore
+from json_stream import JsonArrayStream
+
+class NotModified:
+    """
+    Returned by conditional requests when the server answered 304 Not Modified.
+    """
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "NOT_MODIFIED"
+
+NOT_MODIFIED = NotModified()
 
 class HttpClient:
-    def __init__(self, timeout: float = 30.0):
-        self._client = httpx.AsyncClient(timeout=timeout)
+    def __init__(self, validator_store: ValidatorStore, timeout: float = 30.0):
+        self._validator_store = validator_store
+        self._timeout = timeout
+        self._client = None
+        self._loop = None
+        self._conditional_requests = 0
+        self._not_modified = 0
+        # Validators of fetched responses, saved by commit_validators once the caller has processed them
+        self._pending_validators = {}
 
-    async def get_json(self, endpoint: str, headers: Optional[Dict[str, str]] = None) -> dict:
-        starting_headers = self._client.headers.copy()
+    def _get_client(self):
+        # httpx pools are bound to the event loop that created them and each asyncio.run
+        # starts a new loop, so the client is created lazily and replaced when the loop changes
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import httpx
+            self._client = httpx.AsyncClient(timeout=self._timeout)
+            self._loop = loop
+        return self._client
+
+    def _build_headers(self, client, endpoint: str, headers: Optional[Dict[str, str]], conditional: bool):
+        starting_headers = client.headers.copy()
         if headers:
             starting_headers.update(headers)
 
-        response = await self._client.get(endpoint, headers=starting_headers)
+        if conditional:
+            self._conditional_requests += 1
+            validators = self._validator_store.get(endpoint)
+            if validators.get("etag"):
+                starting_headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                starting_headers["If-Modified-Since"] = validators["last_modified"]
+        return starting_headers
+
+    async def get_json(self, endpoint: str, headers: Optional[Dict[str, str]] = None, conditional: bool = False, parse_float=Decimal):
+        """
+        GET and parse a JSON document. With conditional set, the stored ETag / Last-Modified
+        validators are sent and NOT_MODIFIED is returned when the server answers 304.
+        The new validators are only saved when the caller calls commit_validators.
+        """
+        client = self._get_client()
+        starting_headers = self._build_headers(client, endpoint, headers, conditional)
+
+        response = await client.get(endpoint, headers=starting_headers)
+        if conditional and response.status_code == 304:
+            self._not_modified += 1
+            return NOT_MODIFIED
         response.raise_for_status()
-        return json.loads(response.text, parse_float=Decimal)
+        result = json.loads(response.text, parse_float=parse_float)
+
+        if conditional:
+            self._pending_validators[endpoint] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return result
+
+    async def stream_json_items(self, endpoint: str, stream: JsonArrayStream, headers: Optional[Dict[str, str]] = None,
+                                conditional: bool = False, chunk_size: int = 64 * 1024):
+        """
+        Async generator over the items of one array of a JSON response, parsed as the body arrives so the
+        whole payload is never held in memory. The rest of the document is in stream.document afterwards.
+        Yields NOT_MODIFIED once when conditional is set and the server answers 304.
+        The new validators are only saved when the caller calls commit_validators.
+        """
+        client = self._get_client()
+        starting_headers = self._build_headers(client, endpoint, headers, conditional)
+
+        async with client.stream("GET", endpoint, headers=starting_headers) as response:
+            if conditional and response.status_code == 304:
+                self._not_modified += 1
+                yield NOT_MODIFIED
+                return
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                for item in stream.feed(chunk):
+                    yield item
+            stream.finish()
+
+        if conditional:
+            self._pending_validators[endpoint] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    def commit_validators(self, endpoint: str):
+        """
+        Save the validators of the last conditional fetch of endpoint. Call once its content has been processed,
+        so a run that fails part way fetches the content again instead of getting 304 for what it never stored.
+        """
+        validators = self._pending_validators.pop(endpoint, None)
+        if validators is not None:
+            self._validator_store.set(endpoint, *validators)
+
+    def get_conditional_stats(self):
+        return {
+            "conditional_requests": self._conditional_requests,
+            "not_modified": self._not_modified,
+            "hit_rate": self._not_modified / self._conditional_requests if self._conditional_requests else 0.0
+        }
 
     async def close(self):
-        await self._client.aclose()
\ No newline at end of file
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
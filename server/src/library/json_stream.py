@@ -0,0 +1,196 @@
+import json
+import re
+from decimal import Decimal
+
+_structure_tokens = re.compile(rb'[\[\]{}"]')
+_string_tokens = re.compile(rb'["\\]')
+_key_suffix = re.compile(rb'\s*(?::\s*(\[)?)?')
+_whitespace = b" \t\r\n"
+
+_prefix = 0
+_items = 1
+_suffix = 2
+
+class JsonArrayStream:
+    """
+    Incremental parser that yields the items of one array member of a JSON document
+    (e.g. the "features" of a GeoJSON FeatureCollection) as soon as each item is complete.
+    Feed it chunks of bytes; only the item being read is buffered. The rest of the document,
+    with the array emptied, is available from `document` after finish().
+    """
+    def __init__(self, key: str = "features", parse_float=Decimal):
+        self._key = json.dumps(key).encode("utf-8")
+        self._parse_float = parse_float
+        self._buffer = bytearray()
+        self._pos = 0
+        self._state = _prefix
+        self._outer = bytearray()
+        self._outer_depth = 0
+        self._key_end = None
+        self._item_start = None
+        self._item_depth = 0
+        self._in_string = False
+        self.document = None
+        self.item_count = 0
+
+    def feed(self, chunk: bytes) -> list:
+        self._buffer += chunk
+        items = []
+        while True:
+            if self._state == _prefix:
+                if not self._scan_prefix():
+                    break
+            elif self._state == _items:
+                item = self._scan_item()
+                if item is _need_more:
+                    break
+                if item is not _array_end:
+                    items.append(item)
+            else:
+                self._outer += self._buffer[self._pos:]
+                self._pos = len(self._buffer)
+                break
+        self._compact()
+        return items
+
+    def finish(self):
+        if self._state == _items or self._key_end is not None:
+            raise ValueError("Incomplete JSON document")
+        self._outer += self._buffer[self._pos:]
+        self._buffer = bytearray()
+        self._pos = 0
+        self.document = json.loads(self._outer.decode("utf-8"), parse_float=self._parse_float)
+        return self.document
+
+    def _compact(self):
+        start = self._pos if self._item_start is None else self._item_start
+        if start:
+            del self._buffer[:start]
+            self._pos -= start
+            if self._item_start is not None:
+                self._item_start = 0
+            if self._key_end is not None:
+                self._key_end -= start
+
+    def _scan_prefix(self) -> bool:
+        """
+        Copy the document into the outer buffer until the key's array opens. Returns False when more input is needed.
+        """
+        buffer = self._buffer
+        while True:
+            if self._key_end is not None:
+                match = _key_suffix.match(buffer, self._key_end)
+                if match.end() == len(buffer):
+                    # Need more input to know what follows the key
+                    return False
+                key_end = self._key_end
+                self._key_end = None
+                if match.group(1):
+                    self._outer += buffer[self._pos:match.end()]
+                    self._pos = match.end()
+                    self._state = _items
+                    return True
+                self._outer += buffer[self._pos:key_end]
+                self._pos = key_end
+                continue
+
+            match = _structure_tokens.search(buffer, self._pos)
+            if match is None:
+                self._outer += buffer[self._pos:]
+                self._pos = len(buffer)
+                return False
+            token = buffer[match.start()]
+            if token == 0x22:  # "
+                end = self._find_string_end(match.start() + 1)
+                if end is None:
+                    self._outer += buffer[self._pos:match.start()]
+                    self._pos = match.start()
+                    return False
+                if self._outer_depth == 1 and buffer[match.start():end] == self._key:
+                    self._key_end = end
+                    continue
+                self._outer += buffer[self._pos:end]
+                self._pos = end
+            else:
+                self._outer_depth += 1 if token in (0x5b, 0x7b) else -1
+                self._outer += buffer[self._pos:match.end()]
+                self._pos = match.end()
+
+    def _find_string_end(self, pos):
+        """
+        Position just after the closing quote of a string whose content starts at pos, or None if incomplete.
+        """
+        buffer = self._buffer
+        while True:
+            match = _string_tokens.search(buffer, pos)
+            if match is None:
+                return None
+            if buffer[match.start()] == 0x5c:  # backslash escape
+                if match.start() + 1 >= len(buffer):
+                    return None
+                pos = match.start() + 2
+                continue
+            return match.end()
+
+    def _scan_item(self):
+        buffer = self._buffer
+        if self._item_start is None:
+            # Skip separators between items
+            while self._pos < len(buffer) and (buffer[self._pos] in _whitespace or buffer[self._pos] == 0x2c):
+                self._pos += 1
+            if self._pos >= len(buffer):
+                return _need_more
+            if buffer[self._pos] == 0x5d:  # ]
+                self._outer += b"]"
+                self._pos += 1
+                self._outer_depth -= 1
+                self._state = _suffix
+                return _array_end
+            self._item_start = self._pos
+            self._item_depth = 0
+
+        first = buffer[self._item_start]
+        if first in (0x7b, 0x5b):
+            while True:
+                if self._in_string:
+                    end = self._find_string_end(self._pos)
+                    if end is None:
+                        return _need_more
+                    self._pos = end
+                    self._in_string = False
+                match = _structure_tokens.search(buffer, self._pos)
+                if match is None:
+                    self._pos = len(buffer)
+                    return _need_more
+                token = buffer[match.start()]
+                self._pos = match.end()
+                if token == 0x22:
+                    self._in_string = True
+                elif token in (0x7b, 0x5b):
+                    self._item_depth += 1
+                else:
+                    self._item_depth -= 1
+                    if self._item_depth == 0:
+                        break
+        elif first == 0x22:
+            end = self._find_string_end(self._item_start + 1)
+            if end is None:
+                return _need_more
+            self._pos = end
+        else:
+            # Number, true, false or null
+            end = self._item_start
+            while end < len(buffer) and buffer[end] not in b",] \t\r\n":
+                end += 1
+            if end >= len(buffer):
+                return _need_more
+            self._pos = end
+
+        raw = bytes(buffer[self._item_start:self._pos])
+        self._item_start = None
+        self.item_count += 1
+        return json.loads(raw.decode("utf-8"), parse_float=self._parse_float)
+
+
+_array_end = object()
+_need_more = object()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+import threading
+import time
+
+class LruCache:
+    """
+    Thread safe LRU cache bounded by the approximate size in bytes of its entries.
+    Each entry keeps a validator (e.g. an S3 ETag) and the time it was last validated.
+    """
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    def get(self, key):
+        """
+        Returns (value, validator, validated_at) or None. Does not count as a hit or miss,
+        the caller records the outcome once it knows whether the entry is still valid.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1], entry[3]
+
+    def put(self, key, value, validator, size: int):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+            if size > self._max_bytes:
+                return
+            self._entries[key] = (value, validator, size, time.monotonic())
+            self._size += size
+            while self._size > self._max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[2]
+                self.evictions += 1
+
+    def touch(self, key):
+        """
+        Mark an entry as revalidated now.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], entry[2], time.monotonic())
+            self.revalidations += 1
+
+    def remove(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self._max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "revalidations": self.revalidations
+            }
@@ -1,4 +1,6 @@
-from http_client import HttpClient
+from decimal import Decimal
+from http_client import HttpClient, NOT_MODIFIED
+from json_stream import JsonArrayStream
 
 NOAA_BASE_URL = "https://api.weather.gov/"
 NOAA_ALERTS_URL = f"{NOAA_BASE_URL}alerts/active"
@@ -8,14 +10,59 @@ class NoaaClient:
     def __init__(self, http_client: HttpClient):
         self.http_client = http_client
 
-    async def get_active_alerts(self):
-        raw_json = await self.http_client.get_json(NOAA_ALERTS_URL)
+    async def get_active_alerts(self, conditional=False):
+        """
+        Returns the alert features, or NOT_MODIFIED when conditional is set and nothing changed since the last fetch.
+        """
+        raw_json = await self.http_client.get_json(NOAA_ALERTS_URL, conditional=conditional)
+        if raw_json is NOT_MODIFIED:
+            return NOT_MODIFIED
         return raw_json.get('features', [])
 
-    async def get_all_zones(self):
-        raw_json = await self.http_client.get_json(NOAA_ZONES_URL)
-        return raw_json.get('features', [])
+    async def iter_features(self, url: str, conditional=False, parse_float=Decimal):
+        """
+        Yield the features of a NOAA collection one at a time, parsing each page incrementally as it
+        downloads and following pagination.next links. parse_float chooses float or Decimal numbers.
+        Yields NOT_MODIFIED once when conditional is set and the first page is unchanged.
+        """
+        seen = set()
+        while url and url not in seen:
+            seen.add(url)
+            stream = JsonArrayStream("features", parse_float=parse_float)
+            async for feature in self.http_client.stream_json_items(url, stream, conditional=conditional):
+                if feature is NOT_MODIFIED:
+                    yield NOT_MODIFIED
+                    return
+                yield feature
+            # Only the first page is fetched conditionally, later pages depend on its cursor
+            conditional = False
+            if not stream.item_count:
+                return
+            url = (stream.document or {}).get('pagination', {}).get('next')
+
+    def commit_active_alerts(self):
+        """
+        Save the validators of the last conditional alerts fetch, once its alerts are stored.
+        """
+        self.http_client.commit_validators(NOAA_ALERTS_URL)
+
+    def commit_zones(self):
+        """
+        Save the validators of the last conditional zones fetch, once its zones are stored.
+        """
+        self.http_client.commit_validators(NOAA_ZONES_URL)
+
+    async def iter_active_alerts(self, conditional=False, parse_float=Decimal):
+        async for feature in self.iter_features(NOAA_ALERTS_URL, conditional=conditional, parse_float=parse_float):
+            yield feature
+
+    async def iter_zones(self, conditional=False, parse_float=Decimal):
+        """
+        Yield zone features as they arrive, or NOT_MODIFIED once when conditional is set and nothing changed.
+        """
+        async for feature in self.iter_features(NOAA_ZONES_URL, conditional=conditional, parse_float=parse_float):
+            yield feature
 
-    async def get_zone_coordinates(self, zone_id: str):
+    async def get_zone_coordinates(self, zone_id: str, parse_float=Decimal):
         url = f"{NOAA_ZONES_URL}/{zone_id}"
-        return await self.http_client.get_json(url)
+        return await self.http_client.get_json(url, parse_float=parse_float)
@@ -0,0 +1,290 @@
+from typing import List, Optional
+from decimal import Decimal
+import numpy as np
+
+_precision = 5
+_scale = 10 ** _precision
+# Approximate memory of one original [lon, lat] pair, a list object and two numbers
+_original_vertex_bytes = 130
+# Approximate length of one rounded [lon, lat] pair in the serialized JSON
+_json_vertex_bytes = 24
+
+# Nesting of GeoJSON coordinates above the ring level, by geometry type
+_ring_depths = {
+    "Point": 0,
+    "MultiPoint": 1,
+    "LineString": 1,
+    "Polygon": 2,
+    "MultiLineString": 2,
+    "MultiPolygon": 3
+}
+
+# Scaled values closer than this to a rounding tie are rounded from the original value
+_tie_tolerance = 1e-6
+# Beyond this the scaled values no longer fit the int64 formatting
+_max_abs_value = 1e9
+
+_dash = ord("-")
+_dot = ord(".")
+_comma = ord(",")
+_open = ord("[")
+_close = ord("]")
+_zero = ord("0")
+
+
+class PackedCoordinates:
+    """
+    GeoJSON coordinates packed once into a contiguous (vertices x dimensions) float64 array
+    with ring offsets into it, and polygon offsets into the rings for MultiPolygons.
+    Rounding, bounding box and serialization are vectorized over the packed array, and produce
+    the same JSON as rounding every value with round(Decimal(value), 5).
+    """
+    def __init__(self, geometry_type: str, rings: Optional[list], vertices: np.ndarray, ring_offsets: np.ndarray, polygon_offsets: List[int], fixed: np.ndarray = None):
+        self.type = geometry_type
+        self.vertices = vertices
+        self.ring_offsets = ring_offsets
+        self.polygon_offsets = polygon_offsets
+        # The original nested values, None for coordinates that were stored as fixed point
+        self._rings = rings
+        self._fixed = fixed
+        self._json = None
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def ring_count(self) -> int:
+        return len(self.ring_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory held, counting the JSON as if to_json() had been called since it is built on first use.
+        """
+        size = self.vertices.nbytes + self.ring_offsets.nbytes
+        if self._fixed is not None:
+            size += self._fixed.nbytes
+        if self._rings is not None:
+            size += self.vertex_count * _original_vertex_bytes
+        return size + (len(self._json) if self._json is not None else self.vertex_count * _json_vertex_bytes)
+
+    @classmethod
+    def from_geojson(cls, geometry_type: str, coordinates) -> Optional["PackedCoordinates"]:
+        """
+        Pack the coordinates of a GeoJSON geometry. Returns None for geometries that can't be
+        packed (GeometryCollection, empty or ragged rings, non numeric values) so the caller keeps the nested lists.
+        """
+        depth = _ring_depths.get(geometry_type)
+        if depth is None or not isinstance(coordinates, list) or not coordinates:
+            return None
+
+        if depth == 0:
+            rings = [[coordinates]]
+            polygon_offsets = [0, 1]
+        elif depth == 1:
+            rings = [coordinates]
+            polygon_offsets = [0, 1]
+        elif depth == 2:
+            rings = coordinates
+            polygon_offsets = [0, len(rings)]
+        else:
+            rings = []
+            polygon_offsets = [0]
+            for polygon in coordinates:
+                if not isinstance(polygon, list) or not polygon:
+                    return None
+                rings.extend(polygon)
+                polygon_offsets.append(len(rings))
+
+        arrays = []
+        for ring in rings:
+            if not isinstance(ring, list) or not ring:
+                return None
+            try:
+                array = np.array(ring, dtype=np.float64)
+            except (TypeError, ValueError):
+                return None
+            if array.ndim != 2 or array.shape[1] < 2 or (arrays and array.shape[1] != arrays[0].shape[1]):
+                return None
+            arrays.append(array)
+
+        packed = cls._from_arrays(geometry_type, rings, arrays, polygon_offsets)
+        if not np.isfinite(packed.vertices).all() or np.abs(packed.vertices).max() >= _max_abs_value:
+            return None
+        return packed
+
+    @classmethod
+    def from_fixed_point(cls, geometry_type: str, fixed: np.ndarray, ring_offsets: np.ndarray, polygon_offsets: List[int]) -> "PackedCoordinates":
+        """
+        Coordinates already rounded to 5 decimals, as integers scaled by 10^5.
+        """
+        return cls(geometry_type, None, fixed / _scale, ring_offsets, polygon_offsets, fixed)
+
+    @classmethod
+    def _from_arrays(cls, geometry_type, rings, arrays, polygon_offsets, fixed=None):
+        vertices = arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+        ring_offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(array) for array in arrays], out=ring_offsets[1:])
+        if fixed is not None:
+            fixed = fixed[0] if len(fixed) == 1 else np.concatenate(fixed)
+        return cls(geometry_type, rings, vertices, ring_offsets, polygon_offsets, fixed)
+
+    def subset(self, keep: np.ndarray, keep_rings=None) -> "PackedCoordinates":
+        """
+        A PackedCoordinates with only the vertices where keep is set, without the rings where keep_rings is not set.
+        """
+        rings = [] if self._rings is not None else None
+        arrays = []
+        fixed = [] if self._fixed is not None else None
+        polygon_offsets = [0]
+        offsets = self.ring_offsets.tolist()
+        for polygon_start, polygon_end in zip(self.polygon_offsets[:-1], self.polygon_offsets[1:]):
+            for ring in range(polygon_start, polygon_end):
+                if keep_rings is not None and not keep_rings[ring]:
+                    continue
+                indexes = offsets[ring] + np.flatnonzero(keep[offsets[ring]:offsets[ring + 1]])
+                arrays.append(self.vertices[indexes])
+                if fixed is not None:
+                    fixed.append(self._fixed[indexes])
+                if rings is not None:
+                    original = self._rings[ring]
+                    rings.append([original[index - offsets[ring]] for index in indexes.tolist()])
+            if len(arrays) > polygon_offsets[-1]:
+                polygon_offsets.append(len(arrays))
+        return PackedCoordinates._from_arrays(self.type, rings, arrays, polygon_offsets, fixed)
+
+    def coordinates(self):
+        """
+        The packed coordinates as GeoJSON nested lists of the original values, or of floats when stored as fixed point.
+        """
+        rings = self._rings
+        if rings is None:
+            offsets = self.ring_offsets.tolist()
+            vertices = self.vertices.tolist()
+            rings = [vertices[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        depth = _ring_depths[self.type]
+        if depth == 0:
+            return rings[0][0]
+        if depth == 1:
+            return rings[0]
+        polygons = [rings[start:end] for start, end in zip(self.polygon_offsets[:-1], self.polygon_offsets[1:])]
+        return polygons[0] if depth == 2 else polygons
+
+    def bbox(self):
+        """
+        (min_lat, max_lat, min_lon, max_lon) of the unrounded coordinates.
+        """
+        lons = self.vertices[:, 0]
+        lats = self.vertices[:, 1]
+        return float(lats.min()), float(lats.max()), float(lons.min()), float(lons.max())
+
+    def polygons(self) -> List[List[np.ndarray]]:
+        """
+        The (lon, lat) rings of each polygon as views into the packed array.
+        """
+        rings = [self.vertices[start:end, :2] for start, end in zip(self.ring_offsets[:-1], self.ring_offsets[1:])]
+        if self.type == "MultiPolygon":
+            return [rings[start:end] for start, end in zip(self.polygon_offsets[:-1], self.polygon_offsets[1:])]
+        return [rings]
+
+    def rounded(self):
+        """
+        Returns (scaled, negative, integer): every value rounded half to even to 5 decimals and scaled by 10^5,
+        its sign, and whether the original was an int (ints are not rounded, as with the nested lists).
+        """
+        if self._fixed is not None:
+            fixed = self._fixed.ravel()
+            return fixed, fixed < 0, np.zeros(len(fixed), dtype=bool)
+
+        values = self.vertices.ravel()
+        scaled = values * _scale
+        rounded = np.rint(scaled)
+        negative = np.signbit(values)
+        integer = np.zeros(len(values), dtype=bool)
+
+        # Only values near a tie, or integral values that may be ints, need their original value
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < _tie_tolerance
+        integral = values == np.floor(values)
+        indexes = np.flatnonzero(near_tie | integral)
+        if len(indexes):
+            vertices, axes = np.divmod(indexes, self.vertices.shape[1])
+            rings = np.searchsorted(self.ring_offsets, vertices, side="right") - 1
+            positions = vertices - self.ring_offsets[rings]
+            for index, ring, position, axis in zip(indexes.tolist(), rings.tolist(), positions.tolist(), axes.tolist()):
+                original = self._rings[ring][position][axis]
+                if isinstance(original, int) and not isinstance(original, bool):
+                    integer[index] = True
+                elif isinstance(original, (float, Decimal)):
+                    value = round(Decimal(original), _precision)
+                    rounded[index] = float(value.scaleb(_precision))
+                    negative[index] = value.is_signed()
+
+        return rounded.astype(np.int64), negative, integer
+
+    def fixed_point(self) -> np.ndarray:
+        """
+        The rounded coordinates as int64 scaled by 10^5, shaped (vertices x dimensions).
+        """
+        if self._fixed is not None:
+            return self._fixed
+        return self.rounded()[0].reshape(self.vertices.shape)
+
+    def to_json(self) -> str:
+        """
+        Compact JSON of the rounded coordinates, built once.
+        """
+        if self._json is None:
+            self._json = self._format()
+        return self._json
+
+    def _format(self) -> str:
+        scaled, negative, integer = self.rounded()
+        whole, fraction = np.divmod(np.abs(scaled), _scale)
+        whole_digits = max(1, len(str(int(whole.max()))))
+        dimensions = self.vertices.shape[1]
+
+        # Fixed width byte matrix, one value per row, zero bytes are padding removed afterwards
+        value_width = 1 + whole_digits + 1 + _precision
+        values = np.zeros((len(scaled), value_width), dtype=np.uint8)
+        values[:, 0] = np.where(negative, _dash, 0)
+        for position in range(whole_digits):
+            place = 10 ** (whole_digits - 1 - position)
+            digits = (whole // place) % 10 + _zero
+            significant = (whole >= place) if place > 1 else np.ones(len(whole), dtype=bool)
+            values[:, 1 + position] = np.where(significant, digits, 0)
+        values[:, 1 + whole_digits] = np.where(integer, 0, _dot)
+        for position in range(_precision):
+            digits = (fraction // 10 ** (_precision - 1 - position)) % 10 + _zero
+            values[:, 2 + whole_digits + position] = np.where(integer, 0, digits)
+        values = values.reshape(self.vertex_count, dimensions * value_width)
+
+        # One row per vertex: "[" value ("," value)* "]" ","
+        row_width = dimensions * (value_width + 1) + 2
+        rows = np.zeros((self.vertex_count, row_width), dtype=np.uint8)
+        rows[:, 0] = _open
+        for axis in range(dimensions):
+            start = 1 + axis * (value_width + 1)
+            rows[:, start:start + value_width] = values[:, axis * value_width:(axis + 1) * value_width]
+            rows[:, start + value_width] = _comma if axis < dimensions - 1 else _close
+        rows[:, -1] = _comma
+
+        keep = rows != 0
+        text = rows[keep].tobytes().decode("ascii")
+        ends = np.cumsum(np.count_nonzero(keep, axis=1)).tolist()
+        offsets = self.ring_offsets.tolist()
+        # Each ring drops the comma after its last vertex
+        rings = [text[(ends[start - 1] if start else 0):ends[end - 1] - 1] for start, end in zip(offsets[:-1], offsets[1:])]
+
+        depth = _ring_depths[self.type]
+        if depth == 0:
+            return rings[0]
+        if depth == 1:
+            return f"[{rings[0]}]"
+        polygons = [
+            "[" + ",".join(f"[{ring}]" for ring in rings[start:end]) + "]"
+            for start, end in zip(self.polygon_offsets[:-1], self.polygon_offsets[1:])
+        ]
+        if depth == 2:
+            return polygons[0]
+        return "[" + ",".join(polygons) + "]"
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    Async token bucket. Tokens refill at `rate` per second up to `capacity`,
+    each acquire() takes one token and waits until one is available.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self._rate = float(rate)
+        self._capacity = float(capacity) if capacity else max(1.0, self._rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After.
+        """
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self._rate)
@@ -1,7 +1,15 @@
 from interfaces import S3Boto3Client
 import simplejson as json
+import geometry_codec
+import compression
 import botocore
 import logging
+import time
+
+_max_delete_objects = 1000
+
+# Object bytes stored and fetched by this Lambda, before and after compression
+_compression_stats = compression.CompressionStats()
 
 class S3Client:
     def __init__(self, boto_s3_client: S3Boto3Client, logger: logging.Logger):
@@ -18,15 +26,126 @@ class S3Client:
                 return None
             else:
                 raise
-        body = response['Body'].read()
+        return self._decode_body(self._read_body(response))
+
+    def open_object(self, bucket_name: str, key: str):
+        """
+        File-like reader over the object body, decompressed as it is read when it was stored with a ContentEncoding,
+        or None if it does not exist. Large objects can be processed without holding them in memory. Close it when done.
+        """
+        try:
+            response = self._client.get_object(Bucket=bucket_name, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") == "NoSuchKey":
+                self._logger.warning(f"Object {key} does not exist in bucket {bucket_name}")
+                return None
+            raise
+        encoding = response.get("ContentEncoding")
+        if encoding in ("gzip", "zstd"):
+            return compression.decompressing_reader(response['Body'], encoding)
+        return response['Body']
+
+    def get_object_if_changed(self, bucket_name: str, key: str, etag: str = None):
+        """
+        Conditional GET using IfNoneMatch on a previously seen ETag.
+        Returns (content, etag, size, modified). When the object is unchanged content is None and modified is False.
+        A missing object returns (None, None, 0, True).
+        """
+        params = {"Bucket": bucket_name, "Key": key}
+        if etag:
+            params["IfNoneMatch"] = etag
+        try:
+            response = self._client.get_object(**params)
+        except botocore.exceptions.ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code", "")
+            if error_code in ("304", "NotModified"):
+                return None, etag, 0, False
+            elif error_code == "NoSuchKey":
+                self._logger.warning(f"Object {key} does not exist in bucket {bucket_name}")
+                return None, None, 0, True
+            else:
+                raise
+        body = self._read_body(response)
+        return self._decode_body(body), response.get("ETag"), len(body), True
+
+    def _read_body(self, response) -> bytes:
+        """
+        The object body, decompressed while it streams in when it was stored with a ContentEncoding.
+        """
+        started = time.perf_counter()
+        encoding = response.get("ContentEncoding")
+        if encoding in ("gzip", "zstd"):
+            stream = compression.CountingStream(response['Body'])
+            body = compression.decompress_stream(stream, encoding)
+            fetched_size = stream.bytes_read
+        else:
+            body = response['Body'].read()
+            fetched_size = len(body)
+        _compression_stats.record_fetch(fetched_size, len(body), started)
+        return body
+
+    def _decode_body(self, body: bytes):
+        if geometry_codec.is_encoded(body):
+            return geometry_codec.loads(body)
         content = body.decode('utf-8')
         try:
             return json.loads(content)
         except json.JSONDecodeError:
             return content
 
+    def get_last_modified(self, bucket_name: str, key: str):
+        """
+        When the object was last written, or None if it does not exist.
+        """
+        try:
+            response = self._client.head_object(Bucket=bucket_name, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["LastModified"]
+
     def put_object(self, bucket_name: str, key: str, content: str):
-        return self._client.put_object(Bucket=bucket_name, Key=key, Body=content)
+        """
+        Store the object, compressed with ContentEncoding set when S3_COMPRESSION has a rule for its bucket and key.
+        """
+        body = content.encode("utf-8") if isinstance(content, str) else content
+        params = {}
+        codec = compression.encoding_for(bucket_name, key)
+        if codec:
+            encoding, level = codec
+            params["ContentEncoding"] = encoding
+            stored = compression.compress(body, encoding, level)
+        else:
+            stored = body
+        _compression_stats.record_store(len(body), len(stored))
+        return self._client.put_object(Bucket=bucket_name, Key=key, Body=stored, **params)
+
+    def create_multipart_upload(self, bucket_name: str, key: str, content_encoding: str = None) -> str:
+        params = {"ContentEncoding": content_encoding} if content_encoding else {}
+        return self._client.create_multipart_upload(Bucket=bucket_name, Key=key, **params)["UploadId"]
+
+    def upload_part(self, bucket_name: str, key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+        response = self._client.upload_part(Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body)
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def complete_multipart_upload(self, bucket_name: str, key: str, upload_id: str, parts, raw_size: int, stored_size: int):
+        self._client.complete_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+        _compression_stats.record_store(raw_size, stored_size)
+
+    def abort_multipart_upload(self, bucket_name: str, key: str, upload_id: str):
+        self._client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+
+    def put_encoded_object(self, bucket_name: str, key: str, body: bytes, content_encoding: str, raw_size: int):
+        """
+        Store a body that is already compressed with content_encoding.
+        """
+        params = {"ContentEncoding": content_encoding} if content_encoding else {}
+        _compression_stats.record_store(raw_size, len(body))
+        return self._client.put_object(Bucket=bucket_name, Key=key, Body=body, **params)
+
+    def get_compression_stats(self):
+        return _compression_stats.stats()
 
     def get_presigned_url(self, bucket, key, expires_in=3600):
         url = self._client.generate_presigned_url(
@@ -40,6 +159,23 @@ class S3Client:
         self.put_object(bucket_name, key, content)
         return self.get_presigned_url(bucket_name, key, expires_in)
 
+    def delete_objects(self, bucket_name: str, keys):
+        """
+        Delete keys with delete_objects in groups of 1000. Missing keys are not errors.
+        Returns the keys that could not be deleted.
+        """
+        keys = list(dict.fromkeys(keys))
+        failed = []
+        for i in range(0, len(keys), _max_delete_objects):
+            response = self._client.delete_objects(
+                Bucket=bucket_name,
+                Delete={"Objects": [{"Key": key} for key in keys[i:i + _max_delete_objects]], "Quiet": True}
+            )
+            for error in response.get("Errors", []):
+                self._logger.error(f"Failed to delete {error.get('Key')} from bucket {bucket_name}: {error.get('Code')} {error.get('Message')}")
+                failed.append(error.get("Key"))
+        return failed
+
     def delete_object(self, bucket_name: str, key: str):
         try:
             self._client.delete_object(Bucket=bucket_name, Key=key)
@@ -0,0 +1,156 @@
+import math
+import numpy as np
+from packed_geometry import PackedCoordinates
+
+_meters_per_degree = 111_320.0
+_polygon_types = ("Polygon", "MultiPolygon")
+_line_types = ("LineString", "MultiLineString")
+# A closed ring needs 3 distinct vertices plus the closing one
+_min_ring_vertices = 4
+# Segments tested against the others at once when checking simplified rings for crossings
+_crossing_chunk = 256
+
+
+def _segment_distances(x, y, ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+    length = dx * dx + dy * dy
+    if length == 0:
+        return np.hypot(x - ax, y - ay)
+    t = np.clip(((x - ax) * dx + (y - ay) * dy) / length, 0.0, 1.0)
+    return np.hypot(x - (ax + t * dx), y - (ay + t * dy))
+
+
+def _douglas_peucker(x, y, tolerance, keep, start, end):
+    stack = [(start, end)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(x[start + 1:end], y[start + 1:end], x[start], y[start], x[end], y[end])
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            index += start + 1
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+
+def _simplify_line(x, y, tolerance):
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = keep[-1] = True
+    _douglas_peucker(x, y, tolerance, keep, 0, len(x) - 1)
+    return keep
+
+
+def _simplify_ring(x, y, tolerance):
+    count = len(x)
+    keep = np.zeros(count, dtype=bool)
+    if count <= _min_ring_vertices:
+        keep[:] = True
+        return keep
+    # A closed ring starts and ends on the same vertex, split it at the vertex farthest from the start
+    split = 1 + int(np.argmax(np.hypot(x[1:-1] - x[0], y[1:-1] - y[0])))
+    keep[0] = keep[split] = keep[-1] = True
+    _douglas_peucker(x, y, tolerance, keep, 0, split)
+    _douglas_peucker(x, y, tolerance, keep, split, count - 1)
+    if np.count_nonzero(keep) < _min_ring_vertices:
+        # Keep the ring a triangle rather than letting it collapse into a line
+        distances = _segment_distances(x, y, x[0], y[0], x[split], y[split])
+        distances[keep] = -1
+        keep[int(np.argmax(distances))] = True
+    return keep
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _rings_cross(rings) -> bool:
+    """
+    Whether two segments of the (x, y) rings properly cross, within a ring or between rings.
+    Segments that only share an endpoint, like neighbours in a ring, don't count.
+    """
+    ax = np.concatenate([x[:-1] for x, _ in rings])
+    ay = np.concatenate([y[:-1] for _, y in rings])
+    bx = np.concatenate([x[1:] for x, _ in rings])
+    by = np.concatenate([y[1:] for _, y in rings])
+    # Sorted by their left end, only the segments starting before a chunk's right end can reach it
+    order = np.argsort(np.minimum(ax, bx), kind="stable")
+    ax, ay, bx, by = ax[order], ay[order], bx[order], by[order]
+    min_x = np.minimum(ax, bx)
+    max_x = np.maximum(ax, bx)
+    for start in range(0, len(ax), _crossing_chunk):
+        rows = slice(start, start + _crossing_chunk)
+        end = int(np.searchsorted(min_x, max_x[rows].max(), side="right"))
+        columns = slice(start, end)
+        p_ax, p_ay, p_bx, p_by = ax[rows, None], ay[rows, None], bx[rows, None], by[rows, None]
+        q_ax, q_ay, q_bx, q_by = ax[columns], ay[columns], bx[columns], by[columns]
+        crosses = (
+            (_orientation(p_ax, p_ay, p_bx, p_by, q_ax, q_ay) * _orientation(p_ax, p_ay, p_bx, p_by, q_bx, q_by) < 0)
+            & (_orientation(q_ax, q_ay, q_bx, q_by, p_ax, p_ay) * _orientation(q_ax, q_ay, q_bx, q_by, p_bx, p_by) < 0)
+        )
+        if crosses.any():
+            return True
+    return False
+
+
+def _valid_rings(rings) -> bool:
+    """
+    Whether the simplified (x, y) rings of a polygon are closed, keep at least 3 distinct vertices and don't cross.
+    """
+    for x, y in rings:
+        if len(x) < _min_ring_vertices or x[0] != x[-1] or y[0] != y[-1]:
+            return False
+    return not _rings_cross(rings)
+
+
+def simplify(packed: PackedCoordinates, tolerance: float) -> PackedCoordinates:
+    """
+    Douglas-Peucker simplification of every ring or line with a tolerance in meters, on an
+    equirectangular projection around the geometry's mean latitude. Polygon rings keep at least
+    3 distinct vertices and holes smaller than the tolerance are dropped, so polygons never
+    collapse or lose their outer ring. A polygon whose simplified rings cross themselves or each
+    other is kept at full resolution. Points are returned unchanged.
+    """
+    if tolerance <= 0 or packed.type not in _polygon_types + _line_types:
+        return packed
+
+    lats = packed.vertices[:, 1]
+    x = packed.vertices[:, 0] * (math.cos(math.radians(float(lats.mean()))) * _meters_per_degree)
+    y = lats * _meters_per_degree
+
+    keep = np.zeros(packed.vertex_count, dtype=bool)
+    keep_rings = np.ones(packed.ring_count, dtype=bool)
+    outer_rings = set(packed.polygon_offsets[:-1]) if packed.type in _polygon_types else set()
+    offsets = packed.ring_offsets.tolist()
+    for ring, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+        ring_x = x[start:end]
+        ring_y = y[start:end]
+        if packed.type in _line_types:
+            keep[start:end] = _simplify_line(ring_x, ring_y, tolerance)
+            continue
+        if ring not in outer_rings and max(np.ptp(ring_x), np.ptp(ring_y)) < tolerance:
+            keep_rings[ring] = False
+            continue
+        keep[start:end] = _simplify_ring(ring_x, ring_y, tolerance)
+
+    # Rings are simplified independently, so check each polygon is still valid
+    if packed.type in _polygon_types:
+        polygon_offsets = packed.polygon_offsets
+        for first, last in zip(polygon_offsets[:-1], polygon_offsets[1:]):
+            start, end = offsets[first], offsets[last]
+            if keep[start:end].all() and keep_rings[first:last].all():
+                continue
+            rings = [
+                (x[offsets[ring]:offsets[ring + 1]][keep[offsets[ring]:offsets[ring + 1]]],
+                 y[offsets[ring]:offsets[ring + 1]][keep[offsets[ring]:offsets[ring + 1]]])
+                for ring in range(first, last) if keep_rings[ring]
+            ]
+            if not _valid_rings(rings):
+                keep[start:end] = True
+                keep_rings[first:last] = True
+
+    if keep.all() and keep_rings.all():
+        return packed
+    return packed.subset(keep, keep_rings)
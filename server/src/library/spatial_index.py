@@ -0,0 +1,124 @@
+from typing import Iterable, List, Tuple, Any
+import math
+
+_node_capacity = 16
+
+class SpatialIndex:
+    """
+    Static R-tree over axis aligned bounding boxes, bulk loaded with the
+    Sort-Tile-Recursive (STR) packing algorithm.
+    Boxes are (min_lat, max_lat, min_lon, max_lon) to match the alert tables.
+    """
+    def __init__(self, entries: Iterable[Tuple[Any, Any, Any, Any, Any]], node_capacity: int = _node_capacity):
+        self._node_capacity = max(2, node_capacity)
+        # Leaf level entries: (min_lat, max_lat, min_lon, max_lon, value)
+        level = [
+            (float(min_lat), float(max_lat), float(min_lon), float(max_lon), value)
+            for value, min_lat, max_lat, min_lon, max_lon in entries
+        ]
+        self._size = len(level)
+        self._root = None
+        self._height = 0
+
+        if not level:
+            return
+
+        leaf = True
+        while True:
+            nodes = self._pack(level, leaf)
+            self._height += 1
+            if len(nodes) == 1:
+                self._root = nodes[0]
+                break
+            level = nodes
+            leaf = False
+
+    def __len__(self):
+        return self._size
+
+    def _pack(self, entries: List[tuple], leaf: bool) -> List[tuple]:
+        capacity = self._node_capacity
+        node_count = math.ceil(len(entries) / capacity)
+        slab_count = math.ceil(math.sqrt(node_count))
+        slab_size = slab_count * capacity
+
+        # Sort by longitude centre, cut into vertical slabs, then sort each slab by latitude centre
+        entries = sorted(entries, key=lambda e: e[2] + e[3])
+        nodes = []
+        for i in range(0, len(entries), slab_size):
+            slab = sorted(entries[i:i + slab_size], key=lambda e: e[0] + e[1])
+            for j in range(0, len(slab), capacity):
+                children = slab[j:j + capacity]
+                nodes.append((
+                    min(c[0] for c in children),
+                    max(c[1] for c in children),
+                    min(c[2] for c in children),
+                    max(c[3] for c in children),
+                    leaf,
+                    children
+                ))
+        return nodes
+
+    def query_point(self, lat, lon) -> List[Any]:
+        lat = float(lat)
+        lon = float(lon)
+        results = []
+        if self._root is None:
+            return results
+
+        stack = [self._root]
+        while stack:
+            min_lat, max_lat, min_lon, max_lon, leaf, children = stack.pop()
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                continue
+            if leaf:
+                for c in children:
+                    if c[0] <= lat <= c[1] and c[2] <= lon <= c[3]:
+                        results.append(c[4])
+            else:
+                stack.extend(children)
+        return results
+
+    def query_box(self, min_lat, max_lat, min_lon, max_lon) -> List[Any]:
+        """
+        Return the values whose box intersects the given box.
+        """
+        min_lat, max_lat, min_lon, max_lon = float(min_lat), float(max_lat), float(min_lon), float(max_lon)
+        results = []
+        if self._root is None:
+            return results
+
+        stack = [self._root]
+        while stack:
+            node_min_lat, node_max_lat, node_min_lon, node_max_lon, leaf, children = stack.pop()
+            if node_max_lat < min_lat or node_min_lat > max_lat or node_max_lon < min_lon or node_min_lon > max_lon:
+                continue
+            if leaf:
+                for c in children:
+                    if c[1] >= min_lat and c[0] <= max_lat and c[3] >= min_lon and c[2] <= max_lon:
+                        results.append(c[4])
+            else:
+                stack.extend(children)
+        return results
+
+    def query_route(self, coordinates, match_segments: bool = True) -> set:
+        """
+        Return the set of values that may intersect the (lat, lon) route: boxes holding a route point,
+        or with match_segments boxes overlapping the bounding box of a route segment.
+        """
+        points = [(float(lat), float(lon)) for lat, lon in coordinates]
+        if not match_segments or len(points) < 2:
+            return self.query_points(points)
+        results = set()
+        for (lat1, lon1), (lat2, lon2) in zip(points[:-1], points[1:]):
+            results.update(self.query_box(min(lat1, lat2), max(lat1, lat2), min(lon1, lon2), max(lon1, lon2)))
+        return results
+
+    def query_points(self, points: Iterable[Tuple[Any, Any]]) -> set:
+        """
+        Return the set of values whose box contains at least one of the (lat, lon) points.
+        """
+        results = set()
+        for lat, lon in points:
+            results.update(self.query_point(lat, lon))
+        return results
@@ -1,16 +1,81 @@
 import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from interfaces import SqsBoto3Client
 
+_max_batch_size = 10
+
 class SqsClient:
-    def __init__(self, boto_sqs_client: SqsBoto3Client):
+    def __init__(self, boto_sqs_client: SqsBoto3Client, logger: logging.Logger):
         self._client = boto_sqs_client
+        self._logger = logger
+        self._queue_urls = {}
+
+    def get_queue_url(self, queue_name):
+        queue_url = self._queue_urls.get(queue_name)
+        if queue_url is None:
+            queue_url = self._client.get_queue_url(QueueName=queue_name)["QueueUrl"]
+            self._queue_urls[queue_name] = queue_url
+        return queue_url
 
     def send_message(self, queue_name, message_body):
-        queue_url = self._client.get_queue_url(QueueName=queue_name)["QueueUrl"]
+        queue_url = self.get_queue_url(queue_name)
 
         if isinstance(message_body, dict):
             message_body = json.dumps(message_body)
         response = self._client.send_message(QueueUrl=queue_url, MessageBody=message_body)
         print(f"Message sent to queue '{queue_name}'. Message ID: {response['MessageId']}")
-        return response
\ No newline at end of file
+        return response
+
+    def send_message_batch(self, queue_name, message_bodies, max_concurrency=1, max_retries=3):
+        """
+        Send messages in groups of 10 with send_message_batch. Entries that fail with a
+        non sender fault are retried with backoff, the other batches are not resent.
+        Returns the message bodies that could not be sent.
+        """
+        bodies = [json.dumps(body) if isinstance(body, dict) else body for body in message_bodies]
+        if not bodies:
+            return []
+        queue_url = self.get_queue_url(queue_name)
+        batches = [bodies[i:i + _max_batch_size] for i in range(0, len(bodies), _max_batch_size)]
+
+        def send(batch):
+            return self._send_batch(queue_url, batch, max_retries)
+
+        if max_concurrency > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+                results = list(executor.map(send, batches))
+        else:
+            results = [send(batch) for batch in batches]
+
+        failed = [body for result in results for body in result]
+        self._logger.info(f"Sent {len(bodies) - len(failed)} of {len(bodies)} messages to queue '{queue_name}' in {len(batches)} batches.")
+        if failed:
+            self._logger.error(f"Failed to send {len(failed)} messages to queue '{queue_name}'.")
+        return failed
+
+    def _send_batch(self, queue_url, batch, max_retries):
+        pending = {str(i): body for i, body in enumerate(batch)}
+        failed = []
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(0.1 * (2 ** (attempt - 1)))
+            response = self._client.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[{"Id": entry_id, "MessageBody": body} for entry_id, body in pending.items()]
+            )
+            retry = {}
+            for entry in response.get("Failed", []):
+                body = pending[entry["Id"]]
+                if entry.get("SenderFault"):
+                    self._logger.error(f"SQS rejected message {body}: {entry.get('Code')} {entry.get('Message')}")
+                    failed.append(body)
+                else:
+                    retry[entry["Id"]] = body
+            pending = retry
+            if not pending:
+                break
+        failed.extend(pending.values())
+        return failed
@@ -0,0 +1,28 @@
+from dynamo_client import DynamoDbClient
+
+class ValidatorStore:
+    """
+    HTTP cache validators (ETag / Last-Modified) keyed by URL, stored in the AlertState table next to the
+    state they guard. Every container and cold start sees the validators of the last committed fetch,
+    so a 304 always means the stored alerts and zones are current.
+    """
+    _table_name = "AlertState"
+    _item_prefix = "http-validators:"
+
+    def __init__(self, dynamo_client: DynamoDbClient):
+        self._dynamo_client = dynamo_client
+
+    def get(self, url: str) -> dict:
+        item = self._dynamo_client.get_item_by_id(self._table_name, self._item_prefix + url, consistent_read=True) or {}
+        return {key: item[key] for key in ("etag", "last_modified") if item.get(key)}
+
+    def set(self, url: str, etag: str = None, last_modified: str = None):
+        entry = {}
+        if etag:
+            entry["etag"] = etag
+        if last_modified:
+            entry["last_modified"] = last_modified
+        if entry:
+            self._dynamo_client.upsert_item(self._table_name, {"id": self._item_prefix + url, **entry})
+        else:
+            self._dynamo_client.delete_item(self._table_name, self._item_prefix + url)
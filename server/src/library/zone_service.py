@@ -1,12 +1,58 @@
 import logging
-from noaa_client import NoaaClient
+import os
+import time
+import random
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from noaa_client import NoaaClient, NOT_MODIFIED
 from dynamo_client import DynamoDbClient
 from sqs_client import SqsClient
 from s3_client import S3Client
+from lru_cache import LruCache
+from rate_limiter import TokenBucket
+from spatial_index import SpatialIndex
+from WeatherAlertModel import Geometry, RESOLUTIONS, FULL_RESOLUTION, GEOMETRY_FORMAT
 from decimal import Decimal
 import simplejson as json
 
 _precision = 5
+_zone_fetch_concurrency = int(os.environ.get("ZONE_FETCH_CONCURRENCY", "16"))
+_zone_cache_revalidate_seconds = float(os.environ.get("ZONE_CACHE_REVALIDATE_SECONDS", "60"))
+_zone_backfill_concurrency = int(os.environ.get("ZONE_BACKFILL_CONCURRENCY", "8"))
+_noaa_requests_per_second = float(os.environ.get("NOAA_REQUESTS_PER_SECOND", "10"))
+_noaa_max_retries = 5
+_checkpoint_interval = 100
+_zone_write_batch_size = 100
+_zone_pipeline_depth = 4
+
+# The bounding boxes of every stored zone are reloaded from ZoneMetadata at most this often
+_zone_index_ttl_seconds = float(os.environ.get("ZONE_INDEX_TTL_SECONDS", "3600"))
+
+# Parsed zone files shared by every invocation of a warm Lambda, bounded by their estimated size once parsed
+_zone_cache = LruCache(int(os.environ.get("ZONE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+
+# Approximate memory of one parsed [lon, lat] pair, a list object and two floats, against ~20 bytes of JSON
+_parsed_vertex_bytes = 130
+
+def estimate_parsed_size(value):
+    """
+    Approximate memory held by a parsed zone file, so the zone cache is bounded by what it really holds
+    rather than by the size of the stored body.
+    """
+    # PackedCoordinates, checked by attribute so numpy is only imported once a zone is packed
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, list):
+        if len(value) == 2 and all(isinstance(x, (float, int, Decimal)) for x in value):
+            return _parsed_vertex_bytes
+        return 56 + 8 * len(value) + sum(estimate_parsed_size(item) for item in value)
+    if isinstance(value, dict):
+        return 64 + 40 * len(value) + sum(estimate_parsed_size(item) for item in value.values())
+    if isinstance(value, str):
+        return 49 + len(value)
+    return 32
 
 def round_value(value, precision=_precision):
     return round(Decimal(value), precision) if isinstance(value, (float, Decimal, int)) else value
@@ -31,30 +77,171 @@ class ZoneService:
         self._logger = logger
 
     _zones_table_name = "Zone"
+    _zone_metadata_table_name = "ZoneMetadata"
     _zones_queue_name = "zones-queue"
     _zones_coordinates_bucket_name = "zone-bucket-202505"
+    _sqs_send_concurrency = 8
 
-    async def get_and_store_all_zones(self):
-        zones = await self._noaa_client.get_all_zones()
+    # Spatial index over the bounding boxes of all stored zones, kept for the life of a warm Lambda
+    _zone_spatial_index = None
+    _zone_spatial_index_loaded = 0.0
 
-        zone_count = 0
-        
-        for zone in zones:
-            zone = zone.get("properties", {})
-            zone["id"] = zone.get("@id")
-            self._dynamo_client.upsert_item(self._zones_table_name, zone)
-            self._sqs_client.send_message(
+    async def get_and_store_all_zones(self, force=True, enqueue=True):
+        """
+        Store every NOAA zone in the Zone table and, when enqueue is set, queue each zone for zone_listener.
+        Zones stream through fetch -> transform -> batch write -> enqueue; a bounded queue between the
+        NOAA pages and the writer keeps memory flat and lets writes overlap with fetching.
+        Returns the stored zone ids.
+        """
+        batches = asyncio.Queue(maxsize=_zone_pipeline_depth)
+        zone_ids = []
+        counts = {"fetched": 0, "stored": 0, "not_modified": False}
+
+        async def produce():
+            batch = []
+            async for zone in self._noaa_client.iter_zones(conditional=not force):
+                if zone is NOT_MODIFIED:
+                    counts["not_modified"] = True
+                    break
+                counts["fetched"] += 1
+                zone = zone.get("properties", {})
+                zone["id"] = zone.get("@id")
+                batch.append(zone)
+                if len(batch) >= _zone_write_batch_size:
+                    await batches.put(batch)
+                    batch = []
+            if batch:
+                await batches.put(batch)
+            # Only on normal completion: when consume() fails the TaskGroup cancels this task, and waiting
+            # for room in a full queue here would never end
+            await batches.put(None)
+
+        async def consume():
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    return
+                counts["stored"] += await asyncio.to_thread(self._store_zone_batch, batch, enqueue)
+                zone_ids.extend(zone.get("id") for zone in batch)
+
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(produce())
+            task_group.create_task(consume())
+
+        if counts["not_modified"]:
+            self._logger.info("NOAA zones not modified since the last backfill.")
+            return []
+        # Only now that every zone is stored and enqueued, or the next run would skip the ones that failed
+        self._noaa_client.commit_zones()
+
+        self._logger.info(f"Fetched {counts['fetched']} zones from NOAA API.")
+        self._logger.info(f"Total zones stored: {counts['stored']}")
+        return zone_ids
+
+    def _store_zone_batch(self, zones, enqueue):
+        zone_count = self._dynamo_client.upsert_items(self._zones_table_name, zones)
+        if enqueue:
+            self._sqs_client.send_message_batch(
                 queue_name=self._zones_queue_name,
-                message_body={
-                    "id": zone.get("id")
-                }
+                message_bodies=[{"id": zone.get("id")} for zone in zones],
+                max_concurrency=self._sqs_send_concurrency
             )
-            self._logger.info(f"Stored zone {zone.get('id')} in the database.")
-            zone_count += 1
+        return zone_count
 
-        self._logger.info(f"Fetched {len(zones)} zones from NOAA API.")
-        self._logger.info(f"Total zones stored: {zone_count}")
-        return
+    async def backfill_all_zone_coordinates(self, checkpoint_name="zone-backfill", deadline=None):
+        """
+        Refresh the zone list and backfill every zone's coordinates in this process instead of fanning out through SQS.
+        """
+        zone_ids = await self.get_and_store_all_zones(force=True, enqueue=False)
+        return await self.backfill_zone_coordinates(zone_ids, checkpoint_name=checkpoint_name, deadline=deadline)
+
+    async def backfill_zone_coordinates(self, zone_ids, max_concurrency=None, requests_per_second=None, checkpoint_name=None, deadline=None):
+        """
+        Fetch zone geometries from NOAA and store them in S3 with a bounded number of requests in flight,
+        rate limited by a token bucket. With checkpoint_name, completed zones are checkpointed in S3 so an
+        interrupted run resumes where it stopped. Zones not started before the monotonic deadline are left for the next run.
+        Returns {"completed": [...], "failed": {zone_id: error}, "remaining": [...]}.
+        """
+        zone_ids = list(dict.fromkeys(zone_ids))
+        completed = set(self.load_backfill_checkpoint(checkpoint_name)) if checkpoint_name else set()
+        pending = [zone_id for zone_id in zone_ids if zone_id not in completed]
+        self._logger.info(f"Backfilling {len(pending)} zones, {len(zone_ids) - len(pending)} already completed.")
+
+        limiter = TokenBucket(requests_per_second or _noaa_requests_per_second)
+        semaphore = asyncio.Semaphore(max_concurrency or _zone_backfill_concurrency)
+        done = []
+        failed = {}
+        remaining = []
+        checkpoint_lock = asyncio.Lock()
+        since_checkpoint = 0
+
+        async def backfill(zone_id):
+            nonlocal since_checkpoint
+            async with semaphore:
+                if deadline is not None and time.monotonic() > deadline:
+                    remaining.append(zone_id)
+                    return
+                try:
+                    zone = await self._get_zone_coordinates_with_retry(zone_id, limiter)
+                    await asyncio.to_thread(self.store_zone_coordinates_in_s3, zone_id, zone)
+                except Exception as e:
+                    self._logger.error(f"Failed to backfill zone {zone_id}: {e}")
+                    failed[zone_id] = str(e)
+                    return
+                done.append(zone_id)
+                completed.add(zone_id)
+
+            if checkpoint_name:
+                async with checkpoint_lock:
+                    since_checkpoint += 1
+                    if since_checkpoint >= _checkpoint_interval:
+                        since_checkpoint = 0
+                        await asyncio.to_thread(self.save_backfill_checkpoint, checkpoint_name, list(completed))
+
+        await asyncio.gather(*(backfill(zone_id) for zone_id in pending))
+
+        if checkpoint_name:
+            if failed or remaining:
+                self.save_backfill_checkpoint(checkpoint_name, list(completed))
+            else:
+                # Finished, the next run starts from scratch
+                self.save_backfill_checkpoint(checkpoint_name, [])
+
+        self._logger.info(f"Backfilled {len(done)} zones, {len(failed)} failed, {len(remaining)} remaining.")
+        return {"completed": done, "failed": failed, "remaining": remaining}
+
+    async def _get_zone_coordinates_with_retry(self, zone_id, limiter: TokenBucket):
+        for attempt in range(_noaa_max_retries + 1):
+            await limiter.acquire()
+            try:
+                return await self.get_zone_coordinates_from_noaa(zone_id)
+            except Exception as e:
+                response = getattr(e, "response", None)
+                status_code = getattr(response, "status_code", None)
+                # Only throttling, server errors and transport errors are worth retrying
+                if attempt == _noaa_max_retries or (status_code is not None and status_code != 429 and status_code < 500):
+                    raise
+                delay = min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                if status_code == 429:
+                    retry_after = response.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+                    limiter.pause(delay)
+                await asyncio.sleep(delay)
+
+    def load_backfill_checkpoint(self, checkpoint_name):
+        checkpoint = self._s3_client.get_object(self._zones_coordinates_bucket_name, self.format_checkpoint_key(checkpoint_name))
+        if not isinstance(checkpoint, dict):
+            return []
+        return checkpoint.get("completed", [])
+
+    def save_backfill_checkpoint(self, checkpoint_name, completed):
+        self._s3_client.put_object(self._zones_coordinates_bucket_name,
+                                   self.format_checkpoint_key(checkpoint_name),
+                                   json.dumps({"completed": completed}).encode("utf-8"))
+
+    def format_checkpoint_key(self, checkpoint_name):
+        return f"checkpoints/{checkpoint_name}.json"
 
     async def get_and_store_zone_coordinates(self, zone_id):
         zone_coordinates = await self.get_zone_coordinates_from_noaa(zone_id)
@@ -75,36 +262,202 @@ class ZoneService:
         return zone_coordinates
     
     
-    def get_zone_coordinates_from_s3(self, zone_id):
-        zone_file_name = self.format_s3_file_name(zone_id)
+    def get_zone_coordinates_from_s3(self, zone_id, resolution=FULL_RESOLUTION):
+        zone_file_name = self.format_s3_file_name(zone_id, resolution)
 
-        zone_coordinates = self._s3_client.get_object(self._zones_coordinates_bucket_name, zone_file_name)
+        cached = _zone_cache.get(zone_file_name)
+        if cached:
+            zone_coordinates, etag, validated_at = cached
+            if time.monotonic() - validated_at < _zone_cache_revalidate_seconds:
+                _zone_cache.record_hit()
+                return zone_coordinates
+        else:
+            etag = None
+
+        # Revalidate with a conditional GET so zones rewritten by zone_listener are picked up
+        content, new_etag, size, modified = self._s3_client.get_object_if_changed(
+            self._zones_coordinates_bucket_name, zone_file_name, etag)
+        if not modified:
+            _zone_cache.touch(zone_file_name)
+            _zone_cache.record_hit()
+            return zone_coordinates
+
+        _zone_cache.record_miss()
+        if content is None:
+            _zone_cache.remove(zone_file_name)
+            if resolution != FULL_RESOLUTION:
+                # Zone stored before it had levels of detail, simplify the full geometry until it is backfilled again
+                return self.simplify_zone(self.get_zone_coordinates_from_s3(zone_id), resolution)
+            return None
 
+        _zone_cache.put(zone_file_name, content, new_etag, max(size, estimate_parsed_size(content)))
         self._logger.info(f"Retrieved zone {zone_id} from S3.")
 
-        return zone_coordinates
+        return content
+
+
+    def get_zones_coordinates_from_s3(self, zone_ids, max_concurrency=None, resolution=FULL_RESOLUTION):
+        """
+        Fetch several zones from S3 in parallel. Results are returned in the order of zone_ids,
+        with None for zones that do not exist.
+        """
+        zone_ids = list(zone_ids)
+        if not zone_ids:
+            return []
+
+        def get_zone(zone_id):
+            return self.get_zone_coordinates_from_s3(zone_id, resolution)
+
+        max_concurrency = max(1, min(max_concurrency or _zone_fetch_concurrency, len(zone_ids)))
+        if max_concurrency == 1:
+            return [get_zone(zone_id) for zone_id in zone_ids]
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(get_zone, zone_ids))
     
 
+    def simplify_zone(self, zone, resolution):
+        """
+        A copy of the zone with its geometry simplified to the resolution's tolerance.
+        """
+        if not zone or not zone.get("geometry") or not RESOLUTIONS[resolution]:
+            return zone
+        geometry = zone["geometry"]
+        simplified = Geometry(type=geometry.get("type"), coordinates=geometry.get("coordinates")).simplified(RESOLUTIONS[resolution])
+        return {**zone, "geometry": {**geometry, "coordinates": simplified.packed() or simplified.coordinates}}
+
+
+    def get_zone_cache_stats(self):
+        return _zone_cache.stats()
+
+
     def store_zone_coordinates_in_s3(self, zone_id, zone):
+        """
+        Store the zone rounded to 5 decimals, next to a simplified copy for every level of detail.
+        """
         zone_file_name = self.format_s3_file_name(zone_id)
 
+        levels = {}
+        packed = None
         geometry = zone.get("geometry", {})
         if "coordinates" in geometry:
-            geometry["coordinates"] = round_coordinates(geometry["coordinates"])
+            # Deferred so handlers that only read zones don't pay for importing numpy
+            from packed_geometry import PackedCoordinates
+            from simplify import simplify
+            packed = PackedCoordinates.from_geojson(geometry.get("type"), geometry["coordinates"])
+            if packed is not None:
+                geometry["coordinates"] = packed
+                for resolution, tolerance in RESOLUTIONS.items():
+                    if tolerance:
+                        levels[resolution] = simplify(packed, tolerance)
+            else:
+                geometry["coordinates"] = round_coordinates(geometry["coordinates"])
             zone["geometry"] = geometry
         
+        body = self.serialize_zone(zone)
         zone_coordinates = self._s3_client.put_object(self._zones_coordinates_bucket_name, 
                                                       zone_file_name, 
-                                                      json.dumps(zone, use_decimal=True, separators=(",", ":"))
-                                                      .encode("utf-8"))
+                                                      body)
+        _zone_cache.remove(zone_file_name)
+        self._dynamo_client.upsert_item(self._zone_metadata_table_name, self.format_zone_metadata(zone_id, packed, body))
+
+        for resolution, simplified in levels.items():
+            level_file_name = self.format_s3_file_name(zone_id, resolution)
+            level_zone = {**zone, "geometry": {**geometry, "coordinates": simplified}}
+            self._s3_client.put_object(self._zones_coordinates_bucket_name,
+                                       level_file_name,
+                                       self.serialize_zone(level_zone))
+            _zone_cache.remove(level_file_name)
 
         self._logger.info(f"Stored zone {zone_id} in S3.")
 
         return zone_coordinates
     
 
-    def format_s3_file_name(self, zone_id):
+    def format_zone_metadata(self, zone_id, packed, body):
+        """
+        Zone metadata item: bbox of the stored (rounded) coordinates, vertex count, stored size and content hash.
+        Zones that can't be packed have no bbox, alert building reads their geometry instead.
+        """
+        metadata = {
+            "id": zone_id,
+            "byte_size": len(body),
+            "content_hash": hashlib.sha256(body).hexdigest(),
+            "vertex_count": packed.vertex_count if packed is not None else 0,
+            "updated": datetime.now(timezone.utc).isoformat()
+        }
+        if packed is not None:
+            fixed = packed.fixed_point()
+            min_lon, min_lat = fixed[:, :2].min(axis=0).tolist()
+            max_lon, max_lat = fixed[:, :2].max(axis=0).tolist()
+            # Fixed point integers scaled by 10^5, as Decimals for DynamoDB
+            metadata.update({
+                "min_lat": Decimal(min_lat).scaleb(-_precision),
+                "max_lat": Decimal(max_lat).scaleb(-_precision),
+                "min_lon": Decimal(min_lon).scaleb(-_precision),
+                "max_lon": Decimal(max_lon).scaleb(-_precision)
+            })
+        return metadata
+
+    def get_zones_metadata(self, zone_ids):
+        """
+        Metadata of the zones by zone id, from one batch_get_item per 100 zones. Zones without metadata are left out.
+        """
+        items = self._dynamo_client.get_items_by_id_list(self._zone_metadata_table_name, zone_ids)
+        return {item["id"]: item for item in items}
+
+    def get_zone_spatial_index(self):
+        """
+        Point -> zone lookup over the bounding boxes in ZoneMetadata. Zones rarely change, so the
+        index is rebuilt from a table scan only every _zone_index_ttl_seconds.
+        """
+        if ZoneService._zone_spatial_index is None or time.monotonic() - ZoneService._zone_spatial_index_loaded > _zone_index_ttl_seconds:
+            items = [item for item in self._dynamo_client.get_all_items(self._zone_metadata_table_name) if item.get("min_lat") is not None]
+            ZoneService._zone_spatial_index = SpatialIndex(
+                (item["id"], float(item["min_lat"]), float(item["max_lat"]), float(item["min_lon"]), float(item["max_lon"])) for item in items
+            )
+            ZoneService._zone_spatial_index_loaded = time.monotonic()
+            self._logger.info(f"Built zone spatial index over {len(items)} zones.")
+        return ZoneService._zone_spatial_index
+
+    def match_route_zones(self, zone_ids, coordinates, match_segments=True):
+        """
+        Keep the zones whose geometry contains a route point, or is crossed by a route segment when match_segments is set.
+        Zones whose geometry can not be tested exactly are kept on their bounding box match.
+        """
+        # Deferred so handlers that never search don't pay for importing numpy
+        import geometry_match
+
+        matched = []
+        for zone_id, zone in zip(zone_ids, self.get_zones_coordinates_from_s3(zone_ids)):
+            geometry = (zone or {}).get("geometry")
+            rings = None
+            if geometry:
+                rings = geometry_match.polygon_rings_from_geometries([Geometry(type=geometry.get("type"), coordinates=geometry.get("coordinates"))])
+            if rings is None or geometry_match.route_intersects(rings, coordinates, match_segments):
+                matched.append(zone_id)
+        return matched
+
+    def serialize_zone(self, zone):
+        """
+        Zone file content in GEOMETRY_FORMAT, with packed coordinates written rounded to 5 decimals.
+        """
+        if GEOMETRY_FORMAT == "binary":
+            import geometry_codec
+            return geometry_codec.dumps(zone)
+
+        def default(value):
+            if hasattr(value, "to_json"):
+                return json.RawJSON(value.to_json())
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+        return json.dumps(zone, use_decimal=True, separators=(",", ":"), default=default).encode("utf-8")
+
+
+    def format_s3_file_name(self, zone_id, resolution=FULL_RESOLUTION):
         if zone_id.startswith("https://api.weather.gov/zones/"):
             zone_id = zone_id.replace("https://api.weather.gov/zones/", "")
         zone_id = zone_id.replace("/", "-")
+        if resolution != FULL_RESOLUTION:
+            return f"{zone_id}.{resolution}.json"
         return (f"{zone_id}.json")
\ No newline at end of file
@@ -16,6 +16,7 @@ resource "aws_lambda_event_source_mapping" "zones_queue_to_lambda" {
   function_name    = aws_lambda_function.zone_listener_function.arn
   batch_size       = 5
   enabled          = true
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_sqs_queue" "alerts_queue" {
@@ -36,4 +37,5 @@ resource "aws_lambda_event_source_mapping" "alerts_queue_to_lambda" {
   function_name    = aws_lambda_function.alert_listener_function.function_name
   batch_size       = 10
   enabled          = true
+  function_response_types = ["ReportBatchItemFailures"]
 }
@@ -8,4 +8,21 @@ resource "aws_s3_bucket" "zone_bucket" {
 
 resource "aws_s3_bucket" "weather_alerts_export_bucket" {
   bucket = "weather-alerts-export-bucket-202505"
-}
\ No newline at end of file
+}
+# Route search exports are keyed by the alert set version, old versions are never read again
+resource "aws_s3_bucket_lifecycle_configuration" "weather_alerts_export_bucket" {
+  bucket = aws_s3_bucket.weather_alerts_export_bucket.id
+
+  rule {
+    id     = "expire-route-exports"
+    status = "Enabled"
+
+    filter {
+      prefix = "routes/"
+    }
+
+    expiration {
+      days = 1
+    }
+  }
+}
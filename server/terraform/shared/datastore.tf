@@ -7,6 +7,24 @@ resource "aws_dynamodb_table" "weather_alert" {
     name = "id"
     type = "S"
   }
+
+  attribute {
+    name = "expires_on"
+    type = "S"
+  }
+
+  attribute {
+    name = "expires_at"
+    type = "N"
+  }
+
+  # Sparse index of the alerts with an end, partitioned by the UTC day they end on
+  global_secondary_index {
+    name            = "ExpiryIndex"
+    hash_key        = "expires_on"
+    range_key       = "expires_at"
+    projection_type = "KEYS_ONLY"
+  }
 }
 
 resource "aws_dynamodb_table" "zone" {
@@ -30,3 +48,47 @@ resource "aws_dynamodb_table" "alert" {
     type = "S"
   }
 }
+
+resource "aws_dynamodb_table" "alert_state" {
+  name           = "AlertState"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "id"
+
+  attribute {
+    name = "id"
+    type = "S"
+  }
+}
+
+resource "aws_dynamodb_table" "zone_metadata" {
+  name           = "ZoneMetadata"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "id"
+
+  attribute {
+    name = "id"
+    type = "S"
+  }
+}
+
+resource "aws_dynamodb_table" "zone_alerts" {
+  name           = "ZoneAlerts"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "zone_id"
+
+  attribute {
+    name = "zone_id"
+    type = "S"
+  }
+}
+
+resource "aws_dynamodb_table" "alert_tiles" {
+  name           = "AlertTiles"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "tile"
+
+  attribute {
+    name = "tile"
+    type = "S"
+  }
+}